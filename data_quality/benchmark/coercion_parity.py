@@ -0,0 +1,111 @@
+import argparse
+import csv
+import os
+import sys
+import tempfile
+
+import pandas as pd
+from pyspark.sql import SparkSession
+from pyspark.sql import types as sparktypes
+
+# import the validation scripts (they import the custom_expectations package)
+sys.path.append('../validate_data')
+from data_validation_with_checkpoints import get_logger
+from dataset_reader import read_dataset
+from pandas_validation import read_pandas_dataset
+
+# column -> (Spark type, the CSV values whose parsing the engines must agree
+# on: range bounds, decimal and exponent forms, signs, spaces, garbage)
+COERCION_CASES = {
+    "byte_value": (sparktypes.ByteType(), [
+        "127", "128", "-128", "-129", "+5", "100.0", "1e2", " 5", "5 ",
+        "abc", "0x10", "", "*"]),
+    "short_value": (sparktypes.ShortType(), [
+        "32767", "32768", "-32768", "-32769", "007", "1.5", "-0"]),
+    "integer_value": (sparktypes.IntegerType(), [
+        "2147483647", "2147483648", "-2147483648", "-2147483649", "100.0",
+        "1e3", "1_000"]),
+    "long_value": (sparktypes.LongType(), [
+        "9223372036854775807", "9223372036854775808",
+        "-9223372036854775808", "-9223372036854775809", "100.0",
+        "12345678901234567890"]),
+    "double_value": (sparktypes.DoubleType(), [
+        "1.5", "-0.25", "1e3", "100", "abc", ""]),
+}
+
+
+def write_coercion_dataset(path):
+    """
+    Write the coercion cases as a CSV file, one column per case list, the
+    shorter columns padded with empty (null) values.
+
+    Returns:
+        The Spark read schema of the file
+    """
+    rows = max(len(values) for _, values in COERCION_CASES.values())
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(COERCION_CASES))
+        for position in range(rows):
+            writer.writerow([values[position] if position < len(values)
+                             else "" for _, values in COERCION_CASES.values()])
+    return sparktypes.StructType([
+        sparktypes.StructField(column, data_type, True)
+        for column, (data_type, _) in COERCION_CASES.items()])
+
+
+def _comparable(value):
+    if value is None or pd.isna(value):
+        return None
+    # pandas returns numpy scalars where Spark returns Python ones
+    return value.item() if hasattr(value, "item") else value
+
+
+def compare_coercion(spark, path, schema):
+    """
+    Read the coercion dataset with both engines and compare the values.
+
+    Returns:
+        A list of (column, raw value, Spark value, pandas value) tuples, one
+        per difference
+    """
+    spark_rows = read_dataset(spark, path, "csv", schema=schema).collect()
+    pandas_df = read_pandas_dataset([path], "csv", schema)
+    differences = []
+    for column, (_, values) in COERCION_CASES.items():
+        for position, raw_value in enumerate(values):
+            spark_value = spark_rows[position][column]
+            pandas_value = _comparable(pandas_df[column].iloc[position])
+            if spark_value != pandas_value:
+                differences.append((column, raw_value, spark_value,
+                                    pandas_value))
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log_level',
+                        help='The log level',
+                        default="info")
+    args = parser.parse_args()
+
+    logger = get_logger(logger_name=__file__, logger_level=args.log_level)
+    spark = SparkSession.builder.getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+
+    path = os.path.join(tempfile.mkdtemp(), "coercion.csv")
+    schema = write_coercion_dataset(path)
+    differences = compare_coercion(spark, path, schema)
+    logger.info('{} values compared, {} differences'.format(
+        sum(len(values) for _, values in COERCION_CASES.values()),
+        len(differences)))
+    for column, raw_value, spark_value, pandas_value in differences:
+        logger.error('{} {!r}: spark {!r}, pandas {!r}'.format(
+            column, raw_value, spark_value, pandas_value))
+    if differences:
+        sys.exit(1)
+    logger.info('The pandas and Spark engines coerce every value alike')
+
+
+if __name__ == '__main__':
+    main()
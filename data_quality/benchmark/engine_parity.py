@@ -0,0 +1,158 @@
+import argparse
+import os
+import sys
+import tempfile
+
+from pyspark.sql import SparkSession
+
+from great_expectations.core.batch import RuntimeBatchRequest
+
+from synthetic_data import generate_sample_data, write_sample_data
+
+# import the validation scripts (they import the custom_expectations package)
+sys.path.append('../validate_data')
+from data_validation_with_checkpoints import get_data_context, get_logger
+from dataset_reader import get_suite_columns, read_dataset
+from pandas_validation import get_pandas_read_schema, list_local_files, \
+    read_pandas_dataset, validate_pandas_batch
+from suite_compiler import get_expectation_id
+from custom_expectations import register_suite_expectations
+
+# result fields that must be equal for both engines
+COMPARED_FIELDS = ("element_count", "missing_count", "unexpected_count",
+                   "observed_value")
+
+
+def _comparable(value):
+    # pandas returns numpy scalars where Spark returns Python ones
+    return value.item() if hasattr(value, "item") else value
+
+
+def compare_results(spark_results, pandas_results):
+    """
+    Compare the results of the same suite validated by the two engines.
+
+    Returns:
+        A list of (expectation id, field, Spark value, pandas value) tuples,
+        one per difference
+    """
+    pandas_by_id = {get_expectation_id(result.expectation_config): result
+                    for result in pandas_results}
+    differences = []
+    for spark_result in spark_results:
+        expectation_id = get_expectation_id(spark_result.expectation_config)
+        pandas_result = pandas_by_id.get(expectation_id)
+        if pandas_result is None:
+            differences.append((expectation_id, "result", "present",
+                                "missing"))
+            continue
+        if spark_result.success != pandas_result.success:
+            differences.append((expectation_id, "success",
+                                spark_result.success, pandas_result.success))
+        for field in COMPARED_FIELDS:
+            spark_value = _comparable(spark_result.result.get(field))
+            pandas_value = _comparable(pandas_result.result.get(field))
+            if spark_value != pandas_value:
+                differences.append((expectation_id, field, spark_value,
+                                    pandas_value))
+    return differences
+
+
+def check_parity(spark, spark_context, pandas_context, dataset_path,
+                 expectation_suite_name, logger):
+    """Validate a CSV dataset with both engines and compare the results."""
+    expectation_suite_json = spark_context.get_expectation_suite(
+        expectation_suite_name).to_json_dict()
+    files = list_local_files(dataset_path)
+    schema = get_pandas_read_schema(files, "csv", expectation_suite_json)
+    assert schema is not None, \
+        "The suite must declare the type of every column it references"
+    columns = get_suite_columns(expectation_suite_json)
+
+    spark_df = read_dataset(spark, dataset_path, "csv", columns=columns,
+                            schema=schema)
+    spark_validator = spark_context.get_validator(
+        batch_request=RuntimeBatchRequest(
+            datasource_name="filesystem_datasource",
+            data_connector_name="runtime_data_connector",
+            data_asset_name="data_asset_name",
+            batch_identifiers={"batch_id": "engine_parity"},
+            runtime_parameters={"batch_data": spark_df},
+        ),
+        expectation_suite_name=expectation_suite_name
+    )
+    spark_results = spark_validator.graph_validate(
+        configurations=spark_validator.expectation_suite.expectations)
+
+    pandas_df = read_pandas_dataset(files, "csv", schema, columns)
+    _, pandas_results = validate_pandas_batch(
+        pandas_context, pandas_df, schema, expectation_suite_name,
+        batch_id="engine_parity")
+
+    differences = compare_results(spark_results, pandas_results)
+    logger.info('{}: {} expectations, {} differences'.format(
+        dataset_path, len(spark_results), len(differences)))
+    for expectation_id, field, spark_value, pandas_value in differences:
+        logger.error('{} {}: spark {!r}, pandas {!r}'.format(
+            expectation_id, field, spark_value, pandas_value))
+    return not differences
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset_paths',
+                        help='The CSV datasets to validate with both engines',
+                        nargs="*",
+                        default=["/home/jovyan/work/data/sample_data.csv"])
+    parser.add_argument('--suite_name',
+                        help='The expectation suite name',
+                        default="sample_data.data_quality_check")
+    parser.add_argument('--synthetic_rows',
+                        help='Also compare the engines on a synthetic '
+                             'dataset of this many rows, with errors and '
+                             'nulls in every column; 0 to skip it',
+                        type=int,
+                        default=10000)
+    parser.add_argument('--error_rate',
+                        help='The error rate of the synthetic dataset',
+                        type=float,
+                        default=0.05)
+    parser.add_argument('--null_ratio',
+                        help='The null ratio of the synthetic dataset',
+                        type=float,
+                        default=0.05)
+    parser.add_argument('--log_level',
+                        help='The log level',
+                        default="info")
+    args = parser.parse_args()
+
+    logger = get_logger(logger_name=__file__, logger_level=args.log_level)
+    spark = SparkSession.builder.getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+    spark_context = get_data_context()
+    pandas_context = get_data_context(execution_engine="pandas")
+    register_suite_expectations(
+        spark_context.get_expectation_suite(args.suite_name))
+
+    dataset_paths = list(args.dataset_paths)
+    if args.synthetic_rows:
+        synthetic_path = os.path.join(tempfile.mkdtemp(), "synthetic.csv")
+        write_sample_data(
+            generate_sample_data(spark, args.synthetic_rows,
+                                 error_rate=args.error_rate,
+                                 null_ratio=args.null_ratio,
+                                 num_partitions=1),
+            synthetic_path, "csv")
+        dataset_paths.append(synthetic_path)
+
+    failed = [path for path in dataset_paths
+              if not check_parity(spark, spark_context, pandas_context, path,
+                                  args.suite_name, logger)]
+    if failed:
+        logger.error('The engines disagree on: {}'.format(", ".join(failed)))
+        sys.exit(1)
+    logger.info('The pandas and Spark engines agree on every dataset')
+
+
+if __name__ == '__main__':
+    main()
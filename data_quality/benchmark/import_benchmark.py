@@ -0,0 +1,141 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+from run_benchmark import get_commit
+
+DATA_QUALITY_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# what every entry point pays before touching any data
+IMPORT_TARGETS = OrderedDict([
+    ("great_expectations", "import great_expectations"),
+    ("custom_expectations", "import custom_expectations"),
+    ("custom_expectations_registered",
+     "import custom_expectations; "
+     "custom_expectations.register_all_expectations()"),
+    ("suite_compiler", "import suite_compiler"),
+    ("data_validation_with_checkpoints",
+     "import data_validation_with_checkpoints"),
+])
+
+RESULT_FIELDS = (
+    "commit", "target", "repeats", "wall_seconds_median", "wall_seconds_min",
+    "import_seconds_median", "modules",
+)
+
+
+def parse_importtime(stderr):
+    """
+    Parse the `-X importtime` report of a Python process.
+
+    Returns:
+        A dict of module -> (self, cumulative) import time in microseconds
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):] \
+            .split("|", 2)
+        modules[module.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def time_import(statement):
+    """Run an import statement in a fresh interpreter and time it."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [os.path.join(DATA_QUALITY_DIR, "validate_data"), DATA_QUALITY_DIR,
+         os.environ.get("PYTHONPATH", "")]))
+    start = time.time()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=os.path.join(DATA_QUALITY_DIR, "validate_data"), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    return time.time() - start, parse_importtime(process.stderr)
+
+
+def benchmark_import(target, statement, repeats, top):
+    wall_seconds = []
+    import_seconds = []
+    modules = {}
+    for _ in range(repeats):
+        wall, modules = time_import(statement)
+        wall_seconds.append(wall)
+        import_seconds.append(sum(self_us for self_us, _ in modules.values())
+                              / 1e6)
+    slowest = sorted(modules.items(), key=lambda item: -item[1][0])[:top]
+    return {
+        "target": target,
+        "repeats": repeats,
+        "wall_seconds_median": statistics.median(wall_seconds),
+        "wall_seconds_min": min(wall_seconds),
+        "import_seconds_median": statistics.median(import_seconds),
+        "modules": len(modules),
+        "slowest_modules": [
+            {"module": module, "self_us": self_us,
+             "cumulative_us": cumulative_us}
+            for module, (self_us, cumulative_us) in slowest],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets',
+                        help='The imports to time',
+                        choices=list(IMPORT_TARGETS),
+                        nargs="+",
+                        default=list(IMPORT_TARGETS))
+    parser.add_argument('--repeats',
+                        help='The fresh interpreters started per import',
+                        type=int,
+                        default=5)
+    parser.add_argument('--top',
+                        help='The slowest modules reported per import',
+                        type=int,
+                        default=10)
+    parser.add_argument('--output_dir',
+                        help='Where the benchmark results are written',
+                        default="/home/jovyan/work/benchmark/results")
+    args = parser.parse_args()
+
+    commit = get_commit()
+    measures = []
+    for target in args.targets:
+        measure = dict(benchmark_import(target, IMPORT_TARGETS[target],
+                                        args.repeats, args.top),
+                       commit=commit)
+        print('{}: {:.3f}s ({:.3f}s importing {} modules)'.format(
+            target, measure["wall_seconds_median"],
+            measure["import_seconds_median"], measure["modules"]))
+        measures.append(measure)
+
+    run_time = datetime.datetime.now(datetime.timezone.utc)
+    output_name = "import_benchmark_{}_{}".format(
+        commit or "nocommit", run_time.strftime("%Y%m%dT%H%M%S"))
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, output_name + ".json"), "w") as f:
+        json.dump({"commit": commit,
+                   "run_time": run_time.isoformat(),
+                   "python_version": sys.version,
+                   "measures": measures}, f, indent=2)
+    with open(os.path.join(args.output_dir, output_name + ".csv"), "w",
+              newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS,
+                                extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(measures)
+    print('Import benchmark results written to {}'.format(
+        os.path.join(args.output_dir, output_name)))
+
+
+if __name__ == '__main__':
+    main()
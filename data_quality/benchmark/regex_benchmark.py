@@ -0,0 +1,142 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import statistics
+import time
+
+from pyspark.sql import SparkSession
+import pyspark.sql.functions as f
+
+from run_benchmark import get_commit
+
+# import the regex lowering of the custom_expectations package
+import sys
+sys.path.append('../')
+from custom_expectations.regex_predicates import analyze_regex, match_regex
+
+# column -> regex of the sample_data.data_quality_check suite
+SUITE_PATTERNS = {
+    "video_id": "V[0-9]",
+    "user_id": "[0-9]{4}$",
+    "device_id": "d[0-9]{3}$",
+}
+
+RESULT_FIELDS = (
+    "commit", "rows", "error_rate", "column", "pattern", "lowered",
+    "matches", "rlike_seconds", "native_seconds", "speedup",
+)
+
+
+def generate_strings(spark, rows, error_rate, seed=42):
+    """
+    Generate string columns shaped like the `sample_data` ids, an
+    `error_rate` fraction of them not matching the suite regexes.
+    """
+    invalid = f.rand(seed) < error_rate
+    return spark.range(int(rows)).select(
+        f.when(invalid, f.concat(f.lit("X"), f.col("id").cast("string")))
+        .otherwise(f.concat(f.lit("V"), (f.col("id") + 1076930300)
+                            .cast("string"))).alias("video_id"),
+        f.when(invalid, f.lit("user"))
+        .otherwise(f.lpad((f.col("id") % 10000).cast("string"), 4, "0"))
+        .alias("user_id"),
+        f.when(invalid, f.lit("device"))
+        .otherwise(f.concat(f.lit("d"), f.lpad(
+            (f.col("id") % 1000).cast("string"), 3, "0")))
+        .alias("device_id"),
+    )
+
+
+def time_count(df, condition, repeats):
+    """Count the rows matching a condition, returning (count, seconds)."""
+    seconds = []
+    count = None
+    for _ in range(repeats):
+        start = time.time()
+        count = df.agg(f.sum(f.when(condition, 1).otherwise(0))) \
+            .collect()[0][0]
+        seconds.append(time.time() - start)
+    return count, statistics.median(seconds)
+
+
+def benchmark_pattern(df, column, pattern, repeats):
+    rlike_count, rlike_seconds = time_count(df, f.col(column).rlike(pattern),
+                                            repeats)
+    native_count, native_seconds = time_count(
+        df, match_regex(f.col(column), pattern), repeats)
+    # the lowered predicate must match exactly the rows rlike matches
+    assert rlike_count == native_count, \
+        "{} on {}: rlike matched {} rows, the lowered predicate {}".format(
+            pattern, column, rlike_count, native_count)
+    return {
+        "column": column,
+        "pattern": pattern,
+        "lowered": analyze_regex(pattern) is not None,
+        "matches": rlike_count,
+        "rlike_seconds": rlike_seconds,
+        "native_seconds": native_seconds,
+        "speedup": rlike_seconds / native_seconds if native_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows',
+                        help='The number of rows of the generated dataset',
+                        type=float,
+                        default=1e7)
+    parser.add_argument('--error_rate',
+                        help='The fraction of values not matching the regex',
+                        type=float,
+                        default=0.01)
+    parser.add_argument('--repeats',
+                        help='The runs per predicate, the median is kept',
+                        type=int,
+                        default=5)
+    parser.add_argument('--output_dir',
+                        help='Where the benchmark results are written',
+                        default="/home/jovyan/work/benchmark/results")
+    args = parser.parse_args()
+
+    spark = SparkSession.builder.getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+    # cached, so that both predicates are timed without the generation
+    df = generate_strings(spark, args.rows, args.error_rate).cache()
+    df.count()
+
+    commit = get_commit()
+    measures = []
+    for column, pattern in SUITE_PATTERNS.items():
+        measure = dict(benchmark_pattern(df, column, pattern, args.repeats),
+                       commit=commit, rows=int(args.rows),
+                       error_rate=args.error_rate)
+        print('{} on {}: rlike {:.3f}s, lowered {:.3f}s ({:.1f}x)'.format(
+            pattern, column, measure["rlike_seconds"],
+            measure["native_seconds"], measure["speedup"] or 0))
+        measures.append(measure)
+    df.unpersist()
+
+    run_time = datetime.datetime.now(datetime.timezone.utc)
+    output_name = "regex_benchmark_{}_{}".format(
+        commit or "nocommit", run_time.strftime("%Y%m%dT%H%M%S"))
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, output_name + ".json"),
+              "w") as f_json:
+        json.dump({"commit": commit,
+                   "run_time": run_time.isoformat(),
+                   "spark_version": spark.version,
+                   "measures": measures}, f_json, indent=2)
+    with open(os.path.join(args.output_dir, output_name + ".csv"), "w",
+              newline="") as f_csv:
+        writer = csv.DictWriter(f_csv, fieldnames=RESULT_FIELDS,
+                                extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(measures)
+    print('Regex benchmark results written to {}'.format(
+        os.path.join(args.output_dir, output_name)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import subprocess
+import time
+from urllib.request import urlopen
+
+from pyspark.sql import SparkSession
+
+from great_expectations.core.batch import RuntimeBatchRequest
+
+from synthetic_data import generate_sample_data, write_sample_data
+
+# import the validation scripts (they import the custom_expectations package)
+import sys
+sys.path.append('../validate_data')
+from data_validation_with_checkpoints import EXECUTION_MODES, \
+    add_validation_arguments, get_data_context, get_logger, validate_dataset
+from dataset_reader import get_read_schema, get_suite_columns, read_dataset
+from custom_expectations import register_suite_expectations
+
+RESULT_FIELDS = (
+    "commit", "rows", "input_format", "error_rate", "null_ratio",
+    "execution_mode", "scope", "expectation", "success", "wall_seconds",
+    "rows_per_second", "input_bytes", "shuffle_read_bytes",
+    "shuffle_write_bytes", "spilled_bytes", "peak_execution_memory",
+    "peak_executor_jvm_heap",
+)
+
+
+class SparkRestMetrics(object):
+    """
+    Read the metrics of the jobs of a job group from the Spark UI REST API.
+    """
+
+    def __init__(self, spark):
+        self.base_url = "{}/api/v1/applications/{}".format(
+            spark.sparkContext.uiWebUrl, spark.sparkContext.applicationId)
+        self.enabled = spark.sparkContext.uiWebUrl is not None
+
+    def _get(self, endpoint):
+        with urlopen("{}/{}".format(self.base_url, endpoint)) as response:
+            return json.loads(response.read().decode())
+
+    def job_group_metrics(self, job_group):
+        """
+        Sum the stage metrics of every job of a job group, the job groups
+        nested in it by the validation (`<job_group>/...`) included.
+        """
+        metrics = dict.fromkeys(("input_bytes", "shuffle_read_bytes",
+                                 "shuffle_write_bytes", "spilled_bytes",
+                                 "peak_execution_memory",
+                                 "peak_executor_jvm_heap"))
+        if not self.enabled:
+            return metrics
+        stage_ids = [stage_id for job in self._get("jobs")
+                     if job.get("jobGroup") == job_group or
+                     (job.get("jobGroup") or "").startswith(job_group + "/")
+                     for stage_id in job["stageIds"]]
+        stages = [attempt for stage_id in stage_ids
+                  for attempt in self._get("stages/{}".format(stage_id))]
+        metrics.update({
+            "input_bytes": sum(s.get("inputBytes", 0) for s in stages),
+            "shuffle_read_bytes": sum(s.get("shuffleReadBytes", 0)
+                                      for s in stages),
+            "shuffle_write_bytes": sum(s.get("shuffleWriteBytes", 0)
+                                       for s in stages),
+            "spilled_bytes": sum(s.get("memoryBytesSpilled", 0) +
+                                 s.get("diskBytesSpilled", 0)
+                                 for s in stages),
+            "peak_execution_memory": max(
+                [s.get("peakExecutionMemory", 0) for s in stages] or [0]),
+            # the executors peak is cumulative over the application lifetime
+            "peak_executor_jvm_heap": max(
+                [(e.get("peakMemoryMetrics") or {}).get("JVMHeapMemory", 0)
+                 for e in self._get("allexecutors")] or [0]),
+        })
+        return metrics
+
+
+def run_in_job_group(spark, job_group, fn):
+    """Run `fn` with its Spark jobs tagged by `job_group` and time it."""
+    spark.sparkContext.setJobGroup(job_group, job_group)
+    start = time.time()
+    try:
+        result = fn()
+    finally:
+        spark.sparkContext.setLocalProperty("spark.jobGroup.id", None)
+        spark.sparkContext.setLocalProperty("spark.job.description", None)
+    return result, time.time() - start
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"]).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_suite(spark, context, rest_metrics, dataset_path, args,
+                    execution_mode, rows, logger):
+    """Validate the whole suite with one execution mode."""
+    options = add_validation_arguments(
+        argparse.ArgumentParser()).parse_args([])
+    options.dataset_name = "sample_data"
+    options.suite_name = "data_quality_check"
+    options.dataset_path = dataset_path
+    options.input_format = args.input_format
+    options.execution_mode = execution_mode
+    options.state_store_dir = os.path.join(args.data_dir, "state_store")
+    job_group = "benchmark_{}_{}".format(execution_mode, rows)
+    success, wall_seconds = run_in_job_group(
+        spark, job_group,
+        lambda: validate_dataset(spark, context, options, logger,
+                                 batch_id=job_group))
+    return dict(rest_metrics.job_group_metrics(job_group),
+                execution_mode=execution_mode, scope="suite",
+                expectation=None, success=success,
+                wall_seconds=wall_seconds)
+
+
+def benchmark_expectations(spark, context, rest_metrics, dataset_path, args,
+                           rows):
+    """
+    Validate the suite expectations one at a time through GE, on the batch
+    read as `validate_dataset()` reads it: with the read schema and the
+    columns of the suite.
+    """
+    suite_json = context.get_expectation_suite(
+        "sample_data.data_quality_check").to_json_dict()
+    schema, _ = get_read_schema(
+        spark=spark,
+        path=dataset_path,
+        input_format=args.input_format,
+        expectation_suite=suite_json,
+        schema_cache_dir=add_validation_arguments(
+            argparse.ArgumentParser()).parse_args([]).schema_cache_dir
+    )
+    df = read_dataset(
+        spark=spark,
+        path=dataset_path,
+        input_format=args.input_format,
+        columns=get_suite_columns(suite_json),
+        schema=schema
+    )
+    validator = context.get_validator(
+        batch_request=RuntimeBatchRequest(
+            datasource_name="filesystem_datasource",
+            data_connector_name="runtime_data_connector",
+            data_asset_name="data_asset_name",
+            batch_identifiers={"batch_id": "benchmark_{}".format(rows)},
+            runtime_parameters={"batch_data": df},
+        ),
+        expectation_suite_name="sample_data.data_quality_check"
+    )
+    register_suite_expectations(validator.expectation_suite)
+    measures = []
+    for position, configuration in enumerate(
+            validator.expectation_suite.expectations):
+        name = "{} {}".format(configuration.expectation_type, json.dumps(
+            configuration.kwargs, sort_keys=True, default=str))
+        job_group = "benchmark_expectation_{}_{}".format(position, rows)
+        results, wall_seconds = run_in_job_group(
+            spark, job_group,
+            lambda: validator.graph_validate(configurations=[configuration]))
+        measures.append(dict(rest_metrics.job_group_metrics(job_group),
+                             execution_mode="checkpoint", scope="expectation",
+                             expectation=name, success=results[0].success,
+                             wall_seconds=wall_seconds))
+    return measures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows',
+                        help='The sizes of the synthetic datasets',
+                        type=lambda value: int(float(value)),
+                        nargs="+",
+                        default=[10 ** 5, 10 ** 6])
+    parser.add_argument('--error_rate',
+                        help='The ratio of unexpected values of each column',
+                        type=float,
+                        default=0.01)
+    parser.add_argument('--null_ratio',
+                        help='The ratio of null values of each column',
+                        type=float,
+                        default=0.001)
+    parser.add_argument('--execution_modes',
+                        help='The execution modes to benchmark',
+                        choices=EXECUTION_MODES,
+                        nargs="+",
+                        default=["checkpoint", "fused"])
+    parser.add_argument('--per_expectation',
+                        help='Also time every expectation on its own',
+                        action="store_true")
+    parser.add_argument('--input_format',
+                        help='The format the synthetic data is written in',
+                        choices=["csv", "parquet", "orc"],
+                        default="parquet")
+    parser.add_argument('--regenerate',
+                        help='Regenerate the datasets already written',
+                        action="store_true")
+    parser.add_argument('--data_dir',
+                        help='Where the synthetic datasets are written',
+                        default="/home/jovyan/work/benchmark/data")
+    parser.add_argument('--output_dir',
+                        help='Where the benchmark results are written',
+                        default="/home/jovyan/work/benchmark/results")
+    parser.add_argument('--log_level',
+                        help='The log level',
+                        default="info")
+
+    args, unknown_args = parser.parse_known_args()
+
+    logger = get_logger(logger_name=__file__,
+                        logger_level=args.log_level)
+
+    spark = SparkSession.builder.enableHiveSupport().getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+    logger.info('Spark session created')
+
+    context = get_data_context()
+    rest_metrics = SparkRestMetrics(spark)
+    commit = get_commit()
+
+    measures = []
+    for rows in args.rows:
+        dataset_path = os.path.join(
+            args.data_dir, "sample_data_{}_{}_{}.{}".format(
+                rows, args.error_rate, args.null_ratio, args.input_format))
+        if args.regenerate or not os.path.exists(dataset_path):
+            logger.info('Generating {} rows in {}'.format(rows, dataset_path))
+            write_sample_data(
+                generate_sample_data(spark, rows, args.error_rate,
+                                     args.null_ratio),
+                dataset_path, args.input_format)
+
+        rows_measures = [
+            benchmark_suite(spark, context, rest_metrics, dataset_path, args,
+                            execution_mode, rows, logger)
+            for execution_mode in args.execution_modes
+        ]
+        if args.per_expectation:
+            rows_measures.extend(benchmark_expectations(
+                spark, context, rest_metrics, dataset_path, args, rows))
+        for measure in rows_measures:
+            measure.update(
+                commit=commit, rows=rows, input_format=args.input_format,
+                error_rate=args.error_rate, null_ratio=args.null_ratio,
+                rows_per_second=rows / measure["wall_seconds"]
+                if measure["wall_seconds"] else None)
+            logger.info('{} rows, {} {}: {:.2f}s'.format(
+                rows, measure["execution_mode"],
+                measure["expectation"] or "suite", measure["wall_seconds"]))
+        measures.extend(rows_measures)
+
+    run_time = datetime.datetime.now(datetime.timezone.utc)
+    output_name = "benchmark_{}_{}".format(
+        commit or "nocommit", run_time.strftime("%Y%m%dT%H%M%S"))
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, output_name + ".json"), "w") as f:
+        json.dump({"commit": commit,
+                   "run_time": run_time.isoformat(),
+                   "spark_version": spark.version,
+                   "measures": measures}, f, indent=2)
+    with open(os.path.join(args.output_dir, output_name + ".csv"), "w",
+              newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(measures)
+    logger.info('Benchmark results written to {}'.format(
+        os.path.join(args.output_dir, output_name)))
+
+
+if __name__ == '__main__':
+    main()
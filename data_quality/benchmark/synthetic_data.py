@@ -0,0 +1,75 @@
+import pyspark.sql.functions as f
+
+# import the reader options shared with the validation scripts
+import sys
+sys.path.append('../validate_data')
+from dataset_reader import CSV_OPTIONS
+
+
+def _corrupt(expected, corrupted, error_rate, seed):
+    # a given fraction of the values is replaced by an unexpected one
+    return f.when(f.rand(seed) < error_rate, corrupted).otherwise(expected)
+
+
+def _nullify(column, null_ratio, seed):
+    return f.when(f.rand(seed) < null_ratio, f.lit(None)).otherwise(column)
+
+
+def generate_sample_data(spark, rows, error_rate=0.01, null_ratio=0.001,
+                         seed=42, num_partitions=None):
+    """
+    Generate a synthetic dataset with the schema of `data/sample_data.csv`.
+
+    Every column breaks the `sample_data.data_quality_check` expectations on
+    about `error_rate` of the rows (a video id without the `V` prefix, a time
+    spent exceeding the video duration, a video longer than one hour, user
+    and device ids in the wrong format) and is null on about `null_ratio` of
+    the rows.
+
+    Args:
+        spark (SparkSession): The Spark session
+        rows (int): The number of rows
+        error_rate (float): The ratio of unexpected values of each column
+        null_ratio (float): The ratio of null values of each column
+        seed (int): The random seed
+        num_partitions (int or None): The number of partitions of the data
+
+    Returns:
+        A DataFrame
+    """
+    df = spark.range(0, rows, numPartitions=num_partitions)
+    video_duration = (f.col("id") * 7919 % 3600).cast("int")
+    columns = {
+        "video_id": _corrupt(
+            f.concat(f.lit("V"), f.lpad((f.col("id") % 10 ** 10)
+                                        .cast("string"), 10, "0")),
+            f.lpad((f.col("id") % 10 ** 10).cast("string"), 11, "X"),
+            error_rate, seed),
+        "time_spent": _corrupt(
+            (video_duration * f.rand(seed + 1)).cast("int"),
+            video_duration + 10,
+            error_rate, seed + 2),
+        "video_duration": _corrupt(
+            video_duration, video_duration + 3601, error_rate, seed + 3),
+        "customer_id": f.lpad((f.col("id") % 10000).cast("string"), 4, "0"),
+        "user_id": _corrupt(
+            f.lpad((f.col("id") % 10000).cast("string"), 4, "0"),
+            f.lit("user"), error_rate, seed + 4),
+        "device_id": _corrupt(
+            f.concat(f.lit("d"), f.lpad((f.col("id") % 1000)
+                                        .cast("string"), 3, "0")),
+            f.lpad((f.col("id") % 1000).cast("string"), 4, "0"),
+            error_rate, seed + 5),
+    }
+    return df.select(*[
+        _nullify(column, null_ratio, seed + 10 + position).alias(name)
+        for position, (name, column) in enumerate(columns.items())
+    ])
+
+
+def write_sample_data(df, path, input_format):
+    """Write a synthetic dataset so that the validation scripts can read it."""
+    writer = df.write.mode("overwrite").format(input_format)
+    if input_format == "csv":
+        writer = writer.options(**CSV_OPTIONS)
+    writer.save(path)
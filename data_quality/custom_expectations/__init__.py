@@ -1,6 +1,92 @@
-from custom_expectations.expect_column_length_match_input_length import \
-    ExpectColumnLengthMatchInputLength
-from custom_expectations.expect_column_pair_a_to_be_approximately_smaller_or_equal_than_b import \
-    ExpectColumnPairAToBeApproximatelySmallerOrEqualThanB
-from custom_expectations.expect_multicolumn_customer_id_user_id_device_id import \
-    ExpectMulticolumnCustomerIdUserIdDeviceId
+"""
+Lazy registry of the Custom Expectations.
+
+Great Expectations registers an expectation type when its class is defined,
+so the modules are only imported when a suite references one of their
+expectation types (`register_suite_expectations()`), or on first access of
+their classes, e.g. `from custom_expectations import
+ExpectColumnLengthMatchInputLength` still works.
+"""
+import importlib
+
+# expectation type -> (module, expectation class, metric provider class)
+EXPECTATIONS = {
+    "expect_column_length_match_input_length": (
+        "expect_column_length_match_input_length",
+        "ExpectColumnLengthMatchInputLength",
+        "ColumnMetricCustom"),
+    "expect_column_pair_a_to_be_approximately_smaller_or_equal_than_b": (
+        "expect_column_pair_a_to_be_approximately_smaller_or_equal_than_b",
+        "ExpectColumnPairAToBeApproximatelySmallerOrEqualThanB",
+        "ColumnPairCustom"),
+    "expect_multicolumn_customer_id_user_id_device_id": (
+        "expect_multicolumn_customer_id_user_id_device_id",
+        "ExpectMulticolumnCustomerIdUserIdDeviceId",
+        "MulticolumnCustomMetric"),
+}
+
+_CLASS_MODULES = {
+    class_name: module_name
+    for module_name, expectation_class, provider_class in EXPECTATIONS.values()
+    for class_name in (expectation_class, provider_class)
+}
+
+
+def _import(module_name):
+    return importlib.import_module("{}.{}".format(__name__, module_name))
+
+
+def register_expectation(expectation_type):
+    """
+    Import the module of a Custom Expectation, registering its expectation
+    type and metric with Great Expectations.
+
+    Returns:
+        The expectation class, None if the type is not a Custom Expectation
+    """
+    if expectation_type not in EXPECTATIONS:
+        return None
+    module_name, expectation_class, _ = EXPECTATIONS[expectation_type]
+    return getattr(_import(module_name), expectation_class)
+
+
+def register_suite_expectations(expectation_suite):
+    """
+    Register the Custom Expectations referenced by an Expectation Suite.
+
+    Args:
+        expectation_suite (ExpectationSuite or dict): The suite, or its JSON
+
+    Returns:
+        The sorted list of the Custom Expectation types registered
+    """
+    if isinstance(expectation_suite, dict):
+        expectation_types = {configuration["expectation_type"] for
+                             configuration in expectation_suite.get(
+                                 "expectations", [])}
+    else:
+        expectation_types = {configuration.expectation_type for
+                             configuration in expectation_suite.expectations}
+    registered = sorted(expectation_types.intersection(EXPECTATIONS))
+    for expectation_type in registered:
+        register_expectation(expectation_type)
+    return registered
+
+
+def register_all_expectations():
+    """Register every Custom Expectation, e.g. while developing a suite."""
+    for expectation_type in EXPECTATIONS:
+        register_expectation(expectation_type)
+
+
+def get_metric_provider(expectation_type):
+    """Return the metric provider class of a Custom Expectation."""
+    module_name, _, provider_class = EXPECTATIONS[expectation_type]
+    return getattr(_import(module_name), provider_class)
+
+
+def __getattr__(name):
+    if name in _CLASS_MODULES:
+        return getattr(_import(_CLASS_MODULES[name]), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(
+        __name__, name))
@@ -1,6 +1,7 @@
 import json
 
 from great_expectations.execution_engine import (
+   PandasExecutionEngine,
    SparkDFExecutionEngine,
 )
 from great_expectations.expectations.expectation import ColumnMapExpectation
@@ -25,6 +26,15 @@ class ColumnMetricCustom(ColumnMapMetricProvider):
     condition_metric_name = "column_values.match_input_length"
     condition_value_keys = ("length",)
 
+    @column_condition_partial(engine=PandasExecutionEngine)
+    def _pandas(cls, column, length=None, **kwargs):
+        assert length, "length parameter could not be None."
+        assert type(length) == int, "length must be of type integer."
+
+        # Spark casts the values to string before taking their length
+        return (column.astype(str).str.len() == length) & \
+               (column.notnull())
+
     @column_condition_partial(engine=SparkDFExecutionEngine)
     def _spark(cls, column, length=None, **kwargs):
         assert length, "length parameter could not be None."
@@ -64,6 +74,10 @@ class ExpectColumnLengthMatchInputLength(ColumnMapExpectation):
                     "b": "StringType"
                 }
             },
+            "test_backends": [
+                {"backend": "pandas", "dialects": None},
+                {"backend": "spark", "dialects": None},
+            ],
             "tests": [
                 {
                     "title": "positive_test",
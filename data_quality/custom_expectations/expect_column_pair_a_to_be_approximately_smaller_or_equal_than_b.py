@@ -1,6 +1,7 @@
 import json
 
-from great_expectations.execution_engine import SparkDFExecutionEngine
+from great_expectations.execution_engine import PandasExecutionEngine, \
+    SparkDFExecutionEngine
 from great_expectations.expectations.expectation import \
     ColumnPairMapExpectation
 from great_expectations.expectations.metrics.map_metric_provider import (
@@ -29,6 +30,23 @@ class ColumnPairCustom(ColumnPairMapMetricProvider):
     )
     condition_value_keys = ("n_approximate",)
 
+    @column_pair_condition_partial(engine=PandasExecutionEngine)
+    def _pandas(cls, column_A, column_B, **kwargs):
+
+        assert (kwargs.get("n_approximate") is None) or \
+               (type(kwargs.get("n_approximate")) == int), \
+            "The paramenter n_approximate must be integer."
+
+        if kwargs.get("n_approximate") is not None:
+            approx = kwargs.get("n_approximate")
+        else:
+            approx = 0
+
+        # a comparison with a null is null in Spark, which does not count the
+        # row as unexpected
+        return ((column_A <= column_B + approx) | column_A.isnull()
+                | column_B.isnull()).astype(bool)
+
     @column_pair_condition_partial(engine=SparkDFExecutionEngine)
     def _spark(cls, column_A, column_B, **kwargs):
 
@@ -77,14 +95,20 @@ class ExpectColumnPairAToBeApproximatelySmallerOrEqualThanB(ColumnPairMapExpecta
                 "a": [11, 22, 50],
                 "b": [10, 21, 100],
                 "c": [9, 21, 30],
+                "d": [11, None, 50],
             },
             "schemas": {
                 "spark": {
                     "a": "IntegerType",
                     "b": "IntegerType",
-                    "c": "IntegerType"
+                    "c": "IntegerType",
+                    "d": "IntegerType"
                 }
             },
+            "test_backends": [
+                {"backend": "pandas", "dialects": None},
+                {"backend": "spark", "dialects": None},
+            ],
             "tests": [
                 {
                     "title": "positive_test",
@@ -100,6 +124,13 @@ class ExpectColumnPairAToBeApproximatelySmallerOrEqualThanB(ColumnPairMapExpecta
                     "in": {"column_A": "a", "column_B": "c"},
                     "out": {"success": False},
                 },
+                {
+                    "title": "null_values_test",
+                    "exact_match_out": False,
+                    "include_in_gallery": False,
+                    "in": {"column_A": "a", "column_B": "d"},
+                    "out": {"success": True},
+                },
             ],
         },
     ]
@@ -237,7 +268,9 @@ class ExpectColumnPairAToBeApproximatelySmallerOrEqualThanB(ColumnPairMapExpecta
 
             # Check to see if we have *all* of the unexpected values accounted for. If so,
             # we show counts. If not, we only show "sampled" unexpected values.
-            if total_count == result_dict.get("unexpected_count"):
+            if result_dict.get("partial_unexpected_counts_approximate"):
+                header_row = ["Unexpected Value", "Approximate Count"]
+            elif total_count == result_dict.get("unexpected_count"):
                 header_row = ["Unexpected Value", "Count"]
             else:
                 header_row = ["Sampled Unexpected Values"]
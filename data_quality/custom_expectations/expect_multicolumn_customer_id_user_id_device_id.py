@@ -1,6 +1,7 @@
 import json
 
-from great_expectations.execution_engine import SparkDFExecutionEngine
+from great_expectations.execution_engine import PandasExecutionEngine, \
+    SparkDFExecutionEngine
 from great_expectations.expectations.expectation import MulticolumnMapExpectation
 from great_expectations.expectations.metrics.map_metric_provider import (
     MulticolumnMapMetricProvider,
@@ -15,6 +16,8 @@ from great_expectations.render.util import (
     num_to_str
 )
 
+from custom_expectations.regex_predicates import match_regex
+
 
 class MulticolumnCustomMetric(MulticolumnMapMetricProvider):
 
@@ -28,6 +31,26 @@ class MulticolumnCustomMetric(MulticolumnMapMetricProvider):
 
     condition_value_keys = ("device_id_regex",)
 
+    @multicolumn_condition_partial(engine=PandasExecutionEngine)
+    def _pandas(cls, column_list, **kwargs):
+        device_id_regex = kwargs.get("device_id_regex")
+        assert device_id_regex is not None, "device_id_regex parameter must be set."
+        assert type(device_id_regex) == str, "device_id_regex must be of type string."
+
+        customer_id, user_id, device_id = (
+            column_list.iloc[:, position] for position in range(3))
+        # a null device_id makes the Spark condition null, which does not
+        # count the row as unexpected
+        return (customer_id.notnull()) \
+               & ((user_id.notnull() &
+                   (customer_id == user_id))
+                | (
+                 (user_id.isnull()) &
+                 (device_id.isnull() |
+                  (device_id.astype(str).str.contains(device_id_regex) &
+                   (customer_id == device_id))))
+               )
+
     @multicolumn_condition_partial(engine=SparkDFExecutionEngine)
     def _spark(cls, column_list, **kwargs):
         device_id_regex = kwargs.get("device_id_regex")
@@ -39,7 +62,7 @@ class MulticolumnCustomMetric(MulticolumnMapMetricProvider):
                    (column_list[0] == column_list[1]))
                 | (
                  (column_list[1].isNull()) &
-                (column_list[2].rlike(device_id_regex)) &
+                (match_regex(column_list[2], device_id_regex)) &
                 (column_list[0] == column_list[2]))
                )
 
@@ -84,6 +107,10 @@ class ExpectMulticolumnCustomerIdUserIdDeviceId(MulticolumnMapExpectation):
                     "d": "StringType"
                 }
             },
+            "test_backends": [
+                {"backend": "pandas", "dialects": None},
+                {"backend": "spark", "dialects": None},
+            ],
             "tests": [
                 {
                     "title": "positive_test",
@@ -204,10 +231,12 @@ class ExpectMulticolumnCustomerIdUserIdDeviceId(MulticolumnMapExpectation):
         # Based on the https://github.com/great-expectations/great_expectations/issues/4295
         # we add a condition to ignore the partial_unexpected_counts parameter in case of
         # hashable type error for MulticolumnMapExpectation and render only the
-        # partial_unexpected_list.
+        # partial_unexpected_list. The validation scripts can fill it with the
+        # approximate top-k unexpected column tuples instead
+        # (see validate_data/unexpected_top_k.py).
 
         if result_dict.get("partial_unexpected_counts") and not \
-            result_dict["partial_unexpected_counts"][0]["error"] == \
+            result_dict["partial_unexpected_counts"][0].get("error") == \
                 "partial_exception_counts requires a hashable type":
             # We will check to see whether we have *all* of the unexpected values
             # accounted for in our count, and include counts if we do. If we do not,
@@ -226,7 +255,11 @@ class ExpectMulticolumnCustomerIdUserIdDeviceId(MulticolumnMapExpectation):
                 value = unexpected_count_dict.get("value")
                 count = unexpected_count_dict.get("count")
                 total_count += count
-                if value is not None and value != "":
+                if isinstance(value, dict):
+                    table_rows.append([", ".join(
+                        f"{column}: {column_value}"
+                        for column, column_value in value.items()), count])
+                elif value is not None and value != "":
                     table_rows.append([value, count])
                 elif value == "":
                     table_rows.append(["EMPTY", count])
@@ -235,7 +268,9 @@ class ExpectMulticolumnCustomerIdUserIdDeviceId(MulticolumnMapExpectation):
 
             # Check to see if we have *all* of the unexpected values accounted for. If so,
             # we show counts. If not, we only show "sampled" unexpected values.
-            if total_count == result_dict.get("unexpected_count"):
+            if result_dict.get("partial_unexpected_counts_approximate"):
+                header_row = ["Unexpected Value", "Approximate Count"]
+            elif total_count == result_dict.get("unexpected_count"):
                 header_row = ["Unexpected Value", "Count"]
             else:
                 header_row = ["Sampled Unexpected Values"]
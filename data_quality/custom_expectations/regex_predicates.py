@@ -0,0 +1,212 @@
+"""
+Lowering of simple regular expressions to Catalyst-native predicates.
+
+`Column.rlike()` evaluates a Java regex on every row, while patterns like
+`d[0-9]{3}$` or `V[0-9]` only check a few characters at fixed positions:
+`match_regex()` rewrites them into `length`, `substr` and string comparisons,
+which Spark evaluates without the regex engine.
+"""
+from functools import reduce
+
+import pyspark.sql.functions as f
+
+# Characters with a special meaning in a regex
+REGEX_METACHARACTERS = set(".^$|?*+()[]{}\\")
+
+# Patterns checking more positions are left to `rlike()`, whose single call
+# is then cheaper than the lowered expression.
+MAX_LOWERED_POSITIONS = 32
+
+DIGITS = (("0", "9"),)
+
+
+class RegexShape(object):
+    """
+    A regex matching a fixed sequence of characters, each one of a set of
+    ASCII character ranges, optionally anchored at the start and the end.
+
+    Attributes:
+        positions (list): One tuple of (first, last) character ranges per
+            matched character
+        anchored_start (bool), anchored_end (bool): Whether the pattern
+            starts with `^` or ends with `$`
+    """
+
+    def __init__(self, positions, anchored_start, anchored_end):
+        self.positions = positions
+        self.anchored_start = anchored_start
+        self.anchored_end = anchored_end
+
+    @property
+    def literal(self):
+        """The matched string when every position is a single character."""
+        if all(len(ranges) == 1 and ranges[0][0] == ranges[0][1]
+               for ranges in self.positions):
+            return "".join(ranges[0][0] for ranges in self.positions)
+        return None
+
+
+def _parse_class(pattern, index):
+    # a [...] class of single characters and ranges, e.g. [0-9] or [a-fA-F]
+    end = pattern.find("]", index)
+    body = pattern[index + 1:end]
+    if end < 0 or not body or body.startswith("^") or "\\" in body \
+            or "[" in body or "&&" in body:
+        return None, None
+    ranges = []
+    position = 0
+    while position < len(body):
+        if position + 2 < len(body) and body[position + 1] == "-":
+            first, last = body[position], body[position + 2]
+            position += 3
+        else:
+            first = last = body[position]
+            position += 1
+        if first > last or not (first + last).isascii():
+            return None, None
+        ranges.append((first, last))
+    return tuple(ranges), end + 1
+
+
+def _parse_quantifier(pattern, index):
+    # only the fixed `{n}` repetition keeps the match length fixed
+    if index >= len(pattern) or pattern[index] != "{":
+        if index < len(pattern) and pattern[index] in "?*+":
+            return None, None
+        return 1, index
+    end = pattern.find("}", index)
+    count = pattern[index + 1:end]
+    if end < 0 or not count.isdigit() or int(count) < 1:
+        return None, None
+    return int(count), end + 1
+
+
+def analyze_regex(pattern):
+    """
+    Work out whether a regex can be lowered to native predicates.
+
+    Supported patterns are sequences of literal ASCII characters, `\\d` and
+    `[...]` classes, each optionally repeated `{n}` times, with optional `^`
+    and `$` anchors, e.g. `V[0-9]`, `d[0-9]{3}$` or `^[A-Z]{2}-\\d{4}$`.
+
+    Returns:
+        A RegexShape, or None when the pattern is not supported
+    """
+    anchored_start = pattern.startswith("^")
+    anchored_end = pattern.endswith("$") and not pattern.endswith("\\$")
+    body = pattern[int(anchored_start):len(pattern) - int(anchored_end)]
+    positions = []
+    index = 0
+    while index < len(body):
+        char = body[index]
+        if char == "[":
+            ranges, index = _parse_class(body, index)
+        elif char == "\\" and index + 1 < len(body):
+            escaped = body[index + 1]
+            if escaped == "d":
+                ranges = DIGITS
+            elif escaped.isascii() and escaped.isprintable() \
+                    and not escaped.isalnum():
+                # a backslash before a non-alphanumeric character quotes it
+                ranges = ((escaped, escaped),)
+            else:
+                return None
+            index += 2
+        elif char in REGEX_METACHARACTERS or not char.isascii() \
+                or not char.isprintable():
+            return None
+        else:
+            ranges = ((char, char),)
+            index += 1
+        if ranges is None:
+            return None
+        count, index = _parse_quantifier(body, index)
+        if count is None:
+            return None
+        positions.extend([ranges] * count)
+    if not positions or len(positions) > MAX_LOWERED_POSITIONS:
+        return None
+    return RegexShape(positions, anchored_start, anchored_end)
+
+
+def _char_condition(char, ranges):
+    return reduce(lambda a, b: a | b, [
+        char == first if first == last else char.between(first, last)
+        for first, last in ranges])
+
+
+def _positions_condition(column, positions, start):
+    """
+    The characters of `column` from `start` (1-based, negative to count from
+    the end) match `positions`; runs of literal characters are compared as
+    one substring.
+    """
+    conditions = []
+    index = 0
+    while index < len(positions):
+        run = index
+        while run < len(positions) and len(positions[run]) == 1 and \
+                positions[run][0][0] == positions[run][0][1]:
+            run += 1
+        if run > index:
+            literal = "".join(ranges[0][0] for ranges in positions[index:run])
+            conditions.append(column.substr(start + index, run - index)
+                              == literal)
+            index = run
+        else:
+            conditions.append(_char_condition(
+                column.substr(start + index, 1), positions[index]))
+            index += 1
+    return reduce(lambda a, b: a & b, conditions)
+
+
+def lower_regex(column, shape):
+    """
+    Build the native predicate of a RegexShape.
+
+    Returns:
+        A (condition, exact) tuple: when `exact` is False the condition is
+        only sufficient for a match and must be completed by `rlike()`
+    """
+    length = len(shape.positions)
+    if not shape.anchored_start and not shape.anchored_end \
+            and shape.literal is not None:
+        return column.contains(shape.literal), True
+    # a match at the start is always a match of the unanchored find as well
+    start = -length if shape.anchored_end and not shape.anchored_start \
+        else 1
+    condition = (f.length(column) >= length) & \
+        _positions_condition(column, shape.positions, start)
+    if shape.anchored_start and shape.anchored_end:
+        condition = (f.length(column) == length) & condition
+    # a Java `$` also matches before a final line terminator, which only
+    # `rlike()` handles
+    exact = shape.anchored_start and not shape.anchored_end
+    return condition, exact
+
+
+def match_regex(column, pattern):
+    """
+    A drop-in replacement of `column.rlike(pattern)`.
+
+    Patterns supported by `analyze_regex()` are lowered to native predicates;
+    when the native predicate is only sufficient, `rlike()` is evaluated on
+    the rows it does not match, e.g. the unexpected ones. The other patterns
+    are left to `rlike()`.
+
+    Args:
+        column (Column): The string column
+        pattern (str): A Java regex, matched anywhere in the values as
+            `rlike()` does
+
+    Returns:
+        A boolean Column
+    """
+    shape = analyze_regex(pattern)
+    if shape is None:
+        return column.rlike(pattern)
+    condition, exact = lower_regex(column, shape)
+    if exact:
+        return condition
+    # Or is short-circuited: rlike only runs when the native check fails
+    return condition | column.rlike(pattern)
@@ -1,37 +1,108 @@
+import argparse
+import hashlib
+import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 sys.path.append('/app/src/data_quality')
 
+from great_expectations import __version__ as ge_version
 from great_expectations.data_context.types.base import DataContextConfig
 from great_expectations.data_context import BaseDataContext
 from great_expectations.data_context.types.resource_identifiers import \
-    ExpectationSuiteIdentifier
+    ExpectationSuiteIdentifier, ValidationResultIdentifier
+from great_expectations.data_context.util import instantiate_class_from_config
 
+DOCS_MANIFEST_NAME = ".docs_manifest.json"
+
+
+def get_file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def list_expectation_suites(abs_expectation_suites_path):
+    """Return a dict of expectation suite name -> suite JSON file path."""
+    suites = {}
+    for folder in os.listdir(abs_expectation_suites_path):
+        print('- {}'.format(folder))
+        if not folder.startswith('.'):
+            for suite in os.listdir(
+                    os.path.join(abs_expectation_suites_path, folder)):
+                print('  - {}'.format(suite))
+                suites["{}.{}".format(folder, suite[:-5])] = os.path.join(
+                    abs_expectation_suites_path, folder, suite)
+    return suites
+
+
+def list_validation_results(abs_validation_path):
+    """
+    Return a dict of validation result key ("/" joined tuple of the
+    ValidationResultIdentifier) -> validation result JSON file path.
+    """
+    validations = {}
+    if not os.path.isdir(abs_validation_path):
+        return validations
+    for root, dirs, files in os.walk(abs_validation_path):
+        dirs[:] = [folder for folder in dirs if not folder.startswith('.')]
+        for file_name in files:
+            if file_name.endswith(".json"):
+                path = os.path.join(root, file_name)
+                key = os.path.relpath(path, abs_validation_path)[:-5]
+                validations[key.replace(os.sep, "/")] = path
+    return validations
+
+
+def load_docs_manifest(abs_site_path):
+    manifest_path = os.path.join(abs_site_path, DOCS_MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_docs_manifest(abs_site_path, manifest):
+    os.makedirs(abs_site_path, exist_ok=True)
+    manifest_path = os.path.join(abs_site_path, DOCS_MANIFEST_NAME)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def get_data_context(abs_expectation_suites_path, abs_validation_path,
+                     abs_site_path, with_datasource=True):
+    """
+    Args:
+        with_datasource (bool): Whether to add the Spark datasource; without
+            it no SparkSession is started, the pages being rendered from the
+            stores alone
+    """
+    datasources = {
+        "spark_ds": {
+            "class_name": "Datasource",
+            "module_name": "great_expectations.datasource",
+            'execution_engine': {
+                'module_name': 'great_expectations.execution_engine',
+                'class_name': 'SparkDFExecutionEngine'
+            },
+            "data_connectors": {
+                "default_runtime_data_connector_name": {
+                    "class_name": "RuntimeDataConnector",
+                    "batch_identifiers": ["batch_id"],
+                },
+            },
+        }
+    }
+    if not with_datasource:
+        datasources = {}
 
-def generate_expectation_suites_doc_site(
-        abs_expectation_suites_path,
-        abs_validation_path,
-        abs_site_path
-):
     data_context_config = DataContextConfig(
         plugins_directory=None,
         config_variables_file_path=None,
-        datasources={
-            "spark_ds": {
-                "class_name": "Datasource",
-                "module_name": "great_expectations.datasource",
-                'execution_engine': {
-                    'module_name': 'great_expectations.execution_engine',
-                    'class_name': 'SparkDFExecutionEngine'
-                },
-                "data_connectors": {
-                    "default_runtime_data_connector_name": {
-                        "class_name": "RuntimeDataConnector",
-                        "batch_identifiers": ["batch_id"],
-                    },
-                },
-            }
-        },
+        datasources=datasources,
         stores={
             "expectations_local_store": {
                 "class_name": "ExpectationsStore",
@@ -71,26 +142,192 @@ def generate_expectation_suites_doc_site(
         }
     )
 
-    context = BaseDataContext(project_config=data_context_config)
+    return BaseDataContext(project_config=data_context_config)
 
-    resource_identifiers = []
-    for folder in os.listdir(abs_expectation_suites_path):
-        print('- {}'.format(folder))
-        if not folder.startswith('.'):
-            for suite in os.listdir(
-                    os.path.join(abs_expectation_suites_path, folder)):
-                print('  - {}'.format(suite))
-                suite_identifier = ExpectationSuiteIdentifier(
-                    expectation_suite_name="{}.{}".format(folder, suite[:-5]))
-                resource_identifiers.append(suite_identifier)
-    context.build_data_docs(resource_identifiers=resource_identifiers)
+
+def get_resource_identifiers(suite_names, validation_keys):
+    return [
+        ExpectationSuiteIdentifier(expectation_suite_name=suite_name)
+        for suite_name in suite_names
+    ] + [
+        ValidationResultIdentifier.from_tuple(tuple(key.split("/")))
+        for key in validation_keys
+    ]
+
+
+def render_pages(context_paths, suite_names, validation_keys):
+    """
+    Render the pages of some expectation suites and validation results, in
+    a worker process with its own Data Context, without the index; the
+    worker Data Context has no datasource, so no JVM is started per worker.
+
+    Returns:
+        The number of resources rendered
+    """
+    context = get_data_context(*context_paths, with_datasource=False)
+    context.build_data_docs(
+        resource_identifiers=get_resource_identifiers(suite_names,
+                                                      validation_keys),
+        build_index=False)
+    return len(suite_names) + len(validation_keys)
+
+
+def render_pages_in_parallel(context_paths, suite_names, validation_keys,
+                             workers):
+    """
+    Split the pages to render across a pool of `workers` processes, each
+    writing its pages to the shared site directory.
+    """
+    chunks = [(suite_names[position::workers],
+               validation_keys[position::workers])
+              for position in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(render_pages, context_paths, chunk_suites,
+                            chunk_validations)
+            # an empty chunk would render every page
+            for chunk_suites, chunk_validations in chunks
+            if chunk_suites or chunk_validations
+        ]
+        for future in as_completed(futures):
+            print('{} pages rendered'.format(future.result()))
+
+
+def get_page_path(abs_site_path, section, key):
+    # the expectation suite pages are nested by the suite name parts
+    parts = key.split(".") if section == "expectations" else key.split("/")
+    return os.path.join(abs_site_path, section, *parts) + ".html"
+
+
+def get_changed_resources(section, sources, previous_hashes, abs_site_path,
+                          full_rebuild=False):
+    """
+    Compare the content hashes of the sources of a Data Docs section with
+    those of the previous build.
+
+    Args:
+        section (str): "expectations" or "validations"
+        sources (dict): The resource key -> source JSON file path
+        previous_hashes (dict): The resource key -> hash of the last build
+        abs_site_path (str): The site directory
+        full_rebuild (bool): If True, every resource is changed
+
+    Returns:
+        A (hashes, changed keys, removed keys) tuple; the resources whose
+        HTML page is missing are changed as well
+    """
+    hashes = {key: get_file_hash(path) for key, path in sources.items()}
+    changed = [
+        key for key, content_hash in hashes.items()
+        if full_rebuild or previous_hashes.get(key) != content_hash or
+        not os.path.exists(get_page_path(abs_site_path, section, key))
+    ]
+    removed = [key for key in previous_hashes if key not in hashes]
+    return hashes, changed, removed
+
+
+def build_index_pages(context):
+    """Build the index page of every Data Docs site, and nothing else."""
+    for site_name, site_config in context.variables.data_docs_sites.items():
+        site_builder = instantiate_class_from_config(
+            config=site_config,
+            runtime_environment={
+                "data_context": context,
+                "root_directory": context.root_directory,
+                "site_name": site_name,
+            },
+            config_defaults={
+                "module_name": "great_expectations.render.renderer."
+                               "site_builder"},
+        )
+        # the pages of the removed resources are cleaned by the index build
+        site_builder.site_index_builder.build()
+
+
+def generate_expectation_suites_doc_site(
+        abs_expectation_suites_path,
+        abs_validation_path,
+        abs_site_path,
+        full_rebuild=False,
+        workers=1
+):
+    """
+    Build the Data Docs of the expectation suites and validation results,
+    rendering only the pages whose suite or validation result changed since
+    the last build (according to the content hashes kept in the
+    `.docs_manifest.json` file of the site) and the index.
+
+    Args:
+        abs_expectation_suites_path (str): The expectation suites directory
+        abs_validation_path (str): The validation results directory
+        abs_site_path (str): The Data Docs site directory
+        full_rebuild (bool): Render every page
+        workers (int): The number of processes rendering the pages; the
+            index is built once they are all done
+
+    Returns:
+        True
+    """
+    context = get_data_context(abs_expectation_suites_path,
+                               abs_validation_path, abs_site_path)
+
+    manifest = load_docs_manifest(abs_site_path)
+    # a new Great Expectations version may render every page differently
+    full_rebuild = full_rebuild or \
+        manifest.get("great_expectations_version") != ge_version
+
+    suite_hashes, changed_suites, removed_suites = get_changed_resources(
+        "expectations",
+        list_expectation_suites(abs_expectation_suites_path),
+        manifest.get("expectation_suites", {}), abs_site_path, full_rebuild)
+    validation_hashes, changed_validations, removed_validations = \
+        get_changed_resources(
+            "validations", list_validation_results(abs_validation_path),
+            manifest.get("validations", {}), abs_site_path, full_rebuild)
+    print('{} expectation suites and {} validation results changed, {} '
+          'removed'.format(len(changed_suites), len(changed_validations),
+                           len(removed_suites) + len(removed_validations)))
+
+    changed = len(changed_suites) + len(changed_validations)
+    if changed and workers > 1:
+        render_pages_in_parallel(
+            (abs_expectation_suites_path, abs_validation_path,
+             abs_site_path),
+            changed_suites, changed_validations, min(workers, changed))
+        build_index_pages(context)
+    elif changed:
+        # renders the changed pages, then the index
+        context.build_data_docs(resource_identifiers=get_resource_identifiers(
+            changed_suites, changed_validations))
+    elif removed_suites or removed_validations:
+        build_index_pages(context)
+
+    save_docs_manifest(abs_site_path, {
+        "great_expectations_version": ge_version,
+        "expectation_suites": suite_hashes,
+        "validations": validation_hashes,
+    })
 
     return True
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--full_rebuild',
+                        help='Render every page, even those whose suite or '
+                             'validation result did not change',
+                        action="store_true")
+    parser.add_argument('--workers',
+                        help='The number of processes rendering the pages, '
+                             'default to the number of cores',
+                        type=int,
+                        default=os.cpu_count())
+    args = parser.parse_args()
+
     generate_expectation_suites_doc_site(
         abs_expectation_suites_path='/app/src/expectation_suites',
         abs_validation_path='/app/src/validations',
-        abs_site_path='/app/src/site'
+        abs_site_path='/app/src/site',
+        full_rebuild=args.full_rebuild,
+        workers=args.workers
     )
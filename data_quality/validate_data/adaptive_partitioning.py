@@ -0,0 +1,263 @@
+import math
+import threading
+from contextlib import contextmanager
+
+import pyspark.sql.functions as f
+
+from dataset_reader import COLUMNAR_FORMATS, list_input_files
+
+# Compression codecs of text files, by extension: a file compressed with a
+# non-splittable codec is read by a single task whatever its size.
+SPLITTABLE_CODECS = {
+    ".bz2": True,
+    ".gz": False,
+    ".deflate": False,
+    ".lz4": False,
+    ".snappy": False,
+    ".zst": False,
+}
+
+# Files smaller than this fraction of the target partition size are counted
+# as small files, each adding a task and its scheduling overhead.
+SMALL_FILE_RATIO = 0.25
+
+
+def get_key_columns(expectation_suite):
+    """
+    Return the key columns of a suite: the `column_list` of its multicolumn
+    expectations, in order of first appearance.
+
+    Args:
+        expectation_suite (dict): The expectation suite JSON
+    """
+    columns = []
+    for expectation in expectation_suite["expectations"]:
+        for column in expectation["kwargs"].get("column_list", []):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def is_splittable(file_path, input_format):
+    """Whether Spark can split a data file across several tasks."""
+    if input_format in COLUMNAR_FORMATS:
+        # Parquet row groups and ORC stripes are compressed independently
+        return True
+    for extension, splittable in SPLITTABLE_CODECS.items():
+        if file_path.lower().endswith(extension):
+            return splittable
+    return True
+
+
+class PartitioningPlan(object):
+    """
+    The partitioning decision of a batch, taken before the validation.
+
+    Attributes:
+        target_partitions (int): The number of partitions the batch should
+            have, one per `target_partition_bytes` of input
+        unsplittable_files (int): Files larger than a partition that a
+            single task has to read, e.g. big gzip CSVs
+        small_files (int): Files much smaller than a partition
+        action (str or None): `repartition`, `coalesce` or None, set by
+            `apply_partitioning()`
+        skewed (bool or None): Whether the key columns are skewed, None when
+            not measured, i.e. the suite has no key columns or the batch is
+            not repartitioned
+    """
+
+    def __init__(self, input_format, files, target_partition_bytes):
+        self.input_format = input_format
+        self.file_count = len(files)
+        self.total_bytes = sum(size for _, size, _ in files)
+        self.target_partition_bytes = target_partition_bytes
+        self.target_partitions = max(
+            1, int(math.ceil(self.total_bytes /
+                             float(target_partition_bytes))))
+        self.unsplittable_files = sum(
+            1 for path, size, _ in files
+            if size > target_partition_bytes
+            and not is_splittable(path, input_format))
+        self.small_files = sum(
+            1 for _, size, _ in files
+            if size < target_partition_bytes * SMALL_FILE_RATIO)
+        self.input_partitions = None
+        self.action = None
+        self.key_columns = []
+        self.skewed = None
+        self.top_key_ratio = None
+
+    def describe(self):
+        return "{} files, {} bytes ({} unsplittable, {} small), {} input " \
+               "partitions, {}{}".format(
+                   self.file_count, self.total_bytes,
+                   self.unsplittable_files, self.small_files,
+                   self.input_partitions,
+                   "{} to {} partitions".format(self.action,
+                                                self.target_partitions)
+                   if self.action else "kept",
+                   "" if self.skewed is None else
+                   ", keys {} {} (top key {:.1f}x the mean)".format(
+                       ", ".join(self.key_columns),
+                       "skewed" if self.skewed else "balanced",
+                       self.top_key_ratio))
+
+
+# The session settings of `adaptive_execution()`
+ADAPTIVE_SETTINGS = (
+    "spark.sql.adaptive.enabled",
+    "spark.sql.adaptive.coalescePartitions.enabled",
+    "spark.sql.adaptive.skewJoin.enabled",
+    "spark.sql.adaptive.advisoryPartitionSizeInBytes",
+    "spark.sql.files.maxPartitionBytes",
+)
+
+# SparkSession id -> the settings of the `adaptive_execution()` blocks
+# running in it: {"target_partition_bytes", "count", "previous"}
+_session_settings = {}
+_session_settings_changed = threading.Condition()
+
+
+def _apply_settings(spark, target_partition_bytes):
+    previous = {key: spark.conf.get(key, None) for key in ADAPTIVE_SETTINGS}
+    spark.conf.set("spark.sql.adaptive.enabled", "true")
+    spark.conf.set("spark.sql.adaptive.coalescePartitions.enabled", "true")
+    spark.conf.set("spark.sql.adaptive.skewJoin.enabled", "true")
+    spark.conf.set("spark.sql.adaptive.advisoryPartitionSizeInBytes",
+                   str(target_partition_bytes))
+    spark.conf.set("spark.sql.files.maxPartitionBytes",
+                   str(target_partition_bytes))
+    return previous
+
+
+def _restore_settings(spark, previous):
+    for key, value in previous.items():
+        if value is None:
+            spark.conf.unset(key)
+        else:
+            spark.conf.set(key, value)
+
+
+@contextmanager
+def adaptive_execution(spark, target_partition_bytes=None):
+    """
+    Enable Adaptive Query Execution and size the read splits and the
+    post-shuffle partitions after the target partition size for the
+    duration of the block, the previous session settings being restored on
+    exit.
+
+    The settings belong to the SparkSession, shared by the targets validated
+    concurrently (manifest, service, backfill): the blocks of a session are
+    reference counted, those with the same settings run together, the first
+    one applying them and the last one restoring the previous ones, while a
+    block with other settings waits for them to be restored. A block with no
+    `target_partition_bytes` keeps the session settings, waiting as well
+    while another block has changed them.
+    """
+    session_id = id(spark)
+    with _session_settings_changed:
+        while session_id in _session_settings and \
+                _session_settings[session_id]["target_partition_bytes"] != \
+                target_partition_bytes:
+            _session_settings_changed.wait()
+        settings = _session_settings.setdefault(session_id, {
+            "target_partition_bytes": target_partition_bytes,
+            "count": 0,
+            "previous": None,
+        })
+        if not settings["count"] and target_partition_bytes is not None:
+            settings["previous"] = _apply_settings(spark,
+                                                   target_partition_bytes)
+        settings["count"] += 1
+    try:
+        yield
+    finally:
+        with _session_settings_changed:
+            settings["count"] -= 1
+            if not settings["count"]:
+                if settings["previous"] is not None:
+                    _restore_settings(spark, settings["previous"])
+                del _session_settings[session_id]
+                _session_settings_changed.notify_all()
+
+
+def plan_partitioning(spark, path, input_format, target_partition_bytes):
+    """
+    Look at the input files of a dataset, before it is read inside
+    `adaptive_execution()`.
+
+    Returns:
+        A PartitioningPlan
+    """
+    return PartitioningPlan(input_format, list_input_files(spark, path),
+                            target_partition_bytes)
+
+
+def get_key_skew(df, key_columns, sample_fraction=0.01, max_rows=100000,
+                 seed=42):
+    """
+    Measure the skew of the key columns on a bounded sample of the batch:
+    at most `max_rows` rows of a `sample_fraction` sample are grouped, each
+    task stopping once it has produced them.
+
+    Returns:
+        The ratio between the frequency of the most frequent key and the
+        mean key frequency, 1.0 for a uniform key
+    """
+    counts = df.sample(withReplacement=False, fraction=sample_fraction,
+                       seed=seed) \
+        .limit(max_rows) \
+        .groupBy(*key_columns).count() \
+        .agg(f.max("count").alias("top"), f.avg("count").alias("mean")) \
+        .collect()[0]
+    if not counts["mean"]:
+        return 1.0
+    return counts["top"] / float(counts["mean"])
+
+
+def apply_partitioning(df, plan, key_columns=None, skew_threshold=5.0,
+                       logger=None):
+    """
+    Repartition or coalesce the batch as the plan says.
+
+    Unsplittable files larger than a partition leave a few giant tasks: the
+    batch is repartitioned to `target_partitions`, by the key columns when
+    a sample shows them balanced (the multicolumn expectations group by
+    them) and round-robin otherwise. Many small files leave many tiny
+    partitions, which are coalesced without a shuffle.
+
+    Args:
+        df (DataFrame): The batch read with the plan settings
+        plan (PartitioningPlan): The plan of `plan_partitioning()`
+        key_columns (list or None): The key columns of the suite (see
+            `get_key_columns()`)
+        skew_threshold (float): The top key ratio (see `get_key_skew()`)
+            above which the keys are considered skewed
+        logger (Logger or None): Logs the decision
+
+    Returns:
+        The repartitioned DataFrame
+    """
+    plan.input_partitions = df.rdd.getNumPartitions()
+    if plan.unsplittable_files and \
+            plan.input_partitions < plan.target_partitions:
+        plan.action = "repartition"
+    elif plan.input_partitions > 2 * plan.target_partitions:
+        plan.action = "coalesce"
+
+    key_columns = [column for column in key_columns or []
+                   if column in df.columns]
+    if plan.action == "repartition" and key_columns:
+        plan.key_columns = key_columns
+        plan.top_key_ratio = get_key_skew(df, key_columns)
+        plan.skewed = plan.top_key_ratio > skew_threshold
+
+    if plan.action == "repartition" and plan.skewed is False:
+        df = df.repartition(plan.target_partitions, *key_columns)
+    elif plan.action == "repartition":
+        df = df.repartition(plan.target_partitions)
+    elif plan.action == "coalesce":
+        df = df.coalesce(plan.target_partitions)
+    if logger is not None:
+        logger.info("Partitioning: {}".format(plan.describe()))
+    return df
@@ -0,0 +1,103 @@
+import os
+import time
+import uuid
+
+from pyspark import StorageLevel
+
+from dataset_reader import list_input_files
+
+CACHE_MODES = (
+    "none",
+    "memory",
+    "memory_and_disk",
+    "serialized",
+    "parquet_checkpoint",
+)
+
+# StorageLevel(useDisk, useMemory, useOffHeap, deserialized)
+STORAGE_LEVELS = {
+    "memory": StorageLevel(False, True, False, True),
+    "memory_and_disk": StorageLevel(True, True, False, True),
+    "serialized": StorageLevel(False, True, False, False),
+}
+
+
+def _delete_path(spark, path):
+    jvm = spark.sparkContext._jvm
+    hadoop_path = jvm.org.apache.hadoop.fs.Path(path)
+    hadoop_path.getFileSystem(
+        spark.sparkContext._jsc.hadoopConfiguration()).delete(hadoop_path,
+                                                              True)
+
+
+class MaterializedBatch(object):
+    """
+    A batch of data materialized once before the validation run.
+
+    Attributes:
+        df (DataFrame): The DataFrame to validate
+        cache_mode (str): One of `CACHE_MODES`
+        duration (float): Seconds spent materializing the batch
+        row_count (int or None): Number of rows of the batch
+        size_in_bytes (int or None): Size of the cached data or of the
+            Parquet checkpoint
+    """
+
+    def __init__(self, spark, df, cache_mode, checkpoint_path=None):
+        self.spark = spark
+        self.df = df
+        self.cache_mode = cache_mode
+        self.checkpoint_path = checkpoint_path
+        self.duration = 0.0
+        self.row_count = None
+        self.size_in_bytes = None
+
+    def release(self):
+        """Unpersist the batch or delete its Parquet checkpoint."""
+        if self.cache_mode in STORAGE_LEVELS:
+            self.df.unpersist()
+        elif self.cache_mode == "parquet_checkpoint":
+            _delete_path(self.spark, self.checkpoint_path)
+
+
+def materialize_batch(spark, df, cache_mode, checkpoint_dir):
+    """
+    Materialize the batch once, so that the metrics computed during the
+    validation read it from the cache instead of re-reading and re-parsing
+    the source files.
+
+    Args:
+        spark (SparkSession): The Spark session
+        df (DataFrame): The DataFrame to materialize
+        cache_mode (str): `none`, `memory`, `memory_and_disk`, `serialized`
+            or `parquet_checkpoint` (a local Parquet copy of the batch)
+        checkpoint_dir (str): Where Parquet checkpoints are written
+
+    Returns:
+        A MaterializedBatch
+    """
+    if cache_mode not in CACHE_MODES:
+        raise ValueError("Unknown cache mode '{}'".format(cache_mode))
+    if cache_mode == "none":
+        return MaterializedBatch(spark, df, cache_mode)
+
+    start = time.time()
+    if cache_mode == "parquet_checkpoint":
+        checkpoint_path = os.path.join(checkpoint_dir, uuid.uuid4().hex)
+        df.write.mode("overwrite").parquet(checkpoint_path)
+        batch = MaterializedBatch(spark, spark.read.parquet(checkpoint_path),
+                                  cache_mode, checkpoint_path)
+        # the row count of Parquet files is read from their footers
+        batch.row_count = batch.df.count()
+        batch.size_in_bytes = sum(
+            size for _, size, _ in list_input_files(spark, checkpoint_path))
+    else:
+        batch = MaterializedBatch(
+            spark, df.persist(STORAGE_LEVELS[cache_mode]), cache_mode)
+        batch.row_count = batch.df.count()
+        # once materialized, the in-memory relation reports its real size
+        batch.size_in_bytes = int(batch.df._jdf.queryExecution()
+                                  .optimizedPlan().stats().sizeInBytes()
+                                  .toString())
+    batch.duration = time.time() - start
+    return batch
@@ -0,0 +1,238 @@
+import argparse
+import datetime
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pyspark.sql import SparkSession
+
+from data_validation_manifest import run_target
+from data_validation_with_checkpoints import add_validation_arguments, \
+    get_data_context, get_logger
+
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def get_shards(start_date, end_date, shard_days, partition_template):
+    """
+    Split a date range into shards of `shard_days` consecutive days.
+
+    The partition template is formatted with the `date` of every day, e.g.
+    `/data/sample_data/date={date:%Y-%m-%d}`; the partitions of a shard of
+    several days are read together through a Hadoop `{a,b}` glob.
+
+    Returns:
+        A list of (shard name, dataset path) tuples, in date order
+    """
+    if end_date < start_date:
+        raise ValueError("The end date {} is before the start date {}"
+                         .format(end_date, start_date))
+    shards = []
+    shard_start = start_date
+    while shard_start <= end_date:
+        shard_end = min(end_date,
+                        shard_start + datetime.timedelta(days=shard_days - 1))
+        paths = [partition_template.format(
+                     date=shard_start + datetime.timedelta(days=day))
+                 for day in range((shard_end - shard_start).days + 1)]
+        name = shard_start.isoformat() if shard_start == shard_end \
+            else "{}_{}".format(shard_start.isoformat(), shard_end.isoformat())
+        shards.append((name, paths[0] if len(paths) == 1
+                       else "{" + ",".join(paths) + "}"))
+        shard_start = shard_end + datetime.timedelta(days=1)
+    return shards
+
+
+class BackfillState(object):
+    """
+    The shards of a backfill already validated, saved to a JSON file after
+    every shard so that a backfill stopped by a failure resumes where it
+    stopped.
+
+    A shard is completed once validated, whatever its success; shards whose
+    validation raised an error are validated again on resume.
+    """
+
+    def __init__(self, state_path, backfill):
+        self.state_path = state_path
+        self.backfill = backfill
+        self.shards = {}
+        self._lock = threading.Lock()
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+            if state["backfill"] != backfill:
+                raise ValueError(
+                    "The backfill state {} belongs to another backfill: {}"
+                    .format(state_path, state["backfill"]))
+            self.shards = state["shards"]
+
+    def is_completed(self, shard_name):
+        shard = self.shards.get(shard_name)
+        return shard is not None and shard["error"] is None
+
+    def save_shard(self, shard_name, summary):
+        with self._lock:
+            self.shards[shard_name] = summary
+            os.makedirs(os.path.dirname(self.state_path) or ".",
+                        exist_ok=True)
+            # written aside and renamed, a crash never leaves it truncated
+            temporary_path = self.state_path + ".tmp"
+            with open(temporary_path, "w") as f:
+                json.dump({"backfill": self.backfill, "shards": self.shards},
+                          f, indent=2)
+            os.replace(temporary_path, self.state_path)
+
+
+def run_shard(spark, context, options, state, shard_name, dataset_path,
+              logger):
+    """Validate one shard as its own batch and record it in the state."""
+    logger.info('Validating shard {}: {}'.format(shard_name, dataset_path))
+    summary = run_target(
+        spark, context, options,
+        target={"dataset_name": options.dataset_name,
+                "suite_name": options.suite_name,
+                "dataset_path": dataset_path},
+        logger=logger,
+        batch_id=shard_name
+    )
+    summary.update(shard=shard_name, dataset_path=dataset_path)
+    state.save_shard(shard_name, summary)
+    logger.info('Shard {}: success {} in {}s'.format(
+        shard_name, summary["success"], summary["duration_seconds"]))
+    return summary
+
+
+def get_rollup(backfill, shards, state):
+    """
+    Roll the shard results up into the result of the whole backfill, the
+    shards validated by previous attempts included.
+    """
+    summaries = [state.shards[name] for name, _ in shards
+                 if name in state.shards]
+    return {
+        "backfill": backfill,
+        "shards": len(shards),
+        "successful_shards": sum(s["success"] for s in summaries),
+        "failed_shards": [s["shard"] for s in summaries
+                          if not s["success"] and s["error"] is None],
+        "error_shards": [s["shard"] for s in summaries
+                         if s["error"] is not None],
+        "success": len(summaries) == len(shards) and
+        all(s["success"] for s in summaries),
+        "duration_seconds": round(sum(s["duration_seconds"]
+                                      for s in summaries), 3),
+        "results": summaries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset_name',
+                        help='Name of the dataset to validate',
+                        required=True)
+    parser.add_argument('--suite_name',
+                        help='The expectation suite name',
+                        required=True)
+    parser.add_argument('--start_date',
+                        help='First day of the backfill, YYYY-MM-DD',
+                        type=parse_date,
+                        required=True)
+    parser.add_argument('--end_date',
+                        help='Last day of the backfill (included), '
+                             'YYYY-MM-DD',
+                        type=parse_date,
+                        required=True)
+    parser.add_argument('--partition_template',
+                        help='Path of the partition of a day, formatted '
+                             'with its date, e.g. /home/jovyan/work/data/'
+                             'sample_data/date={date:%%Y-%%m-%%d}',
+                        required=True)
+    parser.add_argument('--shard_days',
+                        help='Number of days validated as one batch',
+                        type=int,
+                        default=1)
+    parser.add_argument('--max_concurrency',
+                        help='Maximum number of shards validated at the '
+                             'same time',
+                        type=int,
+                        default=4)
+    parser.add_argument('--state_path',
+                        help='The backfill state, resumed when it exists, '
+                             'default to /home/jovyan/work/reports/backfill_'
+                             '<dataset>.<suite>_<start>_<end>.json')
+    parser.add_argument('--summary_path',
+                        help='Where to write the roll-up result, default to '
+                             'the state path with a _summary suffix')
+    parser.add_argument('--log_level',
+                        help='The log level',
+                        required=True)
+    add_validation_arguments(parser)
+
+    args, unknown_args = parser.parse_known_args()
+    if "{date" not in args.partition_template:
+        parser.error("--partition_template must contain a {date} field")
+    if args.shard_days < 1:
+        parser.error("--shard_days must be at least 1")
+
+    logger = get_logger(logger_name=__file__,
+                        logger_level=args.log_level)
+
+    backfill = {
+        "dataset_name": args.dataset_name,
+        "suite_name": args.suite_name,
+        "start_date": args.start_date.isoformat(),
+        "end_date": args.end_date.isoformat(),
+        "partition_template": args.partition_template,
+        "shard_days": args.shard_days,
+    }
+    shards = get_shards(args.start_date, args.end_date, args.shard_days,
+                        args.partition_template)
+    state_path = args.state_path or os.path.join(
+        "/home/jovyan/work/reports",
+        "backfill_{}.{}_{}_{}.json".format(
+            args.dataset_name, args.suite_name, backfill["start_date"],
+            backfill["end_date"]))
+    state = BackfillState(state_path, backfill)
+    pending = [(name, path) for name, path in shards
+               if not state.is_completed(name)]
+    logger.info('{} shards, {} already validated, {} to validate'.format(
+        len(shards), len(shards) - len(pending), len(pending)))
+
+    if pending:
+        spark = SparkSession.builder \
+            .config("spark.scheduler.mode", "FAIR") \
+            .enableHiveSupport() \
+            .getOrCreate()
+        spark.sparkContext.setLogLevel("WARN")
+        logger.info('Spark session created')
+
+        logger.info('Instantiating Great Expectations Data Context...')
+        context = get_data_context(args.validations_db)
+        logger.info('Great Expectations Data Context instantiated ')
+
+        with ThreadPoolExecutor(max_workers=args.max_concurrency) as executor:
+            list(executor.map(
+                lambda shard: run_shard(spark, context, args, state, *shard,
+                                        logger=logger),
+                pending))
+
+    rollup = get_rollup(backfill, shards, state)
+    summary_path = args.summary_path or \
+        os.path.splitext(state_path)[0] + "_summary.json"
+    os.makedirs(os.path.dirname(summary_path) or ".", exist_ok=True)
+    with open(summary_path, "w") as f:
+        json.dump(rollup, f, indent=2)
+    logger.info('{} of {} shards succeeded, {} failed, {} in error; roll-up '
+                'written to {}'.format(rollup["successful_shards"],
+                                       rollup["shards"],
+                                       len(rollup["failed_shards"]),
+                                       len(rollup["error_shards"]),
+                                       summary_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import datetime
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from pyspark.sql import SparkSession
+
+from data_validation_with_checkpoints import add_validation_arguments, \
+    get_data_context, get_logger, validate_dataset
+
+
+def load_manifest(manifest_path):
+    """
+    Load the list of validation targets.
+
+    The manifest is a JSON list of objects with the `dataset_name` and
+    `suite_name` keys; any other validation option (e.g. `input_format`,
+    `dataset_path`, `row_filter`, `cache_mode`) overrides the command line
+    value for that target.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    for target in manifest:
+        if "dataset_name" not in target or "suite_name" not in target:
+            raise ValueError("Every manifest entry needs a dataset_name and "
+                             "a suite_name: {}".format(target))
+    return manifest
+
+
+def run_target(spark, context, options, target, logger, batch_id=None):
+    """
+    Validate one manifest target inside its own fair-scheduler pool.
+
+    The batch identifier defaults to the target name, which must then be
+    unique among the targets validated concurrently.
+    """
+    target_options = argparse.Namespace(**dict(vars(options), **target))
+    target_name = target["dataset_name"] + "." + target["suite_name"]
+    # local properties are per thread: every job submitted by this target
+    # runs in its own pool and shares the cluster fairly with the others
+    spark.sparkContext.setLocalProperty("spark.scheduler.pool", target_name)
+    start = time.time()
+    summary = {
+        "dataset_name": target["dataset_name"],
+        "suite_name": target["suite_name"],
+        "success": False,
+        "error": None,
+    }
+    try:
+        summary["success"] = validate_dataset(
+            spark=spark,
+            context=context,
+            options=target_options,
+            logger=logger,
+            batch_id=batch_id or target_name
+        )
+    except Exception:
+        logger.error('Validation of {} failed:\n{}'
+                     .format(target_name, traceback.format_exc()))
+        summary["error"] = traceback.format_exc()
+    finally:
+        spark.sparkContext.setLocalProperty("spark.scheduler.pool", None)
+    summary["duration_seconds"] = round(time.time() - start, 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--manifest',
+                        help='JSON file listing the dataset/suite pairs to '
+                             'validate',
+                        required=True)
+    parser.add_argument('--max_concurrency',
+                        help='Maximum number of targets validated at the '
+                             'same time',
+                        type=int,
+                        default=4)
+    parser.add_argument('--summary_path',
+                        help='Where to write the combined summary, default '
+                             'to /home/jovyan/work/reports/'
+                             'validation_summary_<run_time>.json')
+    parser.add_argument('--log_level',
+                        help='The log level',
+                        required=True)
+    add_validation_arguments(parser)
+
+    args, unknown_args = parser.parse_known_args()
+
+    logger = get_logger(logger_name=__file__,
+                        logger_level=args.log_level)
+
+    manifest = load_manifest(args.manifest)
+    logger.info('{} validation targets loaded from {}'
+                .format(len(manifest), args.manifest))
+
+    spark = SparkSession.builder \
+        .config("spark.scheduler.mode", "FAIR") \
+        .enableHiveSupport() \
+        .getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+    logger.info('Spark session created')
+
+    logger.info('Instantiating Great Expectations Data Context...')
+    context = get_data_context(args.validations_db)
+    logger.info('Great Expectations Data Context instantiated ')
+
+    run_time = datetime.datetime.now(datetime.timezone.utc)
+    with ThreadPoolExecutor(max_workers=args.max_concurrency) as executor:
+        summaries = list(executor.map(
+            lambda target: run_target(spark, context, args, target, logger),
+            manifest))
+
+    summary = {
+        "run_time": run_time.isoformat(),
+        "targets": len(summaries),
+        "successful_targets": sum(s["success"] for s in summaries),
+        "failed_targets": sum(not s["success"] for s in summaries),
+        "results": summaries,
+    }
+    summary_path = args.summary_path or os.path.join(
+        "/home/jovyan/work/reports",
+        "validation_summary_{}.json".format(run_time.strftime(
+            "%Y%m%dT%H%M%S")))
+    os.makedirs(os.path.dirname(summary_path), exist_ok=True)
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    for target_summary in summaries:
+        logger.info('{}.{}: success {} in {}s'.format(
+            target_summary["dataset_name"], target_summary["suite_name"],
+            target_summary["success"], target_summary["duration_seconds"]))
+    logger.info('{} of {} targets succeeded, summary written to {}'
+                .format(summary["successful_targets"], summary["targets"],
+                        summary_path))
+
+
+if __name__ == '__main__':
+    main()
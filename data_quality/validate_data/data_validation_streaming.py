@@ -0,0 +1,277 @@
+import argparse
+import datetime
+import json
+import time
+
+from pyspark.sql import SparkSession
+
+from great_expectations.core.batch import RuntimeBatchRequest
+from great_expectations.checkpoint import SimpleCheckpoint
+
+from data_validation_with_checkpoints import get_data_context, get_logger
+from custom_expectations import register_suite_expectations
+from dataset_reader import READERS, get_read_schema, get_suite_columns, \
+    read_stream
+from suite_compiler import get_suite_kwargs
+from validation_results import store_validation_result
+
+# runtime action list removing the store actions of the SimpleCheckpoint:
+# micro-batch results are stored by the runner, at most every few batches
+SKIP_STORE_ACTIONS = [
+    {"name": "store_validation_result", "action": None},
+    {"name": "store_evaluation_params", "action": None},
+]
+
+
+class RunningTotals(object):
+    """
+    Unexpected counts of every expectation summed over the micro-batches
+    validated since the query started.
+    """
+
+    def __init__(self):
+        self.batches = 0
+        self.failed_batches = 0
+        self.expectations = {}
+
+    def update(self, validation_result):
+        self.batches += 1
+        self.failed_batches += not validation_result.success
+        for result in validation_result.results:
+            configuration = result.expectation_config
+            # without the batch_id GE adds, different for every micro-batch
+            kwargs = get_suite_kwargs(configuration)
+            key = json.dumps([configuration.expectation_type, kwargs],
+                             sort_keys=True, default=str)
+            totals = self.expectations.setdefault(key, {
+                "expectation_type": configuration.expectation_type,
+                "kwargs": kwargs,
+                "element_count": 0,
+                "unexpected_count": 0,
+                "missing_count": 0,
+                "failed_batches": 0,
+            })
+            for count in ("element_count", "unexpected_count",
+                          "missing_count"):
+                totals[count] += result.result.get(count) or 0
+            totals["failed_batches"] += not result.success
+
+    def to_json_dict(self):
+        expectations = []
+        for totals in self.expectations.values():
+            totals = dict(totals)
+            considered = totals["element_count"] - totals["missing_count"]
+            totals["unexpected_percent"] = \
+                100.0 * totals["unexpected_count"] / considered \
+                if considered else None
+            expectations.append(totals)
+        return {
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "expectations": expectations,
+        }
+
+
+class MicroBatchValidator(object):
+    """
+    The `foreachBatch` function of the streaming query.
+
+    Every micro-batch is validated by the same SimpleCheckpoint of the same
+    Data Context. The result of a micro-batch is stored, with the running
+    totals in its meta, only every `store_every_batches` batches or
+    `store_every_seconds` seconds, and when the query stops.
+    """
+
+    def __init__(self, context, expectation_suite_name, run_name,
+                 store_every_batches, store_every_seconds, logger):
+        self.context = context
+        self.expectation_suite_name = expectation_suite_name
+        self.run_name = run_name
+        self.store_every_batches = store_every_batches
+        self.store_every_seconds = store_every_seconds
+        self.logger = logger
+        self.checkpoint = SimpleCheckpoint(
+            name="streaming_checkpoint",
+            data_context=context,
+            site_names=None
+        )
+        self.totals = RunningTotals()
+        self.pending = None
+        self.batches_since_store = 0
+        self.last_store = time.time()
+
+    def __call__(self, batch_df, batch_id):
+        batch_request = RuntimeBatchRequest(
+            datasource_name="filesystem_datasource",
+            data_connector_name="runtime_data_connector",
+            data_asset_name="data_asset_name",
+            batch_identifiers={"batch_id": "batch_{}".format(batch_id)},
+            runtime_parameters={"batch_data": batch_df},
+        )
+        # the site names and notifications are left out, otherwise the
+        # SimpleCheckpoint rebuilds its default action list on every run
+        checkpoint_result = self.checkpoint.run(
+            run_id={
+                "run_name": self.run_name,
+                "run_time": datetime.datetime.now(datetime.timezone.utc)
+            },
+            validations=[{
+                "batch_request": batch_request,
+                "expectation_suite_name": self.expectation_suite_name
+            }],
+            action_list=SKIP_STORE_ACTIONS,
+            site_names=None,
+            notify_on=None,
+            notify_with=None
+        )
+        # the execution engine keeps every loaded batch: drop the micro-batch
+        self.context.datasources["filesystem_datasource"] \
+            .execution_engine.loaded_batch_data_dict.clear()
+
+        validation_result = checkpoint_result.list_validation_results()[0]
+        self.totals.update(validation_result)
+        self.pending = (validation_result, batch_id)
+        self.batches_since_store += 1
+        self.logger.info('Micro-batch {} validated, success: {}'
+                         .format(batch_id, validation_result.success))
+
+        if self.batches_since_store >= self.store_every_batches or \
+                time.time() - self.last_store >= self.store_every_seconds:
+            self.flush()
+
+    def flush(self):
+        """Store the latest micro-batch result with the running totals."""
+        if self.pending is None:
+            return
+        validation_result, batch_id = self.pending
+        validation_result.meta["streaming"] = dict(
+            self.totals.to_json_dict(),
+            batch_id=batch_id,
+            batches_since_last_store=self.batches_since_store
+        )
+        identifier = store_validation_result(
+            self.context, validation_result,
+            batch_identifier="batch_{}".format(batch_id))
+        self.logger.info('Validation result stored: {}'.format(identifier))
+        self.pending = None
+        self.batches_since_store = 0
+        self.last_store = time.time()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset_name',
+                        help='Name of the dataset to validate',
+                        required=True)
+    parser.add_argument('--suite_name',
+                        help='The expectation suite name',
+                        required=True)
+    parser.add_argument('--log_level',
+                        help='The log level',
+                        required=True)
+    parser.add_argument('--source_path',
+                        help='The directory the micro-batch files land in',
+                        required=True)
+    parser.add_argument('--input_format',
+                        help='The format of the source files',
+                        choices=sorted(READERS),
+                        default="csv")
+    parser.add_argument('--row_filter',
+                        help='SQL predicate selecting the rows to validate')
+    parser.add_argument('--schema_cache_dir',
+                        help='Directory caching the inferred schemas',
+                        default="/home/jovyan/work/schema_cache")
+    parser.add_argument('--checkpoint_location',
+                        help='The Structured Streaming checkpoint location',
+                        default="/home/jovyan/work/streaming_checkpoints")
+    parser.add_argument('--max_files_per_trigger',
+                        help='Maximum number of new files per micro-batch',
+                        type=int)
+    parser.add_argument('--trigger_interval',
+                        help='Processing time trigger, e.g. "30 seconds"; '
+                             'process the available files once and stop '
+                             'when not set',
+                        default=None)
+    parser.add_argument('--store_every_batches',
+                        help='Store a validation result at most every N '
+                             'micro-batches',
+                        type=int,
+                        default=10)
+    parser.add_argument('--store_every_seconds',
+                        help='... or every N seconds, whichever comes first',
+                        type=float,
+                        default=60.0)
+    parser.add_argument('--validations_db',
+                        help='Store the validation results in this SQLite '
+                             'database instead of one JSON file per run')
+
+    args, unknown_args = parser.parse_known_args()
+
+    logger = get_logger(logger_name=__file__,
+                        logger_level=args.log_level)
+
+    spark = SparkSession.builder.enableHiveSupport().getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+    logger.info('Spark session created')
+
+    logger.info('Instantiating Great Expectations Data Context...')
+    context = get_data_context(args.validations_db)
+    logger.info('Great Expectations Data Context instantiated ')
+
+    expectation_suite = args.dataset_name + "." + args.suite_name
+    expectation_suite_json = context.get_expectation_suite(
+        expectation_suite).to_json_dict()
+    register_suite_expectations(expectation_suite_json)
+
+    schema, schema_source = get_read_schema(
+        spark=spark,
+        path=args.source_path,
+        input_format=args.input_format,
+        expectation_suite=expectation_suite_json,
+        schema_cache_dir=args.schema_cache_dir
+    )
+    logger.info('Read schema taken from: {}'.format(schema_source))
+
+    options = {}
+    if args.max_files_per_trigger:
+        options["maxFilesPerTrigger"] = str(args.max_files_per_trigger)
+    stream_df = read_stream(
+        spark=spark,
+        path=args.source_path,
+        input_format=args.input_format,
+        schema=schema,
+        columns=get_suite_columns(expectation_suite_json),
+        row_filter=args.row_filter,
+        options=options
+    )
+
+    micro_batch_validator = MicroBatchValidator(
+        context=context,
+        expectation_suite_name=expectation_suite,
+        run_name=args.dataset_name + "_" + args.suite_name + "_stream",
+        store_every_batches=args.store_every_batches,
+        store_every_seconds=args.store_every_seconds,
+        logger=logger
+    )
+
+    writer = stream_df.writeStream \
+        .foreachBatch(micro_batch_validator) \
+        .option("checkpointLocation", args.checkpoint_location)
+    if args.trigger_interval:
+        writer = writer.trigger(processingTime=args.trigger_interval)
+    else:
+        writer = writer.trigger(once=True)
+
+    logger.info('Streaming validation running...')
+    query = writer.start()
+    try:
+        query.awaitTermination()
+    finally:
+        micro_batch_validator.flush()
+        logger.info('Streaming validation stopped: {}'.format(
+            json.dumps(micro_batch_validator.totals.to_json_dict(),
+                       default=str)))
+
+
+if __name__ == '__main__':
+    main()
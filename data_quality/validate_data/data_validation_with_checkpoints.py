@@ -1,9 +1,14 @@
 import argparse
+import copy
 import datetime
+import functools
+import json
 import logging
+import os
+import random
+from collections import OrderedDict
 
 from pyspark.sql import SparkSession
-from pyspark.sql.types import StructType, StructField, StringType, IntegerType
 
 from great_expectations.data_context.types.base import DataContextConfig
 from great_expectations.data_context import BaseDataContext
@@ -15,6 +20,39 @@ import sys
 sys.path.append('../')
 import custom_expectations
 
+from adaptive_partitioning import adaptive_execution, apply_partitioning, \
+    get_key_columns, plan_partitioning
+from batch_persistence import CACHE_MODES, materialize_batch
+from dataset_reader import READERS, get_read_schema, get_suite_columns, \
+    read_dataset
+from footer_statistics import STATISTICS_FORMATS, \
+    compute_metrics_with_statistics, read_footer_statistics
+from execution_planner import has_critical_failure, plan_suite, \
+    skipped_result
+from incremental_validation import get_incremental_metrics
+from metrics_export import RunMetrics, export_run_metrics
+from pandas_validation import get_small_dataset_files, \
+    validate_dataset_pandas
+from quarantine import write_quarantine
+from sampling import SAMPLE_METHODS, STRATUM_COLUMN, draw_sample, \
+    estimate_suite, get_stratum
+from spark_profiling import SparkProfiler, job_group, \
+    validate_by_expectation, write_profiling_report
+from suite_compiler import MetricRegistry, SchemaCheck, compile_suite, \
+    compute_metrics, get_expectation_id, get_suite_kwargs
+from unexpected_top_k import add_unexpected_top_k
+from validation_results import build_suite_validation_result, \
+    get_validation_result_identifier, store_validation_result
+
+EXECUTION_MODES = ("checkpoint", "fused", "incremental", "planned")
+
+# Job group of the single scan of the compiled expectations, by mode
+SCAN_JOB_GROUPS = {
+    "fused": "fused_suite",
+    "incremental": "incremental_suite",
+    "planned": "planned_scan",
+}
+
 
 def get_logger(logger_name, logger_level):
     logger = logging.getLogger(logger_name)
@@ -30,54 +68,446 @@ def get_logger(logger_name, logger_level):
     return logger
 
 
-def main():
-    # global CONF
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--dataset_name',
-                        help='Name of the dataset to validate',
-                        required=True)
-    parser.add_argument('--suite_name',
-                        help='The expectation suite name',
-                        required=True)
-    parser.add_argument('--log_level',
-                        help='The log level',
-                        required=True)
+def run_checkpoint_validation(context, batch_request, expectation_suite_name,
+                              run_id):
+    validations = [
+        {
+            "batch_request": batch_request,
+            "expectation_suite_name": expectation_suite_name
+         }
+    ]
 
-    args, unknown_args = parser.parse_known_args()
+    checkpoint = SimpleCheckpoint(
+        name="checkpoint",
+        data_context=context,
+        class_name="SimpleCheckpoint",
+        action_list=[
+            {
+                "name": "store_validation_result",
+                "action": {
+                    "class_name": "StoreValidationResultAction"
+                }
+            }
+        ]
+    )
 
-    logger = get_logger(logger_name=__file__,
-                        logger_level=args.log_level)
+    return checkpoint.run(
+        run_id=run_id,
+        run_name_template="%Y%m%d_%H%M%S",
+        validations=validations,
+        action_list=[
+            {
+                "name": "store_validation_result",
+                "action": {
+                    "class_name": "StoreValidationResultAction"
+                }
+            }
+        ]
+    )
 
-    spark = SparkSession.builder.enableHiveSupport().getOrCreate()
-    spark.sparkContext.setLogLevel("WARN")
-    logger.info('Spark session created')
 
-    logger.info("Name of the dataset to validate: {}, "
-                .format(args.dataset_name))
-    expectation_suite = args.dataset_name+"."+args.suite_name
-    logger.info("Expectation suite name: {}, "
-                .format(expectation_suite))
+def validate_residual(spark, validator, configurations, by_expectation):
+    """
+    Validate the expectations the suite compiler does not support through
+    Great Expectations, all together or, when profiling, one at a time in
+    their own Spark job group.
+    """
+    if not configurations:
+        return []
+    if by_expectation:
+        return validate_by_expectation(spark, validator, configurations)
+    with job_group(spark, "residual_expectations",
+                   "{} expectations validated by Great Expectations"
+                   .format(len(configurations))):
+        return validator.graph_validate(configurations=configurations)
+
+
+def run_profiled_validation(spark, context, batch_request,
+                            expectation_suite_name, run_id):
+    """
+    Validate the batch through Great Expectations one expectation at a time,
+    each in the Spark job group named after it, so that the Spark UI and the
+    profiling report tell which expectation the jobs belong to.
+    """
+    validator = context.get_validator(
+        batch_request=batch_request,
+        expectation_suite_name=expectation_suite_name
+    )
+    results = validate_by_expectation(
+        spark, validator, validator.expectation_suite.expectations)
+    validation_result = build_suite_validation_result(
+        expectation_suite_name=expectation_suite_name,
+        results=results,
+        run_id=run_id,
+        validator=validator,
+        meta={"execution_mode": "checkpoint"}
+    )
+    store_validation_result(context, validation_result,
+                            batch_identifier=validator.active_batch_id)
+    return validation_result
+
+
+def run_fused_validation(spark, context, df, batch_request,
+                         expectation_suite_name, run_id, logger,
+                         profile=False, quarantine_paths=None,
+                         statistics=None):
+    """
+    Validate the batch against the whole suite with a single Spark scan.
+
+    Every supported map, aggregate and schema expectation is compiled into
+    one `df.agg(...)`; expectations the compiler does not support are
+    validated by Great Expectations on the same batch. With
+    `quarantine_paths` the failing rows are written out by the same scan that
+    computes the metrics. With the `statistics` of the file footers, the
+    metrics they answer exactly are left out of the scan.
+    """
+    validator = context.get_validator(
+        batch_request=batch_request,
+        expectation_suite_name=expectation_suite_name
+    )
+    compiled = compile_suite(validator.expectation_suite, df.schema)
+    logger.info("Fused plan: {} expectations compiled into {} aggregates, "
+                "{} left to Great Expectations"
+                .format(len(compiled.checks),
+                        len(compiled.registry.aggregates),
+                        len(compiled.residual)))
+
+    with job_group(spark, "fused_suite",
+                   "{} expectations compiled into a single scan"
+                   .format(len(compiled.checks))):
+        if quarantine_paths is None and statistics is not None:
+            metrics = compute_metrics_with_statistics(
+                df, compiled.registry, statistics, logger)
+        elif quarantine_paths is None:
+            metrics = compute_metrics(df, compiled.registry)
+        else:
+            metrics = write_quarantine(spark, df, compiled, *quarantine_paths)
+    results = compiled.evaluate(metrics)
+    results.extend(validate_residual(spark, validator, compiled.residual,
+                                     by_expectation=profile))
+
+    validation_result = build_suite_validation_result(
+        expectation_suite_name=expectation_suite_name,
+        results=results,
+        run_id=run_id,
+        validator=validator,
+        meta={"execution_mode": "fused"}
+    )
+    store_validation_result(context, validation_result,
+                            batch_identifier=validator.active_batch_id)
+    return validation_result
+
+
+def run_incremental_validation(spark, context, df, batch_request,
+                               expectation_suite_name, run_id, options,
+                               dataset_path, schema, columns, logger,
+                               profile=False):
+    """
+    Validate a partitioned dataset scanning only the partitions that are new
+    or changed since the last run.
+
+    The compiled suite metrics of the unchanged partitions are read from the
+    metric state store and merged with the fresh ones; expectations the
+    compiler does not support are validated by Great Expectations on the
+    whole batch.
+    """
+    validator = context.get_validator(
+        batch_request=batch_request,
+        expectation_suite_name=expectation_suite_name
+    )
+    compiled = compile_suite(validator.expectation_suite, df.schema)
+    with job_group(spark, "incremental_suite",
+                   "{} expectations computed on the changed partitions"
+                   .format(len(compiled.checks))):
+        metrics = get_incremental_metrics(
+            spark=spark,
+            registry=compiled.registry,
+            dataset_path=dataset_path,
+            input_format=options.input_format,
+            state_store_dir=options.state_store_dir,
+            state_key="{}|{}".format(expectation_suite_name,
+                                     options.row_filter or ""),
+            schema=schema,
+            columns=columns,
+            row_filter=options.row_filter,
+            logger=logger
+        )
+
+    results = compiled.evaluate(metrics)
+    if compiled.residual:
+        logger.info("{} expectations not supported incrementally, validated "
+                    "on the whole batch".format(len(compiled.residual)))
+    results.extend(validate_residual(spark, validator, compiled.residual,
+                                     by_expectation=profile))
+
+    validation_result = build_suite_validation_result(
+        expectation_suite_name=expectation_suite_name,
+        results=results,
+        run_id=run_id,
+        validator=validator,
+        meta={"execution_mode": "incremental"}
+    )
+    store_validation_result(context, validation_result,
+                            batch_identifier=validator.active_batch_id)
+    return validation_result
+
+
+def run_planned_validation(spark, context, df, batch_request,
+                           expectation_suite_name, run_id, logger,
+                           fail_fast=False, profile=False, statistics=None):
+    """
+    Validate the batch stage by stage, cheapest first (see
+    `execution_planner.ExecutionPlan`): the schema and metadata expectations
+    without any Spark job, then the compiled expectations with a single
+    scan, then the others through Great Expectations by increasing
+    estimated cost.
+
+    With `fail_fast` the remaining stages are skipped as soon as a critical
+    expectation fails, their expectations being reported as failed with a
+    `skipped` meta; the residual expectations are then validated one at a
+    time. With the `statistics` of the file footers, the scan stage computes
+    only the metrics they do not answer exactly.
+    """
+    validator = context.get_validator(
+        batch_request=batch_request,
+        expectation_suite_name=expectation_suite_name
+    )
+    plan = plan_suite(validator.expectation_suite, df.schema)
+    logger.info("Execution plan: {}".format(plan.describe()))
+
+    results = [check.evaluate() for check in plan.metadata]
+    pending = [check.configuration for check in plan.scan] + plan.residual
+    if not (fail_fast and has_critical_failure(results)) and plan.scan:
+        with job_group(spark, "planned_scan",
+                       "{} expectations compiled into a single scan"
+                       .format(len(plan.scan))):
+            if statistics is not None:
+                metrics = compute_metrics_with_statistics(
+                    df, plan.compiled.registry, statistics, logger)
+            else:
+                metrics = compute_metrics(df, plan.compiled.registry)
+        results.extend(check.evaluate(metrics) for check in plan.scan)
+        pending = list(plan.residual)
+    if fail_fast:
+        while pending and not has_critical_failure(results):
+            results.extend(validate_residual(spark, validator, pending[:1],
+                                             by_expectation=profile))
+            pending = pending[1:]
+        if pending:
+            logger.info("Critical expectation failed, {} expectations "
+                        "skipped".format(len(pending)))
+        results.extend(skipped_result(configuration, "fail_fast")
+                       for configuration in pending)
+    else:
+        results.extend(validate_residual(spark, validator, plan.residual,
+                                         by_expectation=profile))
+
+    validation_result = build_suite_validation_result(
+        expectation_suite_name=expectation_suite_name,
+        results=plan.sort_results(results),
+        run_id=run_id,
+        validator=validator,
+        meta={"execution_mode": "planned", "fail_fast": fail_fast}
+    )
+    store_validation_result(context, validation_result,
+                            batch_identifier=validator.active_batch_id)
+    return validation_result
+
+
+def _configuration_key(configuration):
+    # result configurations carry a batch_id the suite ones do not have
+    return configuration.expectation_type, json.dumps(
+        get_suite_kwargs(configuration), sort_keys=True, default=str)
 
-    logger.info('Set up spark schema')
-    schema = StructType([
-        StructField("video_id", StringType(), True),
-        StructField("time_spent", IntegerType(), True),
-        StructField("video_duration", IntegerType(), True),
-        StructField("customer_id", StringType(), True),
-        StructField("user_id", StringType(), True),
-        StructField("device_id", StringType(), True)
-    ])
-
-    logger.info('Reading dataset...')
-    df = spark.read.format("csv") \
-        .option("sep", ",") \
-        .option("nullValue", "*") \
-        .option("header", "true") \
-        .option("escape", "\"") \
-        .schema(schema) \
-        .load("/home/jovyan/work/data/{}.csv".format(args.dataset_name))
-    logger.info('Dataset successfully read')
 
+def run_shared_validation(spark, context, df, batch_request,
+                          expectation_suite_names, run_ids, logger,
+                          statistics=None):
+    """
+    Validate the batch against several suites sharing the work between them.
+
+    The suites are compiled into one metric registry, so that a single scan
+    computes every metric and the metrics identical across suites only once;
+    the expectations left to Great Expectations are validated together, each
+    distinct expectation once. Every suite still gets its own validation
+    result, stored under the run identifier of `run_ids` (a dict of
+    expectation suite name -> run identifier).
+
+    Returns:
+        A dict of expectation suite name -> validation result
+    """
+    registry = MetricRegistry()
+    validators = {}
+    compiled_suites = {}
+    for expectation_suite_name in expectation_suite_names:
+        validator = context.get_validator(
+            batch_request=batch_request,
+            expectation_suite_name=expectation_suite_name
+        )
+        validators[expectation_suite_name] = validator
+        compiled_suites[expectation_suite_name] = compile_suite(
+            validator.expectation_suite, df.schema, registry)
+    compiled_checks = sum(len(compiled.checks)
+                          for compiled in compiled_suites.values())
+    logger.info("Shared plan: {} expectations of {} suites compiled into {} "
+                "aggregates".format(compiled_checks,
+                                    len(expectation_suite_names),
+                                    len(registry.aggregates)))
+
+    with job_group(spark, "shared_suites",
+                   "{} expectations of {} suites compiled into a single scan"
+                   .format(compiled_checks, len(expectation_suite_names))):
+        if statistics is not None:
+            metrics = compute_metrics_with_statistics(df, registry,
+                                                      statistics, logger)
+        else:
+            metrics = compute_metrics(df, registry)
+
+    residual = OrderedDict()
+    for compiled in compiled_suites.values():
+        for configuration in compiled.residual:
+            residual.setdefault(_configuration_key(configuration),
+                                configuration)
+    residual_results = {}
+    if residual:
+        logger.info("{} distinct expectations left to Great Expectations"
+                    .format(len(residual)))
+        # any validator will do, they all wrap the same batch
+        residual_results = {
+            _configuration_key(result.expectation_config): result
+            for result in validate_residual(
+                spark, validators[expectation_suite_names[0]],
+                list(residual.values()), by_expectation=False)
+        }
+
+    validation_results = OrderedDict()
+    for expectation_suite_name, compiled in compiled_suites.items():
+        results = compiled.evaluate(metrics)
+        for configuration in compiled.residual:
+            result = copy.copy(
+                residual_results[_configuration_key(configuration)])
+            result.expectation_config = configuration
+            results.append(result)
+        validator = validators[expectation_suite_name]
+        validation_result = build_suite_validation_result(
+            expectation_suite_name=expectation_suite_name,
+            results=results,
+            run_id=run_ids[expectation_suite_name],
+            validator=validator,
+            meta={"execution_mode": "shared",
+                  "shared_with": [name for name in expectation_suite_names
+                                  if name != expectation_suite_name]}
+        )
+        store_validation_result(context, validation_result,
+                                batch_identifier=validator.active_batch_id)
+        validation_results[expectation_suite_name] = validation_result
+    return validation_results
+
+
+def run_sampled_validation(context, df, batch_request,
+                           expectation_suite_name, run_id, options, strata,
+                           logger):
+    """
+    Validate the suite on a sample of the batch and estimate, for each
+    expectation, the unexpected percentage of the whole batch with a
+    confidence interval and a `pass`, `fail` or `inconclusive` status
+    against its `mostly` threshold.
+
+    The estimates are written as a JSON report, they are not stored as
+    validation results.
+
+    Returns:
+        The report dict
+    """
+    validator = context.get_validator(
+        batch_request=batch_request,
+        expectation_suite_name=expectation_suite_name
+    )
+    compiled = compile_suite(validator.expectation_suite, df.schema)
+    if strata is None:
+        metrics_by_stratum = {None: compute_metrics(df, compiled.registry)}
+    else:
+        metrics_by_stratum = {
+            stratum: metrics for (stratum,), metrics in compute_metrics(
+                df.withColumn(STRATUM_COLUMN,
+                              get_stratum(options.stratify_column)),
+                compiled.registry, group_by=[STRATUM_COLUMN])
+        }
+    residual_results = validator.graph_validate(
+        configurations=compiled.residual) if compiled.residual else []
+
+    expectations = estimate_suite(
+        compiled=compiled,
+        metrics_by_stratum=metrics_by_stratum,
+        strata=strata,
+        residual_results=residual_results,
+        confidence_level=options.confidence_level
+    )
+    report = {
+        "expectation_suite_name": expectation_suite_name,
+        "run_name": run_id["run_name"],
+        "run_time": run_id["run_time"].isoformat(),
+        "sample": {
+            "method": options.sample,
+            "fraction": options.sample_fraction,
+            "size": options.sample_size,
+            "stratify_column": options.stratify_column,
+            "seed": options.sample_seed,
+            "confidence_level": options.confidence_level,
+        },
+        "statistics": {
+            status: sum(entry["status"] == status for entry in expectations)
+            for status in ("pass", "fail", "inconclusive")
+        },
+        "expectations": expectations,
+    }
+    report["success"] = report["statistics"]["fail"] == 0
+
+    report_path = os.path.join(
+        options.sample_report_dir,
+        "sample_validation_{}_{}.json".format(
+            expectation_suite_name,
+            run_id["run_time"].strftime("%Y%m%dT%H%M%S")))
+    os.makedirs(options.sample_report_dir, exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    logger.info('Sample validation report written to {}'.format(report_path))
+    for entry in expectations:
+        logger.info('{} {}: {}'.format(entry["expectation_type"],
+                                       entry["kwargs"].get("column", ""),
+                                       entry["status"]))
+    return report
+
+
+def get_quarantine_paths(options, expectation_suite_name, run_id,
+                         batch_id=None):
+    """
+    Return the (quarantine path, clean rows path) of a run, partitioned by
+    suite and run time under `--quarantine_dir` and `--clean_output_dir`,
+    and by batch when given, so that the batches validated concurrently
+    (e.g. the backfill shards) never write to the same path.
+    """
+    run_partition = "run_time={}".format(
+        run_id["run_time"].strftime("%Y%m%dT%H%M%S"))
+    if batch_id is not None:
+        run_partition = os.path.join(run_partition,
+                                     "batch_id={}".format(batch_id))
+    clean_path = os.path.join(options.clean_output_dir,
+                              expectation_suite_name, run_partition) \
+        if options.clean_output_dir else None
+    return os.path.join(options.quarantine_dir, expectation_suite_name,
+                        run_partition), clean_path
+
+
+def get_data_context(validations_db=None, execution_engine="spark"):
+    """
+    Args:
+        validations_db (str or None): When given, the validation results are
+            stored in this SQLite database (see validation_history.py)
+            instead of one JSON file per run
+        execution_engine (str): `spark`, or `pandas` to validate pandas
+            DataFrames without starting Spark
+    """
     datasources = {
         "filesystem_datasource": {
             "class_name": "Datasource",
@@ -86,6 +516,9 @@ def main():
                 "module_name": "great_expectations.execution_engine",
                 "class_name": "SparkDFExecutionEngine",
                 "force_reuse_spark_context": "true"
+            } if execution_engine == "spark" else {
+                "module_name": "great_expectations.execution_engine",
+                "class_name": "PandasExecutionEngine",
             },
             "data_connectors": {
                 "runtime_data_connector": {
@@ -96,7 +529,6 @@ def main():
         }
     }
 
-    logger.info('Instantiating Great Expectations Data Context...')
     data_context_config = DataContextConfig(
         datasources=datasources,
         stores={
@@ -112,6 +544,10 @@ def main():
                 "store_backend": {
                     "class_name": "TupleFilesystemStoreBackend",
                     "base_directory": "/home/jovyan/work/validations",
+                } if validations_db is None else {
+                    "module_name": "validation_history",
+                    "class_name": "SQLiteValidationsStoreBackend",
+                    "db_path": validations_db,
                 }
             },
             "evaluation_parameter_store": {
@@ -145,61 +581,708 @@ def main():
             "enabled": False
         }
     )
-    context = BaseDataContext(project_config=data_context_config)
-    logger.info('Great Expectations Data Context instantiated ')
+    return BaseDataContext(project_config=data_context_config)
+
+
+def add_validation_arguments(parser):
+    """Add the options shared by every validation entry point."""
+    parser.add_argument('--execution_mode',
+                        help='checkpoint: run the suite through a GE '
+                             'Checkpoint; fused: evaluate the whole suite '
+                             'with a single Spark scan; incremental: scan '
+                             'only the new or changed partitions; planned: '
+                             'answer the schema expectations without a '
+                             'scan, then the others by increasing cost',
+                        choices=EXECUTION_MODES,
+                        default="checkpoint")
+    parser.add_argument('--fail_fast',
+                        help='With the planned execution mode, skip the '
+                             'remaining stages once a critical expectation '
+                             '(a schema one, or one with "critical": true in '
+                             'its meta) fails',
+                        action="store_true")
+    parser.add_argument('--footer_statistics',
+                        help='With the fused and planned execution modes, '
+                             'answer the row count, null count, min and max '
+                             'metrics from the Parquet/ORC footer statistics '
+                             'when they are exact, scanning only for the '
+                             'others',
+                        action="store_true")
+    parser.add_argument('--input_format',
+                        help='The format of the dataset to validate',
+                        choices=sorted(READERS),
+                        default="csv")
+    parser.add_argument('--dataset_path',
+                        help='Path of the dataset to validate, default to '
+                             '/home/jovyan/work/data/'
+                             '<dataset_name>.<input_format>')
+    parser.add_argument('--row_filter',
+                        help='SQL predicate selecting the rows to validate, '
+                             'pushed down to the file scan')
+    parser.add_argument('--schema_cache_dir',
+                        help='Directory caching the inferred schemas of the '
+                             'datasets whose suite does not declare the '
+                             'column types',
+                        default="/home/jovyan/work/schema_cache")
+    parser.add_argument('--adaptive_partitioning',
+                        help='Enable AQE and repartition or coalesce the '
+                             'batch before the validation, after the input '
+                             'file sizes, their compression and the skew of '
+                             'the multicolumn key columns',
+                        action="store_true")
+    parser.add_argument('--target_partition_mb',
+                        help='The partition size targeted by '
+                             '--adaptive_partitioning',
+                        type=int,
+                        default=128)
+    parser.add_argument('--skew_threshold',
+                        help='Ratio between the most frequent key and the '
+                             'mean key frequency above which the keys are '
+                             'skewed and the batch is not repartitioned by '
+                             'them',
+                        type=float,
+                        default=5.0)
+    parser.add_argument('--pandas_threshold_mb',
+                        help='Validate local csv/json datasets smaller than '
+                             'this with pandas, without starting Spark; 0 '
+                             'disables the pandas fast path',
+                        type=float,
+                        default=16)
+    parser.add_argument('--cache_mode',
+                        help='How the batch is materialized before the '
+                             'validation run',
+                        choices=CACHE_MODES,
+                        default="none")
+    parser.add_argument('--checkpoint_dir',
+                        help='Where the parquet_checkpoint cache mode writes '
+                             'the batch',
+                        default="/tmp/dq_batch_checkpoints")
+    parser.add_argument('--state_store_dir',
+                        help='Where the incremental execution mode keeps the '
+                             'per-partition metrics',
+                        default="/home/jovyan/work/state_store")
+    parser.add_argument('--sample',
+                        help='Validate a sample of the dataset and estimate '
+                             'the results with confidence intervals: '
+                             'fraction, reservoir (fixed size) or stratified '
+                             '(by --stratify_column)',
+                        choices=SAMPLE_METHODS)
+    parser.add_argument('--sample_fraction',
+                        help='The fraction of rows of the fraction and '
+                             'stratified samples',
+                        type=float,
+                        default=0.01)
+    parser.add_argument('--sample_size',
+                        help='The number of rows of the reservoir sample',
+                        type=int,
+                        default=10000)
+    parser.add_argument('--stratify_column',
+                        help='The column the stratified sample is drawn by')
+    parser.add_argument('--sample_seed',
+                        help='The random seed of the sample',
+                        type=int)
+    parser.add_argument('--confidence_level',
+                        help='The confidence level of the sample estimates',
+                        type=float,
+                        default=0.95)
+    parser.add_argument('--sample_report_dir',
+                        help='Where the sample validation reports are written',
+                        default="/home/jovyan/work/reports")
+    parser.add_argument('--profile',
+                        help='Run every expectation in its own Spark job '
+                             'group and write a per-expectation profiling '
+                             'report (stage time, input, shuffle and spill)',
+                        action="store_true")
+    parser.add_argument('--profiling_dir',
+                        help='Where the profiling reports are written, with '
+                             'the same layout as the validations store',
+                        default="/home/jovyan/work/profiling")
+    parser.add_argument('--quarantine_dir',
+                        help='Write the rows failing the suite, with the ids '
+                             'of the expectations they fail, to Parquet '
+                             'under this directory')
+    parser.add_argument('--clean_output_dir',
+                        help='With --quarantine_dir, write the rows passing '
+                             'the suite to Parquet under this directory')
+    parser.add_argument('--validations_db',
+                        help='Store the validation results in this SQLite '
+                             'database, indexed for history queries, '
+                             'instead of one JSON file per run')
+    parser.add_argument('--unexpected_top_k',
+                        help='Fill the partial_unexpected_counts of the '
+                             'failing map expectations with their K most '
+                             'frequent unexpected values, computed with '
+                             'distributed heavy-hitter sketches',
+                        type=int,
+                        default=0)
+    parser.add_argument('--metrics_dir',
+                        help='Write the run duration, read duration, rows, '
+                             'rows/sec and the per-expectation results as an '
+                             'OpenMetrics textfile <dataset>.<suite>.prom '
+                             '(<dataset>.<suite>.<batch_id>.prom for the '
+                             'batches of the manifest, service and backfill '
+                             'runners) under this directory, for the '
+                             'node_exporter textfile collector')
+    parser.add_argument('--pushgateway_url',
+                        help='Also push the run metrics to this Prometheus '
+                             'Pushgateway, e.g. http://localhost:9091')
+    return parser
+
+
+def get_shared_job_groups(expectation_suite, schema, execution_mode):
+    """
+    Return the job group each expectation of a suite shares with others in
+    an execution mode: the single scan for the compiled ones, the Great
+    Expectations run for the others. Schema expectations run no Spark job.
+
+    Returns:
+        A dict of expectation id (see `get_expectation_id()`) -> job group
+    """
+    if execution_mode not in SCAN_JOB_GROUPS:
+        return {get_expectation_id(configuration): "checkpoint_suite"
+                for configuration in expectation_suite.expectations}
+    compiled = compile_suite(expectation_suite, schema)
+    shared_groups = {get_expectation_id(configuration):
+                     "residual_expectations"
+                     for configuration in compiled.residual}
+    shared_groups.update({
+        get_expectation_id(check.configuration):
+            SCAN_JOB_GROUPS[execution_mode]
+        for check in compiled.checks if not isinstance(check, SchemaCheck)})
+    return shared_groups
+
+
+def get_partitioning_plan(spark, options, dataset_path):
+    """
+    With `--adaptive_partitioning`, plan the partitioning of the batch from
+    its input files, before it is read.
+    """
+    if not options.adaptive_partitioning:
+        return None
+    return plan_partitioning(
+        spark=spark,
+        path=dataset_path,
+        input_format=options.input_format,
+        target_partition_bytes=options.target_partition_mb * 1024 * 1024
+    )
+
+
+def scoped_adaptive_execution(validate):
+    """
+    Run a validation function with the AQE settings of
+    `--adaptive_partitioning` (see `adaptive_execution()`), restoring the
+    previous session settings when it returns or fails. Without the option
+    it still runs in an `adaptive_execution()` block keeping the session
+    settings, so that no concurrent target changes them meanwhile.
+    """
+    @functools.wraps(validate)
+    def wrapper(spark, context, options, logger, *args, **kwargs):
+        with adaptive_execution(
+                spark, options.target_partition_mb * 1024 * 1024
+                if options.adaptive_partitioning else None):
+            return validate(spark, context, options, logger, *args, **kwargs)
+    return wrapper
+
+
+def get_pandas_files(options):
+    """
+    Return the files of the dataset when it can be validated with the pandas
+    fast path: a small local dataset, validated against one suite in the
+    checkpoint or fused mode with no option that needs Spark.
+    """
+    if options.pandas_threshold_mb <= 0 or \
+            options.execution_mode not in ("checkpoint", "fused") or \
+            options.sample or options.profile or options.quarantine_dir or \
+            options.unexpected_top_k or options.row_filter:
+        return None
+    dataset_path = options.dataset_path or \
+        "/home/jovyan/work/data/{}.{}".format(options.dataset_name,
+                                              options.input_format)
+    return get_small_dataset_files(
+        path=dataset_path,
+        input_format=options.input_format,
+        threshold_bytes=options.pandas_threshold_mb * 1024 * 1024
+    )
+
+
+@scoped_adaptive_execution
+def validate_dataset(spark, context, options, logger, batch_id=None):
+    """
+    Read a dataset and validate it against an Expectation Suite.
+
+    Args:
+        spark (SparkSession): The Spark session
+        context (BaseDataContext): The Great Expectations Data Context
+        options (Namespace): `dataset_name`, `suite_name` and the options
+            added by `add_validation_arguments()`
+        logger (Logger): The logger
+        batch_id (str or None): The batch identifier, unique among the
+            batches validated concurrently with the same Data Context; it
+            also separates the quarantine, clean rows and metrics outputs of
+            the concurrent batches
+
+    Returns:
+        The validation success flag
+    """
+    run_metrics = RunMetrics(options.dataset_name, options.suite_name,
+                             batch_id)
+    logger.info("Name of the dataset to validate: {}, "
+                .format(options.dataset_name))
+    expectation_suite = options.dataset_name+"."+options.suite_name
+    logger.info("Expectation suite name: {}, "
+                .format(expectation_suite))
+
+    expectation_suite_json = context.get_expectation_suite(
+        expectation_suite).to_json_dict()
+    logger.info('Custom Expectations registered: {}'.format(
+        ", ".join(custom_expectations.register_suite_expectations(
+            expectation_suite_json)) or "none"))
+    suite_columns = get_suite_columns(expectation_suite_json)
+    logger.info('Columns referenced by the suite: {}'.format(
+        "all" if suite_columns is None else ", ".join(suite_columns)))
+
+    dataset_path = options.dataset_path or \
+        "/home/jovyan/work/data/{}.{}".format(options.dataset_name,
+                                              options.input_format)
+
+    logger.info('Set up spark schema')
+    schema, schema_source = get_read_schema(
+        spark=spark,
+        path=dataset_path,
+        input_format=options.input_format,
+        expectation_suite=expectation_suite_json,
+        schema_cache_dir=options.schema_cache_dir
+    )
+    logger.info('Read schema taken from: {}'.format(schema_source))
+
+    partitioning = get_partitioning_plan(spark, options, dataset_path)
+
+    logger.info('Reading {} dataset {}...'.format(options.input_format,
+                                                  dataset_path))
+    read_columns = suite_columns
+    if options.sample == "stratified" and suite_columns is not None and \
+            options.stratify_column not in suite_columns:
+        read_columns = suite_columns + [options.stratify_column]
+    df = read_dataset(
+        spark=spark,
+        path=dataset_path,
+        input_format=options.input_format,
+        columns=read_columns,
+        schema=schema,
+        row_filter=options.row_filter
+    )
+    logger.info('Dataset successfully read')
+    if partitioning is not None:
+        df = apply_partitioning(df, partitioning,
+                                key_columns=get_key_columns(
+                                    expectation_suite_json),
+                                skew_threshold=options.skew_threshold,
+                                logger=logger)
+
+    statistics = None
+    if options.footer_statistics and \
+            options.input_format in STATISTICS_FORMATS and \
+            not options.row_filter and not options.sample:
+        # the footers describe the whole files, not a filtered or sampled df
+        statistics = read_footer_statistics(spark, dataset_path,
+                                            options.input_format)
+        logger.info('Footer statistics read: {} rows, {} columns'.format(
+            statistics.row_count if statistics else 0,
+            len(statistics.columns) if statistics else 0))
+
+    strata = None
+    if options.sample:
+        if options.sample_seed is None:
+            # a fixed seed keeps the sample stable when it is recomputed
+            options.sample_seed = random.randint(0, 2 ** 31 - 1)
+        logger.info('Drawing a {} sample, seed {}'.format(options.sample,
+                                                          options.sample_seed))
+        df, strata = draw_sample(
+            df=df,
+            method=options.sample,
+            fraction=options.sample_fraction,
+            size=options.sample_size,
+            stratify_column=options.stratify_column,
+            seed=options.sample_seed
+        )
+
+    logger.info('Materializing batch with cache mode: {}'
+                .format(options.cache_mode))
+    batch = materialize_batch(
+        spark=spark,
+        df=df,
+        cache_mode=options.cache_mode,
+        checkpoint_dir=options.checkpoint_dir
+    )
+    if options.cache_mode != "none":
+        logger.info('Batch materialized in {:.2f}s: {} rows, {} bytes'
+                    .format(batch.duration, batch.row_count,
+                            batch.size_in_bytes))
+    run_metrics.read_done(rows=batch.row_count)
 
     logger.info('Reading RuntimeBatchRequest...')
     batch_request = RuntimeBatchRequest(
         datasource_name="filesystem_datasource",
         data_connector_name="runtime_data_connector",
         data_asset_name="data_asset_name",
-        batch_identifiers={"batch_id": "something_something"},
-        runtime_parameters={"batch_data": df},
+        batch_identifiers={"batch_id": batch_id or "something_something"},
+        runtime_parameters={"batch_data": batch.df},
     )
 
-    validations = [
-        {
-            "batch_request": batch_request,
-            "expectation_suite_name": expectation_suite
-         }
-    ]
+    run_id = {
+        "run_name": options.dataset_name + "_" + options.suite_name + "_run",
+        "run_time": datetime.datetime.now(datetime.timezone.utc)
+    }
 
-    checkpoint = SimpleCheckpoint(
-        name="checkpoint",
-        data_context=context,
-        class_name="SimpleCheckpoint",
-        action_list=[
-            {
-                "name": "store_validation_result",
-                "action": {
-                    "class_name": "StoreValidationResultAction"
-                }
-            }
-        ]
-    )
+    profiler = None
+    try:
+        if options.sample:
+            logger.info('Sample validation running...')
+            report = run_sampled_validation(
+                context=context,
+                df=batch.df,
+                batch_request=batch_request,
+                expectation_suite_name=expectation_suite,
+                run_id=run_id,
+                options=options,
+                strata=strata,
+                logger=logger
+            )
+            logger.info('Sample validation completed: {}'
+                        .format(report["statistics"]))
+            return report["success"]
 
-    logger.info('Validation Checkpoint running...')
+        quarantine_paths = get_quarantine_paths(
+            options, expectation_suite, run_id, batch_id) \
+            if options.quarantine_dir else None
+        if options.profile or options.metrics_dir or \
+                options.pushgateway_url:
+            # the job group stage times are exported with the run metrics,
+            # read from the REST API when no profiling report needs more
+            profiler = SparkProfiler(spark, listener=options.profile).start()
+        if options.execution_mode == "fused":
+            logger.info('Fused validation running...')
+            validation_result = run_fused_validation(
+                spark=spark,
+                context=context,
+                df=batch.df,
+                batch_request=batch_request,
+                expectation_suite_name=expectation_suite,
+                run_id=run_id,
+                logger=logger,
+                profile=options.profile,
+                quarantine_paths=quarantine_paths,
+                statistics=statistics
+            )
+        elif options.execution_mode == "planned":
+            logger.info('Planned validation running...')
+            validation_result = run_planned_validation(
+                spark=spark,
+                context=context,
+                df=batch.df,
+                batch_request=batch_request,
+                expectation_suite_name=expectation_suite,
+                run_id=run_id,
+                logger=logger,
+                fail_fast=options.fail_fast,
+                profile=options.profile,
+                statistics=statistics
+            )
+        elif options.execution_mode == "incremental":
+            logger.info('Incremental validation running...')
+            validation_result = run_incremental_validation(
+                spark=spark,
+                context=context,
+                df=batch.df,
+                batch_request=batch_request,
+                expectation_suite_name=expectation_suite,
+                run_id=run_id,
+                options=options,
+                dataset_path=dataset_path,
+                schema=schema,
+                columns=suite_columns,
+                logger=logger,
+                profile=options.profile
+            )
+        elif options.profile:
+            logger.info('Profiled validation running...')
+            validation_result = run_profiled_validation(
+                spark=spark,
+                context=context,
+                batch_request=batch_request,
+                expectation_suite_name=expectation_suite,
+                run_id=run_id
+            )
+        else:
+            logger.info('Validation Checkpoint running...')
+            with job_group(spark, "checkpoint_suite",
+                           "Suite validated by a Great Expectations "
+                           "Checkpoint"):
+                checkpoint_result = run_checkpoint_validation(
+                    context=context,
+                    batch_request=batch_request,
+                    expectation_suite_name=expectation_suite,
+                    run_id=run_id
+                )
+            validation_result = checkpoint_result.list_validation_results()[0]
+        logger.info('{} validation completed, success: {}'
+                    .format(options.execution_mode.capitalize(),
+                            validation_result.success))
 
-    run_id = {
-        "run_name": args.dataset_name + "_" + args.suite_name + "_run",
-        "run_time": datetime.datetime.now(datetime.timezone.utc)
+        if options.unexpected_top_k:
+            with job_group(spark, "unexpected_top_k",
+                           "Top-{} unexpected values".format(
+                               options.unexpected_top_k)):
+                updated = add_unexpected_top_k(
+                    batch.df,
+                    compile_suite(
+                        context.get_expectation_suite(expectation_suite),
+                        batch.df.schema),
+                    validation_result,
+                    k=options.unexpected_top_k)
+            if updated:
+                # overwrite the stored result with the unexpected counts
+                store_validation_result(
+                    context, validation_result,
+                    get_validation_result_identifier(
+                        validation_result).batch_identifier)
+            logger.info('Top-{} unexpected values added to {} expectations'
+                        .format(options.unexpected_top_k, updated))
+
+        if quarantine_paths is not None:
+            if options.execution_mode != "fused":
+                # only the fused scan writes the failing rows as it validates
+                with job_group(spark, "quarantine", "Quarantine failing rows"):
+                    write_quarantine(spark, batch.df, compile_suite(
+                        context.get_expectation_suite(expectation_suite),
+                        batch.df.schema), *quarantine_paths)
+            logger.info('Failing rows written to {}'
+                        .format(quarantine_paths[0]))
+
+        groups = profiler.stop() if profiler is not None else None
+        if options.profile:
+            report_path = write_profiling_report(
+                profiling_dir=options.profiling_dir,
+                validation_result_identifier=get_validation_result_identifier(
+                    validation_result),
+                validation_result=validation_result,
+                groups=groups
+            )
+            logger.info('Profiling report written to {}'.format(report_path))
+        if options.metrics_dir or options.pushgateway_url:
+            export_run_metrics(
+                run_metrics, validation_result, options, logger,
+                groups=groups,
+                shared_groups=get_shared_job_groups(
+                    context.get_expectation_suite(expectation_suite),
+                    batch.df.schema, options.execution_mode))
+        return validation_result.success
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        batch.release()
+
+
+@scoped_adaptive_execution
+def validate_dataset_suites(spark, context, options, logger,
+                            batch_id="something_something"):
+    """
+    Read a dataset once and validate it against several Expectation Suites
+    with a shared scan (see `run_shared_validation()`).
+
+    The batch is read with the columns of all the suites and cached, with
+    `memory_and_disk` unless another `--cache_mode` is given.
+
+    Args:
+        options (Namespace): `dataset_name`, the list of `suite_name` and the
+            options added by `add_validation_arguments()`
+
+    Returns:
+        The validation success flag, True when every suite succeeded
+    """
+    run_metrics = {
+        options.dataset_name + "." + suite_name:
+            RunMetrics(options.dataset_name, suite_name)
+        for suite_name in options.suite_name
     }
+    logger.info("Name of the dataset to validate: {}, "
+                .format(options.dataset_name))
+    expectation_suites = [options.dataset_name + "." + suite_name
+                          for suite_name in options.suite_name]
+    logger.info("Expectation suite names: {}, "
+                .format(", ".join(expectation_suites)))
 
-    checkpoint_result = checkpoint.run(
-        run_id=run_id,
-        run_name_template="%Y%m%d_%H%M%S",
-        validations=validations,
-        action_list=[
-            {
-                "name": "store_validation_result",
-                "action": {
-                    "class_name": "StoreValidationResultAction"
-                }
-            }
-        ]
+    suites_json = [context.get_expectation_suite(name).to_json_dict()
+                   for name in expectation_suites]
+    # the suites read together behave as one suite with all the expectations
+    combined_suite_json = {"expectations": [
+        expectation for suite_json in suites_json
+        for expectation in suite_json["expectations"]]}
+    logger.info('Custom Expectations registered: {}'.format(
+        ", ".join(custom_expectations.register_suite_expectations(
+            combined_suite_json)) or "none"))
+    suite_columns = get_suite_columns(combined_suite_json)
+    logger.info('Columns referenced by the suites: {}'.format(
+        "all" if suite_columns is None else ", ".join(suite_columns)))
+
+    dataset_path = options.dataset_path or \
+        "/home/jovyan/work/data/{}.{}".format(options.dataset_name,
+                                              options.input_format)
+    schema, schema_source = get_read_schema(
+        spark=spark,
+        path=dataset_path,
+        input_format=options.input_format,
+        expectation_suite=combined_suite_json,
+        schema_cache_dir=options.schema_cache_dir
+    )
+    logger.info('Read schema taken from: {}'.format(schema_source))
+
+    partitioning = get_partitioning_plan(spark, options, dataset_path)
+
+    logger.info('Reading {} dataset {}...'.format(options.input_format,
+                                                  dataset_path))
+    df = read_dataset(
+        spark=spark,
+        path=dataset_path,
+        input_format=options.input_format,
+        columns=suite_columns,
+        schema=schema,
+        row_filter=options.row_filter
+    )
+    if partitioning is not None:
+        df = apply_partitioning(df, partitioning,
+                                key_columns=get_key_columns(
+                                    combined_suite_json),
+                                skew_threshold=options.skew_threshold,
+                                logger=logger)
+    statistics = None
+    if options.footer_statistics and \
+            options.input_format in STATISTICS_FORMATS and \
+            not options.row_filter:
+        statistics = read_footer_statistics(spark, dataset_path,
+                                            options.input_format)
+
+    cache_mode = options.cache_mode if options.cache_mode != "none" \
+        else "memory_and_disk"
+    batch = materialize_batch(
+        spark=spark,
+        df=df,
+        cache_mode=cache_mode,
+        checkpoint_dir=options.checkpoint_dir
+    )
+    logger.info('Batch materialized with cache mode {} in {:.2f}s: {} rows, '
+                '{} bytes'.format(cache_mode, batch.duration,
+                                  batch.row_count, batch.size_in_bytes))
+    for suite_run_metrics in run_metrics.values():
+        suite_run_metrics.read_done(rows=batch.row_count)
+
+    batch_request = RuntimeBatchRequest(
+        datasource_name="filesystem_datasource",
+        data_connector_name="runtime_data_connector",
+        data_asset_name="data_asset_name",
+        batch_identifiers={"batch_id": batch_id},
+        runtime_parameters={"batch_data": batch.df},
     )
+    run_time = datetime.datetime.now(datetime.timezone.utc)
+    run_ids = {
+        expectation_suite: {
+            "run_name": options.dataset_name + "_" + suite_name + "_run",
+            "run_time": run_time
+        }
+        for expectation_suite, suite_name in zip(expectation_suites,
+                                                 options.suite_name)
+    }
+
+    try:
+        logger.info('Shared validation running...')
+        validation_results = run_shared_validation(
+            spark=spark,
+            context=context,
+            df=batch.df,
+            batch_request=batch_request,
+            expectation_suite_names=expectation_suites,
+            run_ids=run_ids,
+            logger=logger,
+            statistics=statistics
+        )
+        for expectation_suite, validation_result in \
+                validation_results.items():
+            logger.info('{} validation completed, success: {}'
+                        .format(expectation_suite, validation_result.success))
+            export_run_metrics(run_metrics[expectation_suite],
+                               validation_result, options, logger)
+        return all(validation_result.success
+                   for validation_result in validation_results.values())
+    finally:
+        batch.release()
+
+
+def main():
+    # global CONF
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset_name',
+                        help='Name of the dataset to validate',
+                        required=True)
+    parser.add_argument('--suite_name',
+                        help='The expectation suite name; with several '
+                             'names the suites are validated with a shared '
+                             'scan of the dataset',
+                        nargs="+",
+                        required=True)
+    parser.add_argument('--log_level',
+                        help='The log level',
+                        required=True)
+    add_validation_arguments(parser)
+
+    args, unknown_args = parser.parse_known_args()
+
+    logger = get_logger(logger_name=__file__,
+                        logger_level=args.log_level)
+
+    shared = len(args.suite_name) > 1
+    if shared and (args.execution_mode not in ("checkpoint", "fused")
+                   or args.sample or args.profile or args.quarantine_dir
+                   or args.unexpected_top_k):
+        parser.error("several --suite_name are validated with a shared fused "
+                     "scan, which supports neither the incremental and "
+                     "planned execution modes nor --sample, --profile, "
+                     "--quarantine_dir and --unexpected_top_k")
+    if not shared:
+        args.suite_name = args.suite_name[0]
+
+    pandas_files = None if shared else get_pandas_files(args)
+    if pandas_files is not None:
+        logger.info('Small dataset, validating it with pandas...')
+        success = validate_dataset_pandas(
+            context=get_data_context(args.validations_db,
+                                     execution_engine="pandas"),
+            options=args,
+            files=pandas_files,
+            logger=logger
+        )
+        if success is not None:
+            return
+        logger.info('The suite does not declare every column type, '
+                    'validating the dataset with Spark')
+
+    spark = SparkSession.builder.enableHiveSupport().getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+    logger.info('Spark session created')
+
+    logger.info('Instantiating Great Expectations Data Context...')
+    context = get_data_context(args.validations_db)
+    logger.info('Great Expectations Data Context instantiated ')
 
-    logger.info('Validation Checkpoint completed')
+    if shared:
+        validate_dataset_suites(spark=spark,
+                                context=context,
+                                options=args,
+                                logger=logger)
+    else:
+        validate_dataset(spark=spark,
+                         context=context,
+                         options=args,
+                         logger=logger)
 
 
 if __name__ == '__main__':
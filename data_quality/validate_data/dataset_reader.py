@@ -0,0 +1,328 @@
+import hashlib
+import json
+import os
+
+from pyspark.sql import types as sparktypes
+
+# Expectations validating the table as a whole: when a suite contains one of
+# them every column must be read.
+TABLE_WIDE_EXPECTATIONS = (
+    "expect_table_columns_to_match_ordered_list",
+    "expect_table_columns_to_match_set",
+    "expect_table_column_count_to_equal",
+    "expect_table_column_count_to_be_between",
+    "expect_compound_columns_to_be_unique",
+)
+
+COLUMN_KWARGS = ("column", "column_A", "column_B")
+
+COLUMNAR_FORMATS = ("parquet", "orc", "delta")
+
+TYPE_EXPECTATIONS = (
+    "expect_column_values_to_be_in_type_list",
+    "expect_column_values_to_be_of_type",
+)
+
+CSV_OPTIONS = {
+    "sep": ",",
+    "nullValue": "*",
+    "header": "true",
+    "escape": "\"",
+}
+
+READERS = {}
+
+
+def register_reader(input_format):
+    """
+    Register a reader function for an input format.
+
+    The reader is called as `reader(spark, path, schema, options)` and must
+    return a DataFrame.
+    """
+    def wrapper(reader_fn):
+        READERS[input_format] = reader_fn
+        return reader_fn
+    return wrapper
+
+
+@register_reader("csv")
+def _read_csv(spark, path, schema, options):
+    reader = spark.read.format("csv").options(**CSV_OPTIONS)
+    if schema is not None:
+        reader = reader.schema(schema)
+    return reader.options(**options).load(path)
+
+
+@register_reader("json")
+def _read_json(spark, path, schema, options):
+    reader = spark.read.format("json")
+    if schema is not None:
+        reader = reader.schema(schema)
+    return reader.options(**options).load(path)
+
+
+def _columnar_reader(input_format):
+    # the schema is stored in the files metadata, so no read schema is needed
+    def _read_columnar(spark, path, schema, options):
+        return spark.read.format(input_format).options(**options).load(path)
+    return _read_columnar
+
+
+for _input_format in COLUMNAR_FORMATS:
+    register_reader(_input_format)(_columnar_reader(_input_format))
+
+
+def get_suite_columns(expectation_suite):
+    """
+    Work out the columns referenced by an Expectation Suite.
+
+    Args:
+        expectation_suite (dict): The expectation suite JSON
+
+    Returns:
+        The list of referenced column names, in order of first appearance, or
+        None when the suite needs the whole table.
+    """
+    columns = []
+    for expectation in expectation_suite["expectations"]:
+        if expectation["expectation_type"] in TABLE_WIDE_EXPECTATIONS:
+            return None
+        kwargs = expectation["kwargs"]
+        referenced = [kwargs[key] for key in COLUMN_KWARGS if key in kwargs]
+        referenced.extend(kwargs.get("column_list", []))
+        for column in referenced:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def read_dataset(spark, path, input_format, columns=None, schema=None,
+                 row_filter=None, options=None):
+    """
+    Read a dataset keeping only the columns a suite needs.
+
+    Column pruning and the optional row filter are applied right after the
+    load, so that Spark pushes them down to the file scan (Parquet/ORC/Delta
+    read only the selected column chunks and skip row groups through their
+    statistics).
+
+    Args:
+        spark (SparkSession): The Spark session
+        path (str): The dataset path
+        input_format (str): One of the registered formats (`READERS`)
+        columns (list or None): The columns to select, None to read them all
+        schema (StructType or None): The read schema, for text formats
+        row_filter (str or None): A SQL predicate to filter rows with
+        options (dict or None): Additional reader options
+
+    Returns:
+        A DataFrame
+    """
+    if input_format not in READERS:
+        raise ValueError("Unsupported input format '{}', expected one of: {}"
+                         .format(input_format, ", ".join(sorted(READERS))))
+    df = READERS[input_format](spark, path, schema, options or {})
+    if row_filter:
+        df = df.where(row_filter)
+    if columns is not None:
+        # columns missing from the dataset are left to the expectations
+        # (e.g. `expect_column_to_exist`) to report
+        df = df.select(*[column for column in columns
+                         if column in df.columns])
+    return df
+
+
+def read_stream(spark, path, input_format, schema, columns=None,
+                row_filter=None, options=None):
+    """
+    Read a directory of files as a Structured Streaming source, pruning the
+    columns and filtering the rows as `read_dataset()` does.
+
+    File sources need the schema up front: for columnar formats it is taken
+    from the files already in the directory when `schema` is None.
+
+    Returns:
+        A streaming DataFrame
+    """
+    if input_format not in READERS:
+        raise ValueError("Unsupported input format '{}', expected one of: {}"
+                         .format(input_format, ", ".join(sorted(READERS))))
+    if schema is None:
+        schema = READERS[input_format](spark, path, None, {}).schema
+    reader = spark.readStream.format(input_format).schema(schema)
+    if input_format == "csv":
+        reader = reader.options(**CSV_OPTIONS)
+    df = reader.options(**(options or {})).load(path)
+    if row_filter:
+        df = df.where(row_filter)
+    if columns is not None:
+        df = df.select(*[column for column in columns
+                         if column in df.columns])
+    return df
+
+
+def list_input_files(spark, path):
+    """
+    List the data files under a dataset path (a file, a directory or a glob)
+    through the Hadoop FileSystem API, skipping hidden and metadata files as
+    Spark does.
+
+    Returns:
+        A list of (file path, size in bytes, modification time) tuples
+    """
+    jvm = spark.sparkContext._jvm
+    hadoop_path = jvm.org.apache.hadoop.fs.Path(path)
+    fs = hadoop_path.getFileSystem(
+        spark.sparkContext._jsc.hadoopConfiguration())
+
+    statuses = []
+    for status in fs.globStatus(hadoop_path) or []:
+        if status.isDirectory():
+            iterator = fs.listFiles(status.getPath(), True)
+            while iterator.hasNext():
+                statuses.append(iterator.next())
+        else:
+            statuses.append(status)
+
+    return [
+        (status.getPath().toString(), status.getLen(),
+         status.getModificationTime())
+        for status in statuses
+        if not status.getPath().getName().startswith(("_", "."))
+    ]
+
+
+def get_files_fingerprint(files):
+    """Fingerprint a list of input files from their paths, sizes and mtimes."""
+    content = json.dumps(sorted(files))
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def _spark_type(type_name):
+    type_class = getattr(sparktypes, type_name, None)
+    if not isinstance(type_class, type) or \
+            not issubclass(type_class, sparktypes.DataType):
+        return None
+    try:
+        return type_class()
+    except TypeError:
+        # types like ArrayType or StructType need arguments
+        return None
+
+
+def get_suite_types(expectation_suite):
+    """
+    Collect the column types declared by the type expectations of a suite.
+
+    Returns:
+        A dict of column name -> Spark DataType
+    """
+    column_types = {}
+    for expectation in expectation_suite["expectations"]:
+        if expectation["expectation_type"] not in TYPE_EXPECTATIONS:
+            continue
+        kwargs = expectation["kwargs"]
+        type_names = kwargs.get("type_list") or [kwargs.get("type_")]
+        for type_name in type_names:
+            data_type = _spark_type(type_name) if type_name else None
+            if data_type is not None:
+                column_types.setdefault(kwargs["column"], data_type)
+                break
+    return column_types
+
+
+def get_suite_schema(expectation_suite, file_columns):
+    """
+    Build the read schema of a text dataset from the suite type expectations.
+
+    Args:
+        expectation_suite (dict): The expectation suite JSON
+        file_columns (list): The dataset columns, in file order
+
+    Returns:
+        A StructType, or None when a column referenced by the suite has no
+        declared type. Columns the suite does not reference are read as
+        strings, they are pruned right after the load.
+    """
+    column_types = get_suite_types(expectation_suite)
+    suite_columns = get_suite_columns(expectation_suite)
+    referenced = file_columns if suite_columns is None else suite_columns
+    if any(column not in column_types for column in referenced
+           if column in file_columns):
+        return None
+    return sparktypes.StructType([
+        sparktypes.StructField(
+            column, column_types.get(column, sparktypes.StringType()), True)
+        for column in file_columns
+    ])
+
+
+def _read_file_columns(spark, path, input_format, expectation_suite):
+    # without inferSchema Spark only reads the first line to name the columns
+    if input_format == "csv":
+        return spark.read.format("csv").options(**CSV_OPTIONS) \
+            .load(path).columns
+    # JSON fields are matched by name, the suite columns are enough
+    return get_suite_columns(expectation_suite)
+
+
+def _schema_cache_file(schema_cache_dir, path):
+    return os.path.join(schema_cache_dir,
+                        hashlib.sha1(path.encode()).hexdigest() + ".json")
+
+
+def load_cached_schema(schema_cache_dir, path, fingerprint):
+    """Return the cached schema of a dataset if its files did not change."""
+    cache_file = _schema_cache_file(schema_cache_dir, path)
+    if not os.path.exists(cache_file):
+        return None
+    with open(cache_file) as f:
+        cached = json.load(f)
+    if cached.get("path") != path or cached.get("fingerprint") != fingerprint:
+        return None
+    return sparktypes.StructType.fromJson(cached["schema"])
+
+
+def save_cached_schema(schema_cache_dir, path, fingerprint, schema):
+    os.makedirs(schema_cache_dir, exist_ok=True)
+    with open(_schema_cache_file(schema_cache_dir, path), "w") as f:
+        json.dump({"path": path,
+                   "fingerprint": fingerprint,
+                   "schema": schema.jsonValue()}, f, indent=2)
+
+
+def get_read_schema(spark, path, input_format, expectation_suite,
+                    schema_cache_dir):
+    """
+    Work out the read schema of a dataset without an inference pass whenever
+    possible.
+
+    The schema is built from the suite type expectations first; when that is
+    not possible it is inferred once and cached, keyed by the dataset path
+    and the fingerprint of its files, so later runs skip the inference.
+    Columnar formats store their schema and need none.
+
+    Returns:
+        A (schema, source) tuple, where source is one of `suite`, `cache`,
+        `inferred`, or (None, `metadata`) for columnar formats.
+    """
+    if input_format in COLUMNAR_FORMATS:
+        return None, "metadata"
+
+    file_columns = _read_file_columns(spark, path, input_format,
+                                      expectation_suite)
+    if file_columns is not None:
+        schema = get_suite_schema(expectation_suite, file_columns)
+        if schema is not None:
+            return schema, "suite"
+
+    fingerprint = get_files_fingerprint(list_input_files(spark, path))
+    schema = load_cached_schema(schema_cache_dir, path, fingerprint)
+    if schema is not None:
+        return schema, "cache"
+
+    schema = READERS[input_format](
+        spark, path, None, {"inferSchema": "true"}).schema
+    save_cached_schema(schema_cache_dir, path, fingerprint, schema)
+    return schema, "inferred"
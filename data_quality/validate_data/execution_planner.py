@@ -0,0 +1,107 @@
+from great_expectations.core.expectation_validation_result import \
+    ExpectationValidationResult
+
+from suite_compiler import SCHEMA_EXPECTATIONS, SchemaCheck, compile_suite, \
+    sort_results
+
+# Estimated cost of the expectations left to Great Expectations, relative to
+# a plain column map expectation: those needing a shuffle (distinct values,
+# uniqueness, quantiles) are the most expensive.
+RESIDUAL_COSTS = {
+    "expect_column_values_to_be_unique": 100,
+    "expect_compound_columns_to_be_unique": 100,
+    "expect_select_column_values_to_be_unique_within_record": 10,
+    "expect_column_distinct_values_to_be_in_set": 50,
+    "expect_column_distinct_values_to_contain_set": 50,
+    "expect_column_distinct_values_to_equal_set": 50,
+    "expect_column_unique_value_count_to_be_between": 50,
+    "expect_column_proportion_of_unique_values_to_be_between": 50,
+    "expect_column_most_common_value_to_be_in_set": 50,
+    "expect_column_quantile_values_to_be_between": 80,
+    "expect_column_median_to_be_between": 80,
+    "expect_column_kl_divergence_to_be_less_than": 80,
+}
+DEFAULT_RESIDUAL_COST = 10
+
+
+def is_critical(configuration):
+    """
+    An expectation is critical when its `meta` says so (`"critical": true`);
+    without it the schema expectations are, since a batch with the wrong
+    columns or types makes the other results meaningless.
+    """
+    critical = (configuration.meta or {}).get("critical")
+    if critical is not None:
+        return bool(critical)
+    return configuration.expectation_type in SCHEMA_EXPECTATIONS
+
+
+def estimate_cost(configuration):
+    return RESIDUAL_COSTS.get(configuration.expectation_type,
+                              DEFAULT_RESIDUAL_COST)
+
+
+def skipped_result(configuration, reason):
+    """The result of an expectation not validated because of `reason`."""
+    return ExpectationValidationResult(
+        success=False,
+        expectation_config=configuration,
+        result={},
+        meta={"skipped": reason},
+        exception_info={
+            "raised_exception": False,
+            "exception_message": None,
+            "exception_traceback": None,
+        },
+    )
+
+
+class ExecutionPlan(object):
+    """
+    The stages of a suite validation, cheapest first:
+
+    - `metadata`: the SchemaCheck, answered from the DataFrame schema without
+      any Spark job;
+    - `scan`: the other compiled checks, computed by one fused scan;
+    - `residual`: the expectations left to Great Expectations, ordered by
+      estimated cost (`estimate_cost()`).
+    """
+
+    def __init__(self, compiled, expectations):
+        self.compiled = compiled
+        self.metadata = [check for check in compiled.checks
+                         if isinstance(check, SchemaCheck)]
+        self.scan = [check for check in compiled.checks
+                     if not isinstance(check, SchemaCheck)]
+        self.residual = sorted(compiled.residual, key=estimate_cost)
+        self.expectations = expectations
+
+    def describe(self):
+        return "{} metadata, {} scan ({} aggregates) and {} residual " \
+               "expectations".format(len(self.metadata), len(self.scan),
+                                     len(self.compiled.registry.aggregates),
+                                     len(self.residual))
+
+    def sort_results(self, results):
+        """Put the results back in the order of the suite expectations."""
+        return sort_results(results, self.expectations)
+
+
+def plan_suite(expectation_suite, schema):
+    """
+    Split an Expectation Suite into the stages of an ExecutionPlan.
+
+    Args:
+        expectation_suite (ExpectationSuite): The suite to plan
+        schema (StructType): The schema of the batch to validate
+
+    Returns:
+        An ExecutionPlan
+    """
+    return ExecutionPlan(compile_suite(expectation_suite, schema),
+                         expectation_suite.expectations)
+
+
+def has_critical_failure(results):
+    return any(not result.success and is_critical(result.expectation_config)
+               for result in results)
@@ -0,0 +1,241 @@
+from dataset_reader import list_input_files
+from suite_compiler import _value_between, compute_metrics
+
+STATISTICS_FORMATS = ("parquet", "orc")
+
+# Parquet and ORC keep exact min/max statistics for integer columns only:
+# string and binary bounds may be truncated by the writer, floating point
+# ones ignore NaN (the largest value for Spark), and decimal, date or
+# timestamp ones would need a conversion of their physical values.
+PARQUET_INTEGER_TYPES = ("INT32", "INT64")
+PARQUET_SIGNED_ANNOTATIONS = (None, "INT_8", "INT_16", "INT_32", "INT_64")
+ORC_INTEGER_CATEGORIES = ("tinyint", "smallint", "int", "bigint")
+
+
+class ColumnStatistics(object):
+    """
+    The statistics of a column over one or more files.
+
+    Attributes:
+        null_count (int or None): Number of null values, None when a file
+            does not record it
+        min (int or None), max (int or None): Bounds of the non-null values,
+            None when there are none
+        exact_range (bool): Whether min and max are the exact bounds of the
+            values, i.e. every file has untruncated integer statistics
+    """
+
+    def __init__(self, null_count, min_value, max_value, exact_range):
+        self.null_count = null_count
+        self.min = min_value
+        self.max = max_value
+        self.exact_range = exact_range
+
+    def merge(self, other):
+        null_count = self.null_count + other.null_count \
+            if self.null_count is not None and other.null_count is not None \
+            else None
+        mins = [value for value in (self.min, other.min) if value is not None]
+        maxs = [value for value in (self.max, other.max) if value is not None]
+        return ColumnStatistics(
+            null_count=null_count,
+            min_value=min(mins) if mins else None,
+            max_value=max(maxs) if maxs else None,
+            exact_range=self.exact_range and other.exact_range)
+
+
+def _merge_columns(columns, other_columns):
+    return {name: statistics.merge(other_columns[name])
+            for name, statistics in columns.items()
+            if name in other_columns}
+
+
+class FooterStatistics(object):
+    """
+    The row count and per-column statistics of a dataset, read from the
+    footers of its Parquet or ORC files.
+
+    A column missing from one of the files has no statistics, since Spark
+    reads it as nulls there.
+    """
+
+    def __init__(self, row_count, columns):
+        self.row_count = row_count
+        self.columns = columns
+
+    def merge(self, other):
+        return FooterStatistics(
+            row_count=self.row_count + other.row_count,
+            columns=_merge_columns(self.columns, other.columns))
+
+    def answer(self, statistic):
+        """
+        Answer a metric tagged by the suite compiler (see
+        `MetricRegistry.statistics`) from the statistics.
+
+        Returns:
+            The metric value, or None when the statistics are missing or
+            not exact.
+        """
+        kind = statistic[0]
+        if kind == "row_count":
+            return self.row_count
+        column = self.columns.get(statistic[1])
+        if column is None or column.null_count is None:
+            return None
+        non_null_count = self.row_count - column.null_count
+        if kind == "null_count":
+            return column.null_count
+        if kind == "non_null_count":
+            return non_null_count
+        if non_null_count and not column.exact_range:
+            return None
+        if kind == "min":
+            return column.min
+        if kind == "max":
+            return column.max
+        # count_outside: the count is known when no value can be outside
+        if not non_null_count or (_value_between(column.min, statistic[2])
+                                  and _value_between(column.max,
+                                                     statistic[2])):
+            return 0
+        return None
+
+
+def _read_parquet_footer(jvm, conf, file_path):
+    footer = jvm.org.apache.parquet.hadoop.ParquetFileReader.readFooter(
+        conf, jvm.org.apache.hadoop.fs.Path(file_path),
+        jvm.org.apache.parquet.format.converter.ParquetMetadataConverter
+        .NO_FILTER)
+    row_count = 0
+    columns = None
+    for block in footer.getBlocks():
+        row_count += block.getRowCount()
+        block_columns = {}
+        for chunk in block.getColumns():
+            path = chunk.getPath().toDotString()
+            if "." in path:
+                # nested fields are not validated by the compiled checks
+                continue
+            stats = chunk.getStatistics()
+            if stats is None or stats.isEmpty() or stats.getNumNulls() < 0:
+                block_columns[path] = ColumnStatistics(None, None, None, False)
+                continue
+            primitive_type = chunk.getPrimitiveType()
+            annotation = primitive_type.getOriginalType()
+            exact_range = \
+                primitive_type.getPrimitiveTypeName().name() in \
+                PARQUET_INTEGER_TYPES and \
+                (annotation.name() if annotation is not None else None) in \
+                PARQUET_SIGNED_ANNOTATIONS
+            has_values = exact_range and stats.hasNonNullValue()
+            block_columns[path] = ColumnStatistics(
+                null_count=stats.getNumNulls(),
+                min_value=stats.genericGetMin() if has_values else None,
+                max_value=stats.genericGetMax() if has_values else None,
+                exact_range=exact_range)
+        columns = block_columns if columns is None \
+            else _merge_columns(columns, block_columns)
+    if columns is None:
+        # a file without row groups has no rows: every column is empty
+        columns = {field.getName(): ColumnStatistics(0, None, None, True)
+                   for field in footer.getFileMetaData().getSchema()
+                   .getFields()}
+    return FooterStatistics(row_count, columns)
+
+
+def _read_orc_footer(jvm, conf, file_path):
+    orc_file = jvm.org.apache.orc.OrcFile
+    reader = orc_file.createReader(jvm.org.apache.hadoop.fs.Path(file_path),
+                                   orc_file.readerOptions(conf))
+    row_count = reader.getNumberOfRows()
+    schema = reader.getSchema()
+    stats = reader.getStatistics()
+    columns = {}
+    for name, field in zip(schema.getFieldNames(), schema.getChildren()):
+        column_stats = stats[field.getId()]
+        non_null_count = column_stats.getNumberOfValues()
+        # ORC counts the non-null values of each column, not the nulls
+        exact_range = field.getCategory().getName() in ORC_INTEGER_CATEGORIES
+        has_values = exact_range and non_null_count > 0
+        columns[name] = ColumnStatistics(
+            null_count=row_count - non_null_count,
+            min_value=column_stats.getMinimum() if has_values else None,
+            max_value=column_stats.getMaximum() if has_values else None,
+            exact_range=exact_range)
+    return FooterStatistics(row_count, columns)
+
+
+FOOTER_READERS = {
+    "parquet": _read_parquet_footer,
+    "orc": _read_orc_footer,
+}
+
+
+def read_footer_statistics(spark, path, input_format):
+    """
+    Read the row count and column statistics of a Parquet or ORC dataset
+    from the footers of its files, without scanning any data page.
+
+    Args:
+        spark (SparkSession): The Spark session
+        path (str): The dataset path
+        input_format (str): One of `STATISTICS_FORMATS`
+
+    Returns:
+        A FooterStatistics, or None when the format stores no statistics or
+        the dataset has no files
+    """
+    if input_format not in STATISTICS_FORMATS:
+        return None
+    jvm = spark.sparkContext._jvm
+    conf = spark.sparkContext._jsc.hadoopConfiguration()
+    statistics = None
+    for file_path, _, _ in list_input_files(spark, path):
+        file_statistics = FOOTER_READERS[input_format](jvm, conf, file_path)
+        statistics = file_statistics if statistics is None \
+            else statistics.merge(file_statistics)
+    return statistics
+
+
+def answer_metrics(registry, statistics):
+    """
+    Answer the tagged metrics of a registry from the footer statistics.
+
+    Returns:
+        A dict of metric name -> value of the metrics answered
+    """
+    metrics = {}
+    if statistics is None:
+        return metrics
+    for name, statistic in registry.statistics.items():
+        value = statistics.answer(statistic)
+        if value is not None:
+            metrics[name] = value
+    return metrics
+
+
+def compute_metrics_with_statistics(df, registry, statistics, logger=None):
+    """
+    Compute the metrics of a registry answering from the footer statistics
+    all those they give exactly, and scanning `df` for the others only.
+
+    Args:
+        df (DataFrame): The batch of data, read with no row filter
+        registry (MetricRegistry): The metrics to compute
+        statistics (FooterStatistics or None): The statistics of the batch
+        logger (Logger or None): Logs how many metrics were answered
+
+    Returns:
+        A dict of metric name -> value
+    """
+    metrics = answer_metrics(registry, statistics)
+    remaining = [name for name in registry.aggregates if name not in metrics]
+    if logger is not None:
+        logger.info("{} of {} metrics answered from the footer statistics, "
+                    "{} computed by a scan".format(
+                        len(metrics), len(registry.aggregates),
+                        len(remaining)))
+    if remaining:
+        metrics.update(compute_metrics(df, registry.subset(remaining)))
+    return metrics
@@ -0,0 +1,198 @@
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import posixpath
+
+import pyspark.sql.functions as f
+
+from dataset_reader import get_files_fingerprint, list_input_files, \
+    read_dataset
+from suite_compiler import compute_metrics, merge_metrics
+
+FILE_COLUMN = "_dq_input_file"
+
+
+def _to_state_value(value):
+    # metrics are stored as JSON: computed values are converted right away so
+    # that stored and freshly computed partials merge the same way
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def get_file_path(spark, file_path, uri_encoded=False):
+    """
+    Return the decoded path of a data file, the same for a Hadoop path
+    string (`FileStatus.getPath().toString()`) and for the URI-encoded path
+    of `input_file_name()` (`uri_encoded`), e.g. for a Hive-escaped
+    `ts=10%3A00` partition.
+    """
+    hadoop = spark.sparkContext._jvm.org.apache.hadoop.fs
+    if uri_encoded:
+        path = hadoop.Path(spark.sparkContext._jvm.java.net.URI(file_path))
+    else:
+        path = hadoop.Path(file_path)
+    return path.toUri().getPath()
+
+
+def get_partition_key(file_path, root_path):
+    """
+    Return the partition of a data file, made of the `name=value` segments
+    of its directory below the dataset root (e.g. `dt=2022-10-01/country=IT`
+    for `/lake/env=prod/events/dt=2022-10-01/country=IT/part-0.csv` under
+    `/lake/env=prod/events`). Files outside a Hive-style layout all belong
+    to the "" partition.
+
+    Args:
+        file_path (str): The decoded file path (see `get_file_path()`)
+        root_path (str): The decoded dataset root path
+    """
+    directory = posixpath.relpath(posixpath.dirname(file_path), root_path)
+    return "/".join(segment for segment in directory.split("/")
+                    if "=" in segment)
+
+
+def list_partitions(spark, path):
+    """
+    List the partitions of a dataset with the fingerprint of their files.
+
+    Returns:
+        A dict of partition key -> files fingerprint
+    """
+    partition_files = {}
+    root_path = get_file_path(spark, path)
+    for file_status in list_input_files(spark, path):
+        partition_files.setdefault(get_partition_key(
+            get_file_path(spark, file_status[0]), root_path),
+            []).append(file_status)
+    return {key: get_files_fingerprint(files)
+            for key, files in partition_files.items()}
+
+
+class MetricStateStore(object):
+    """
+    Local JSON store of the per-partition partial aggregates of a suite.
+
+    The state is only reused when it was computed with the same set of
+    metrics, i.e. when the compiled suite did not change.
+    """
+
+    def __init__(self, state_store_dir, dataset_path, state_key):
+        key = hashlib.sha1("{}|{}".format(
+            dataset_path, state_key).encode()).hexdigest()
+        self.path = os.path.join(state_store_dir, key + ".json")
+
+    def load(self, registry):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f_state:
+            state = json.load(f_state)
+        if state.get("metrics") != sorted(registry.aggregates):
+            return {}
+        return state["partitions"]
+
+    def save(self, registry, partitions):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f_state:
+            json.dump({"metrics": sorted(registry.aggregates),
+                       "partitions": partitions}, f_state, indent=2)
+
+
+def compute_partition_metrics(spark, dataset_path, input_format, partitions,
+                              registry, schema=None, columns=None,
+                              row_filter=None):
+    """
+    Compute the partial aggregates of the given partitions with one scan of
+    their files only.
+
+    Returns:
+        A dict of partition key -> metrics
+    """
+    partition_paths = [
+        os.path.join(dataset_path, key) if key else dataset_path
+        for key in partitions
+    ]
+    df = read_dataset(
+        spark=spark,
+        path=partition_paths,
+        input_format=input_format,
+        columns=columns,
+        schema=schema,
+        row_filter=row_filter,
+        options={"basePath": dataset_path}
+    )
+    df = df.withColumn(FILE_COLUMN, f.input_file_name())
+
+    partition_metrics = {}
+    root_path = get_file_path(spark, dataset_path)
+    for (file_path,), metrics in compute_metrics(df, registry,
+                                                 group_by=[FILE_COLUMN]):
+        partition_key = get_partition_key(
+            get_file_path(spark, file_path, uri_encoded=True), root_path)
+        partition_metrics.setdefault(partition_key, []).append(
+            {name: _to_state_value(value) for name, value in metrics.items()})
+    return {key: merge_metrics(registry, metrics_list)
+            for key, metrics_list in partition_metrics.items()}
+
+
+def get_incremental_metrics(spark, registry, dataset_path, input_format,
+                            state_store_dir, state_key, schema=None,
+                            columns=None, row_filter=None, logger=None):
+    """
+    Compute the suite metrics of a partitioned dataset scanning only its new
+    or changed partitions.
+
+    The partial aggregates (element, domain and unexpected counts, min, max,
+    sums) of every partition are kept in a local state store and merged, so
+    that the metrics, and therefore the suite-level `success` and `mostly`
+    results, are the same a full rescan would give.
+
+    Args:
+        spark (SparkSession): The Spark session
+        registry (MetricRegistry): The metrics of the compiled suite
+        dataset_path (str): The root path of the partitioned dataset
+        input_format (str): The dataset format
+        state_store_dir (str): The directory of the metric state store
+        state_key (str): Identifies the state of a dataset/suite pair
+        schema (StructType or None): The read schema, for text formats
+        columns (list or None): The columns referenced by the suite
+        row_filter (str or None): A SQL predicate to filter rows with
+        logger (Logger or None): The logger
+
+    Returns:
+        The merged metrics of the whole dataset
+    """
+    store = MetricStateStore(state_store_dir, dataset_path, state_key)
+    state = store.load(registry)
+    partitions = list_partitions(spark, dataset_path)
+    changed = [key for key, fingerprint in partitions.items()
+               if state.get(key, {}).get("fingerprint") != fingerprint]
+    if logger is not None:
+        logger.info("Incremental validation: {} partitions, {} new or "
+                    "changed".format(len(partitions), len(changed)))
+
+    if changed and registry.aggregates:
+        computed = compute_partition_metrics(
+            spark, dataset_path, input_format, changed, registry,
+            schema=schema, columns=columns, row_filter=row_filter)
+        unknown = set(computed) - set(changed)
+        if unknown:
+            raise ValueError("Metrics computed for unlisted partitions: {}"
+                             .format(", ".join(sorted(unknown))))
+        for key in changed:
+            state[key] = {
+                "fingerprint": partitions[key],
+                # a partition with no rows, e.g. only zero-row files or all
+                # its rows filtered out, has no group
+                "metrics": computed.get(key, merge_metrics(registry, [])),
+            }
+    # partitions deleted since the last run do not count anymore
+    state = {key: value for key, value in state.items() if key in partitions}
+    store.save(registry, state)
+
+    return merge_metrics(registry,
+                         [value["metrics"] for value in state.values()])
@@ -0,0 +1,248 @@
+import os
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from suite_compiler import get_expectation_id
+
+# name -> help text of the run metrics, all gauges
+RUN_METRICS = (
+    ("dq_validation_duration_seconds",
+     "Total duration of the validation run, read included"),
+    ("dq_validation_read_duration_seconds",
+     "Seconds spent reading and materializing the batch"),
+    ("dq_validation_rows",
+     "Number of rows validated"),
+    ("dq_validation_rows_per_second",
+     "Rows validated per second of the whole run"),
+    ("dq_validation_success",
+     "1 when every expectation of the suite succeeded, 0 otherwise"),
+    ("dq_validation_timestamp_seconds",
+     "Unix time at which the validation run ended"),
+)
+
+EXPECTATION_METRICS = (
+    ("dq_expectation_success",
+     "1 when the expectation succeeded, 0 otherwise"),
+    ("dq_expectation_unexpected_percent",
+     "Percentage of unexpected values among the non-null ones"),
+    ("dq_expectation_duration_seconds",
+     "Spark stage time of the job group the expectation was validated in, "
+     "its own or, with shared=true, the one it shares with others"),
+)
+
+JOB_GROUP_METRICS = (
+    ("dq_job_group_duration_seconds",
+     "Spark stage time of the validation job group"),
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"") \
+        .replace("\n", "\\n")
+
+
+def _sample(name, labels, value):
+    if isinstance(value, bool):
+        value = int(value)
+    return "{}{{{}}} {}".format(name, ",".join(
+        '{}="{}"'.format(label, _escape(label_value))
+        for label, label_value in labels.items()), value)
+
+
+class RunMetrics(object):
+    """
+    The timings of a validation run, exported with its result as OpenMetrics
+    gauges.
+
+    Usage:
+        run_metrics = RunMetrics(dataset_name, suite_name, batch_id)
+        ... read the batch ...
+        run_metrics.read_done(rows=batch.row_count)
+        ... validate ...
+        text = run_metrics.to_openmetrics(validation_result, groups)
+
+    Attributes:
+        read_seconds (float or None): Seconds from the start of the run to
+            the batch being read
+        rows (int or None): Rows of the batch, when known without a scan
+    """
+
+    def __init__(self, dataset_name, suite_name, batch_id=None):
+        self.dataset_name = dataset_name
+        self.suite_name = suite_name
+        self.batch_id = batch_id
+        self.start = time.time()
+        self.read_seconds = None
+        self.rows = None
+
+    def read_done(self, rows=None):
+        self.read_seconds = time.time() - self.start
+        self.rows = rows
+
+    @staticmethod
+    def get_validated_rows(validation_result):
+        """The rows of the batch as counted by the column expectations."""
+        counts = [result.result.get("element_count")
+                  for result in validation_result.results
+                  if result.result]
+        counts = [count for count in counts if count is not None]
+        return max(counts) if counts else None
+
+    def to_openmetrics(self, validation_result, groups=None,
+                       shared_groups=None):
+        """
+        Render the run as an OpenMetrics text exposition.
+
+        The expectations are labelled with their batch_id-free
+        `get_expectation_id()`, the same for every batch.
+
+        Args:
+            validation_result (ExpectationSuiteValidationResult): The result
+                of the run
+            groups (dict or None): The job group -> stage metrics of a
+                `SparkProfiler`, giving the durations of the job groups
+            shared_groups (dict or None): The expectation id -> job group
+                the expectation shares with others, e.g. the fused scan, for
+                the expectations not validated in their own job group
+
+        Returns:
+            The exposition text, ending with `# EOF`
+        """
+        duration = time.time() - self.start
+        rows = self.rows if self.rows is not None \
+            else self.get_validated_rows(validation_result)
+        labels = {
+            "dataset": self.dataset_name,
+            "suite": self.suite_name,
+            "execution_mode":
+                validation_result.meta.get("execution_mode") or "checkpoint",
+        }
+        if self.batch_id is not None:
+            labels["batch"] = self.batch_id
+        run_values = {
+            "dq_validation_duration_seconds": duration,
+            "dq_validation_read_duration_seconds": self.read_seconds,
+            "dq_validation_rows": rows,
+            "dq_validation_rows_per_second":
+                rows / duration if rows is not None and duration else None,
+            "dq_validation_success": validation_result.success,
+            "dq_validation_timestamp_seconds": time.time(),
+        }
+        samples = {name: [] for name, _ in RUN_METRICS + EXPECTATION_METRICS +
+                   JOB_GROUP_METRICS}
+        for name, value in run_values.items():
+            if value is not None:
+                samples[name].append(_sample(name, labels, value))
+
+        groups = groups or {}
+        for result in validation_result.results:
+            expectation_id = get_expectation_id(result.expectation_config)
+            expectation_labels = dict(labels, expectation=expectation_id)
+            samples["dq_expectation_success"].append(_sample(
+                "dq_expectation_success", expectation_labels,
+                bool(result.success)))
+            unexpected_percent = (result.result or {}).get(
+                "unexpected_percent")
+            if unexpected_percent is not None:
+                samples["dq_expectation_unexpected_percent"].append(_sample(
+                    "dq_expectation_unexpected_percent", expectation_labels,
+                    unexpected_percent))
+            group_id = expectation_id if expectation_id in groups \
+                else (shared_groups or {}).get(expectation_id)
+            if group_id in groups:
+                samples["dq_expectation_duration_seconds"].append(_sample(
+                    "dq_expectation_duration_seconds",
+                    dict(expectation_labels,
+                         shared=str(group_id != expectation_id).lower()),
+                    groups[group_id]["stage_time_ms"] / 1000.0))
+        for group_id, metrics in groups.items():
+            samples["dq_job_group_duration_seconds"].append(_sample(
+                "dq_job_group_duration_seconds",
+                dict(labels, job_group=group_id or "none"),
+                metrics["stage_time_ms"] / 1000.0))
+
+        lines = []
+        for name, help_text in RUN_METRICS + EXPECTATION_METRICS + \
+                JOB_GROUP_METRICS:
+            if samples[name]:
+                lines.append("# TYPE {} gauge".format(name))
+                lines.append("# HELP {} {}".format(name, help_text))
+                lines.extend(samples[name])
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def write_textfile(metrics_dir, dataset_name, suite_name, text,
+                   batch_id=None):
+    """
+    Write the exposition to `<metrics_dir>/<dataset>.<suite>.prom`, or
+    `<dataset>.<suite>.<batch_id>.prom` for a batch validated concurrently
+    with others, for the node_exporter textfile collector; the file is
+    replaced atomically so that a scrape never reads it half written.
+
+    Returns:
+        The file path
+    """
+    os.makedirs(metrics_dir, exist_ok=True)
+    name = ".".join(part for part in (dataset_name, suite_name, batch_id)
+                    if part is not None)
+    path = os.path.join(metrics_dir,
+                        "{}.prom".format(name).replace(os.sep, "_"))
+    # unique per writer, the threads of a process included
+    temporary_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+    with open(temporary_path, "w") as f:
+        f.write(text)
+    os.replace(temporary_path, path)
+    return path
+
+
+def push_to_gateway(pushgateway_url, dataset_name, suite_name, text,
+                    batch_id=None, timeout=10):
+    """
+    PUT the exposition to a Prometheus Pushgateway, replacing the metrics of
+    the `dq_validation` job grouped by dataset and suite, and by batch when
+    given.
+
+    Returns:
+        The URL the metrics were pushed to
+    """
+    url = "{}/metrics/job/dq_validation/dataset/{}/suite/{}".format(
+        pushgateway_url.rstrip("/"),
+        urllib.parse.quote(dataset_name, safe=""),
+        urllib.parse.quote(suite_name, safe=""))
+    if batch_id is not None:
+        url += "/batch/{}".format(urllib.parse.quote(batch_id, safe=""))
+    request = urllib.request.Request(
+        url, data=text.encode("utf-8"), method="PUT",
+        headers={"Content-Type": "text/plain; version=0.0.4"})
+    with urllib.request.urlopen(request, timeout=timeout):
+        pass
+    return url
+
+
+def export_run_metrics(run_metrics, validation_result, options, logger,
+                       groups=None, shared_groups=None):
+    """
+    Write the OpenMetrics textfile of a run under `--metrics_dir` and push it
+    to `--pushgateway_url`; an unreachable Pushgateway is logged, it does not
+    fail the validation.
+    """
+    if not options.metrics_dir and not options.pushgateway_url:
+        return
+    text = run_metrics.to_openmetrics(validation_result, groups,
+                                      shared_groups)
+    if options.metrics_dir:
+        logger.info('Metrics written to {}'.format(write_textfile(
+            options.metrics_dir, run_metrics.dataset_name,
+            run_metrics.suite_name, text, run_metrics.batch_id)))
+    if options.pushgateway_url:
+        try:
+            logger.info('Metrics pushed to {}'.format(push_to_gateway(
+                options.pushgateway_url, run_metrics.dataset_name,
+                run_metrics.suite_name, text, run_metrics.batch_id)))
+        except (urllib.error.URLError, OSError) as e:
+            logger.error('Metrics push to {} failed: {}'
+                         .format(options.pushgateway_url, e))
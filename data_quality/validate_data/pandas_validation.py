@@ -0,0 +1,263 @@
+import datetime
+import glob
+import os
+import re
+
+import pandas as pd
+from pyspark.sql import types as sparktypes
+
+from great_expectations.core.batch import RuntimeBatchRequest
+
+import custom_expectations
+from dataset_reader import get_suite_columns, get_suite_schema
+from metrics_export import RunMetrics, export_run_metrics
+from suite_compiler import SCHEMA_EXPECTATIONS, SchemaCheck, sort_results
+from validation_results import build_suite_validation_result, \
+    store_validation_result
+
+PANDAS_FORMATS = ("csv", "json")
+
+# Nullable pandas dtypes of the Spark numeric types
+PANDAS_DTYPES = {
+    sparktypes.ByteType: "Int8",
+    sparktypes.ShortType: "Int16",
+    sparktypes.IntegerType: "Int32",
+    sparktypes.LongType: "Int64",
+    sparktypes.FloatType: "float32",
+    sparktypes.DoubleType: "float64",
+}
+
+# Range of the Spark integral types: Spark reads the values out of it as
+# nulls
+INTEGRAL_RANGES = {
+    sparktypes.ByteType: (-2 ** 7, 2 ** 7 - 1),
+    sparktypes.ShortType: (-2 ** 15, 2 ** 15 - 1),
+    sparktypes.IntegerType: (-2 ** 31, 2 ** 31 - 1),
+    sparktypes.LongType: (-2 ** 63, 2 ** 63 - 1),
+}
+
+# The integer literals Spark parses into an integral type: no decimal
+# point, exponent or surrounding spaces
+INTEGER_LITERAL = re.compile(r"[+-]?[0-9]+")
+
+
+def list_local_files(path):
+    """
+    List the data files of a dataset on the local filesystem, skipping hidden
+    and metadata files as Spark does.
+
+    Returns:
+        The sorted list of file paths, or None when the dataset is not local
+        or is partitioned (its partition columns are not in the files)
+    """
+    if path.startswith("file://"):
+        path = path[len("file://"):]
+    elif "://" in path:
+        return None
+    files = []
+    for match in glob.glob(path):
+        if not os.path.isdir(match):
+            files.append(match)
+            continue
+        for root, _, names in os.walk(match):
+            if "=" in os.path.relpath(root, match):
+                return None
+            files.extend(os.path.join(root, name) for name in names
+                         if not name.startswith(("_", ".")))
+    return sorted(files)
+
+
+def get_small_dataset_files(path, input_format, threshold_bytes):
+    """
+    Return the files of a dataset small enough to be validated with pandas,
+    without starting Spark.
+
+    Returns:
+        The list of file paths, or None when the dataset is larger than
+        `threshold_bytes`, is not local or has a format pandas does not read
+        as Spark does
+    """
+    if input_format not in PANDAS_FORMATS:
+        return None
+    files = list_local_files(path)
+    if not files or \
+            sum(os.path.getsize(file) for file in files) > threshold_bytes:
+        return None
+    return files
+
+
+def _read_csv(file):
+    # every value is read as a string and converted after the read schema,
+    # `*` and empty values being nulls as in the Spark CSV reader
+    return pd.read_csv(file, sep=",", dtype=str, keep_default_na=False,
+                       na_values=["*", ""])
+
+
+def _read_json(file):
+    return pd.read_json(file, lines=True, dtype=False)
+
+
+PANDAS_READERS = {
+    "csv": _read_csv,
+    "json": _read_json,
+}
+
+
+def get_pandas_read_schema(files, input_format, expectation_suite):
+    """
+    Build the Spark read schema of a dataset from the suite type
+    expectations, as `dataset_reader.get_read_schema()` does without Spark.
+
+    Returns:
+        A StructType, or None when the suite does not declare every type
+    """
+    if input_format == "csv":
+        file_columns = list(pd.read_csv(files[0], nrows=0).columns)
+    else:
+        file_columns = get_suite_columns(expectation_suite)
+    if file_columns is None:
+        return None
+    return get_suite_schema(expectation_suite, file_columns)
+
+
+def to_spark_type(series, data_type):
+    """
+    Convert a column to the pandas equivalent of a Spark type, the values
+    that do not parse becoming nulls as in the Spark PERMISSIVE mode.
+    """
+    if isinstance(data_type, sparktypes.StringType):
+        return series.where(series.isnull(), series.astype(str))
+    if isinstance(data_type, sparktypes.BooleanType):
+        values = series.astype(str).str.lower()
+        return values.map({"true": True, "false": False}) \
+            .where(series.notnull()).astype("boolean")
+    if isinstance(data_type, (sparktypes.DateType, sparktypes.TimestampType)):
+        return pd.to_datetime(series, errors="coerce")
+    if isinstance(data_type, sparktypes.IntegralType):
+        low, high = INTEGRAL_RANGES[type(data_type)]
+
+        def parse_integer(value):
+            # the JSON reader gives numbers, their string form is parsed
+            if not isinstance(value, str):
+                value = str(value)
+            if not INTEGER_LITERAL.fullmatch(value):
+                return None
+            number = int(value)
+            return number if low <= number <= high else None
+
+        return series.map(parse_integer, na_action="ignore") \
+            .astype(PANDAS_DTYPES[type(data_type)])
+    numbers = pd.to_numeric(series, errors="coerce")
+    return numbers.astype(PANDAS_DTYPES.get(type(data_type), "float64"))
+
+
+def read_pandas_dataset(files, input_format, schema, columns=None):
+    """
+    Read a small dataset into a pandas DataFrame typed after a Spark read
+    schema, keeping only the columns a suite needs.
+    """
+    frames = [PANDAS_READERS[input_format](file) for file in files]
+    df = pd.concat(frames, ignore_index=True)
+    for field in schema.fields:
+        if field.name in df.columns:
+            df[field.name] = to_spark_type(df[field.name], field.dataType)
+    if columns is not None:
+        df = df[[column for column in columns if column in df.columns]]
+    return df
+
+
+def validate_pandas_batch(context, df, schema, expectation_suite_name,
+                          batch_id):
+    """
+    Validate a pandas DataFrame against a suite through the pandas execution
+    engine; the schema expectations are answered from the Spark read schema
+    the DataFrame was read with, since their Spark type names mean nothing
+    to pandas.
+
+    Returns:
+        A (Validator, list of ExpectationValidationResult) tuple, the results
+        in the order of the suite expectations
+    """
+    validator = context.get_validator(
+        batch_request=RuntimeBatchRequest(
+            datasource_name="filesystem_datasource",
+            data_connector_name="runtime_data_connector",
+            data_asset_name="data_asset_name",
+            batch_identifiers={"batch_id": batch_id},
+            runtime_parameters={"batch_data": df},
+        ),
+        expectation_suite_name=expectation_suite_name
+    )
+    expectations = validator.expectation_suite.expectations
+    read_schema = sparktypes.StructType([field for field in schema.fields
+                                         if field.name in df.columns])
+    results = [SchemaCheck(configuration, read_schema).evaluate()
+               for configuration in expectations
+               if configuration.expectation_type in SCHEMA_EXPECTATIONS]
+    results.extend(validator.graph_validate(configurations=[
+        configuration for configuration in expectations
+        if configuration.expectation_type not in SCHEMA_EXPECTATIONS]))
+    return validator, sort_results(results, expectations)
+
+
+def validate_dataset_pandas(context, options, files, logger,
+                            batch_id="something_something"):
+    """
+    Validate a small dataset with the pandas execution engine, so that the
+    JVM is never started.
+
+    The dataset is read with the Spark read schema built from the suite type
+    expectations, which also answers the schema expectations (see
+    `SchemaCheck`): the results are the same as those of the Spark run.
+
+    Args:
+        context (BaseDataContext): A Data Context whose datasource has a
+            PandasExecutionEngine (see `get_data_context()`)
+        options (Namespace): The validation options
+        files (list): The dataset files (see `get_small_dataset_files()`)
+        logger (Logger): The logger
+        batch_id (str): The batch identifier
+
+    Returns:
+        The validation success flag, or None when the suite does not declare
+        the type of every column it references, the dataset being then left
+        to Spark
+    """
+    run_metrics = RunMetrics(options.dataset_name, options.suite_name)
+    expectation_suite = options.dataset_name + "." + options.suite_name
+    expectation_suite_json = context.get_expectation_suite(
+        expectation_suite).to_json_dict()
+    schema = get_pandas_read_schema(files, options.input_format,
+                                    expectation_suite_json)
+    if schema is None:
+        return None
+    logger.info('Custom Expectations registered: {}'.format(
+        ", ".join(custom_expectations.register_suite_expectations(
+            expectation_suite_json)) or "none"))
+
+    logger.info('Reading {} files with pandas...'.format(len(files)))
+    df = read_pandas_dataset(files, options.input_format, schema,
+                             get_suite_columns(expectation_suite_json))
+    logger.info('Dataset successfully read: {} rows'.format(len(df)))
+    run_metrics.read_done(rows=len(df))
+
+    validator, results = validate_pandas_batch(
+        context, df, schema, expectation_suite, batch_id)
+
+    validation_result = build_suite_validation_result(
+        expectation_suite_name=expectation_suite,
+        results=results,
+        run_id={
+            "run_name": options.dataset_name + "_" + options.suite_name +
+            "_run",
+            "run_time": datetime.datetime.now(datetime.timezone.utc)
+        },
+        validator=validator,
+        meta={"execution_mode": "pandas"}
+    )
+    store_validation_result(context, validation_result,
+                            batch_identifier=validator.active_batch_id)
+    logger.info('Pandas validation completed, success: {}'
+                .format(validation_result.success))
+    export_run_metrics(run_metrics, validation_result, options, logger)
+    return validation_result.success
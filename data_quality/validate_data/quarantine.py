@@ -0,0 +1,158 @@
+import os
+import threading
+import uuid
+
+import pyspark.sql.functions as f
+from pyspark.java_gateway import ensure_callback_server_started
+from py4j.java_gateway import JavaObject
+from pyspark.sql import DataFrame
+
+from suite_compiler import get_expectation_id, merge_metrics
+
+FAILED_EXPECTATIONS_COLUMN = "dq_failed_expectations"
+STATUS_COLUMN = "dq_status"
+
+
+def tag_failed_rows(df, compiled):
+    """
+    Add to every row the ids (`get_expectation_id()`) of the compiled map
+    expectations it fails, as an array column, and its `failed` or `passed`
+    status.
+
+    The conditions are those of the fused plan, the custom expectation
+    partials included, so they are evaluated in the same scan as the rows.
+    """
+    failed = f.array(*[
+        f.when(check.failing, f.lit(get_expectation_id(check.configuration)))
+        for check in compiled.map_checks()
+    ]) if compiled.map_checks() else f.array().cast("array<string>")
+    failed = f.filter(failed, lambda expectation_id:
+                      expectation_id.isNotNull())
+    return df \
+        .withColumn(FAILED_EXPECTATIONS_COLUMN, failed) \
+        .withColumn(STATUS_COLUMN, f.when(f.size(failed) > 0, "failed")
+                    .otherwise("passed"))
+
+
+def _to_python(value):
+    # decimals, dates and timestamps reach Python as JVM objects
+    if isinstance(value, JavaObject):
+        return value.toString()
+    return value
+
+
+class ObservedMetricsListener(object):
+    """
+    A QueryExecutionListener, called back by the JVM through py4j, keeping
+    the observed metrics of the last successful query.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.metrics = None
+        self._lock = threading.Lock()
+
+    def onSuccess(self, function_name, query_execution, duration):
+        observed = query_execution.observedMetrics().get(self.name)
+        if observed.isDefined():
+            row = observed.get()
+            field_names = row.schema().fieldNames()
+            with self._lock:
+                self.metrics = {
+                    name: _to_python(row.get(position))
+                    for position, name in enumerate(field_names)}
+
+    def onFailure(self, function_name, query_execution, exception):
+        pass
+
+    class Java:
+        implements = ["org.apache.spark.sql.util.QueryExecutionListener"]
+
+
+def _observe(df, name, columns):
+    # Dataset.observe() is not exposed to Python before Spark 3.3
+    jvm = df.sql_ctx._sc._jvm
+    jdf = df._jdf.observe(name, columns[0]._jc, jvm.PythonUtils.toSeq(
+        [column._jc for column in columns[1:]]))
+    return DataFrame(jdf, df.sql_ctx)
+
+
+def _get_file_system(spark, path):
+    return path.getFileSystem(spark.sparkContext._jsc.hadoopConfiguration())
+
+
+def _delete_path(spark, path):
+    hadoop_path = spark.sparkContext._jvm.org.apache.hadoop.fs.Path(path)
+    _get_file_system(spark, hadoop_path).delete(hadoop_path, True)
+
+
+def _move_partition(spark, source, destination):
+    jvm = spark.sparkContext._jvm
+    source_path = jvm.org.apache.hadoop.fs.Path(source)
+    destination_path = jvm.org.apache.hadoop.fs.Path(destination)
+    fs = _get_file_system(spark, source_path)
+    if not fs.exists(source_path):
+        return False
+    fs.mkdirs(destination_path.getParent())
+    fs.delete(destination_path, True)
+    return fs.rename(source_path, destination_path)
+
+
+def write_quarantine(spark, df, compiled, quarantine_path, clean_path=None):
+    """
+    Write the rows failing the compiled map expectations to a Parquet
+    quarantine directory, and optionally the clean ones to another, while
+    computing the suite metrics in the same scan.
+
+    The tagged rows are written once, partitioned by status, and the status
+    partitions are then renamed to their destinations; the metrics of the
+    compiled suite are observed on the rows during the write.
+
+    Args:
+        spark (SparkSession): The Spark session
+        df (DataFrame): The batch
+        compiled (CompiledSuite): The compiled suite
+        quarantine_path (str): Where the failing rows are written
+        clean_path (str or None): Where the clean rows are written, None to
+            drop them
+
+    Returns:
+        The compiled suite metrics
+
+    Raises:
+        RuntimeError: if the observed metrics were not received
+    """
+    name = "dq_metrics_" + uuid.uuid4().hex
+    tagged = tag_failed_rows(df, compiled)
+    aggregates = compiled.registry.aggregate_columns()
+    if aggregates:
+        tagged = _observe(tagged, name, aggregates)
+    if clean_path is None:
+        tagged = tagged.where(f.col(STATUS_COLUMN) == "failed")
+
+    listener = ObservedMetricsListener(name)
+    ensure_callback_server_started(spark.sparkContext._gateway)
+    listener_manager = spark._jsparkSession.listenerManager()
+    listener_manager.register(listener)
+    staging_path = os.path.join(os.path.dirname(quarantine_path.rstrip("/")),
+                                "_staging_" + uuid.uuid4().hex)
+    try:
+        tagged.write.mode("overwrite").partitionBy(STATUS_COLUMN) \
+            .parquet(staging_path)
+        # the query execution listeners are called back asynchronously
+        spark.sparkContext._jsc.sc().listenerBus().waitUntilEmpty()
+    finally:
+        listener_manager.unregister(listener)
+
+    _move_partition(spark, os.path.join(
+        staging_path, STATUS_COLUMN + "=failed"), quarantine_path)
+    if clean_path is not None:
+        _move_partition(spark, os.path.join(
+            staging_path, STATUS_COLUMN + "=passed"), clean_path)
+    _delete_path(spark, staging_path)
+
+    if listener.metrics is None and aggregates:
+        # zero metrics would make every expectation pass
+        raise RuntimeError("The suite metrics observed during the quarantine "
+                           "write were not received")
+    return merge_metrics(compiled.registry, [listener.metrics or {}])
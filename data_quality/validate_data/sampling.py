@@ -0,0 +1,243 @@
+import math
+import operator
+from statistics import NormalDist
+
+import pyspark.sql.functions as f
+
+from suite_compiler import AggregateCheck, MapCheck, SchemaCheck, \
+    merge_metrics
+
+SAMPLE_METHODS = ("fraction", "reservoir", "stratified")
+
+STRATUM_COLUMN = "_dq_stratum"
+NULL_STRATUM = "__null__"
+
+# Expectations whose sample value bounds the population one: a sample minimum
+# below `min_value` (or maximum above `max_value`) is a certain failure.
+BOUNDED_AGGREGATES = {
+    "expect_column_min_to_be_between": ("min_value", "strict_min",
+                                        operator.lt, operator.le),
+    "expect_column_max_to_be_between": ("max_value", "strict_max",
+                                        operator.gt, operator.ge),
+}
+
+
+def get_stratum(column):
+    """The stratum of a row: the column value as a string, nulls included."""
+    return f.coalesce(f.col(column).cast("string"), f.lit(NULL_STRATUM))
+
+
+def draw_sample(df, method, fraction=0.01, size=10000, stratify_column=None,
+                min_stratum_size=100, seed=None):
+    """
+    Draw a sample of the batch.
+
+    Args:
+        df (DataFrame): The batch
+        method (str): `fraction` (Bernoulli sampling), `reservoir` (a uniform
+            sample of exactly `size` rows) or `stratified` (`fraction` of
+            every value of `stratify_column`, at least `min_stratum_size`
+            rows per value)
+        fraction (float): The sampling fraction
+        size (int): The reservoir size
+        stratify_column (str or None): The column to stratify by
+        min_stratum_size (int): The minimum sample rows of small strata
+        seed (int or None): The random seed
+
+    Returns:
+        A (sample, strata) tuple, strata being a dict of stratum -> rows in
+        the batch for the stratified method, None otherwise
+    """
+    if method == "fraction":
+        return df.sample(withReplacement=False, fraction=fraction,
+                         seed=seed), None
+    if method == "reservoir":
+        # ordering by a random key and limiting is planned as a per-partition
+        # top-k followed by a merge of the partial reservoirs, not as a sort
+        return df.orderBy(f.rand(seed)).limit(size), None
+    if method == "stratified":
+        if stratify_column is None:
+            raise ValueError("The stratified sample needs a stratify column")
+        stratum = get_stratum(stratify_column)
+        strata = {row[0]: row[1]
+                  for row in df.groupBy(stratum).count().collect()}
+        fractions = {
+            value: min(1.0, max(fraction, min_stratum_size / float(count)))
+            for value, count in strata.items()
+        }
+        return df.sampleBy(stratum, fractions=fractions, seed=seed), strata
+    raise ValueError("Unknown sample method '{}'".format(method))
+
+
+def wilson_interval(unexpected_count, count, z):
+    """Wilson score interval of a proportion."""
+    if count == 0:
+        return 0.0, 1.0
+    p = unexpected_count / float(count)
+    denominator = 1 + z ** 2 / count
+    center = (p + z ** 2 / (2 * count)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / count +
+                               z ** 2 / (4 * count ** 2)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def estimate_unexpected_rate(strata_counts, z):
+    """
+    Estimate the unexpected rate of the population from per-stratum sample
+    counts.
+
+    Args:
+        strata_counts (list): (weight, unexpected count, considered count)
+            tuples, the weight being the stratum share of the population
+        z (float): The normal quantile of the confidence level
+
+    Returns:
+        A (rate, lower, upper) tuple. A single stratum gets a Wilson interval,
+        several strata a normal interval on the weighted estimate.
+    """
+    strata_counts = [(weight, unexpected, count)
+                     for weight, unexpected, count in strata_counts
+                     if count > 0 and weight > 0]
+    if not strata_counts:
+        return None, 0.0, 1.0
+    if len(strata_counts) == 1:
+        _, unexpected, count = strata_counts[0]
+        lower, upper = wilson_interval(unexpected, count, z)
+        return unexpected / float(count), lower, upper
+
+    total_weight = float(sum(weight for weight, _, _ in strata_counts))
+    rate = 0.0
+    variance = 0.0
+    for weight, unexpected, count in strata_counts:
+        share = weight / total_weight
+        stratum_rate = unexpected / float(count)
+        rate += share * stratum_rate
+        variance += share ** 2 * stratum_rate * (1 - stratum_rate) / count
+    half_width = z * math.sqrt(variance)
+    return rate, max(0.0, rate - half_width), min(1.0, rate + half_width)
+
+
+def classify(unexpected_count, lower, upper, mostly):
+    """
+    Compare the unexpected rate interval with the `mostly` threshold.
+
+    Returns:
+        `pass` when the whole interval is within the threshold, `fail` when
+        it is entirely beyond it, `inconclusive` otherwise
+    """
+    threshold = 1 - mostly
+    if threshold <= 0 and unexpected_count:
+        # one unexpected value is enough to fail an expectation without mostly
+        return "fail"
+    if lower > threshold:
+        return "fail"
+    if upper <= threshold:
+        return "pass"
+    return "inconclusive"
+
+
+def _map_estimate(check, metrics_by_stratum, strata, z):
+    counts = {stratum: check.counts(metrics)
+              for stratum, metrics in metrics_by_stratum.items()}
+    strata_counts = []
+    for stratum, (element, _, considered, unexpected) in counts.items():
+        population = 1 if strata is None else strata.get(stratum, 0)
+        # the stratum share of the considered rows (e.g. non null values)
+        weight = population * considered / float(element) if element else 0
+        strata_counts.append((weight, unexpected, considered))
+    rate, lower, upper = estimate_unexpected_rate(strata_counts, z)
+    unexpected_count = sum(c[3] for c in counts.values())
+    return {
+        "sample_unexpected_count": unexpected_count,
+        "sample_considered_count": sum(c[2] for c in counts.values()),
+        "unexpected_percent": None if rate is None else rate * 100,
+        "unexpected_percent_lower": lower * 100,
+        "unexpected_percent_upper": upper * 100,
+        "status": classify(unexpected_count, lower, upper, check.mostly),
+    }
+
+
+def _aggregate_status(configuration, result):
+    if configuration.expectation_type not in BOUNDED_AGGREGATES:
+        return "inconclusive"
+    bound_kwarg, strict_kwarg, beyond, strictly_beyond = \
+        BOUNDED_AGGREGATES[configuration.expectation_type]
+    kwargs = configuration.get_success_kwargs()
+    bound = kwargs.get(bound_kwarg)
+    observed = result.result.get("observed_value")
+    if bound is None or observed is None:
+        return "inconclusive"
+    # a strict bound is already violated when reached
+    compare = strictly_beyond if kwargs.get(strict_kwarg) else beyond
+    return "fail" if compare(observed, bound) else "inconclusive"
+
+
+def _result_estimate(result, z):
+    # residual map expectations validated by Great Expectations on the sample
+    counts = result.result
+    if "unexpected_count" not in counts or "element_count" not in counts:
+        return {"status": "inconclusive"}
+    considered = counts["element_count"] - (counts.get("missing_count") or 0)
+    mostly = result.expectation_config.get_success_kwargs().get("mostly")
+    rate, lower, upper = estimate_unexpected_rate(
+        [(1, counts["unexpected_count"], considered)], z)
+    return {
+        "sample_unexpected_count": counts["unexpected_count"],
+        "sample_considered_count": considered,
+        "unexpected_percent": None if rate is None else rate * 100,
+        "unexpected_percent_lower": lower * 100,
+        "unexpected_percent_upper": upper * 100,
+        "status": classify(counts["unexpected_count"], lower, upper,
+                           1 if mostly is None else mostly),
+    }
+
+
+def estimate_suite(compiled, metrics_by_stratum, strata, residual_results,
+                   confidence_level=0.95):
+    """
+    Estimate the outcome of every expectation of a suite on the population
+    from its results on a sample.
+
+    Args:
+        compiled (CompiledSuite): The suite compiled against the sample
+        metrics_by_stratum (dict): Stratum -> compiled metrics of the sample,
+            a single entry for unstratified samples
+        strata (dict or None): Stratum -> rows of the population
+        residual_results (list): The Great Expectations results of the
+            expectations the compiler does not support, on the sample
+        confidence_level (float): The confidence level of the intervals
+
+    Returns:
+        A list of dicts, one per expectation, with the unexpected percentage
+        of the sample, its confidence interval and a `pass`, `fail` or
+        `inconclusive` status against the `mostly` threshold
+    """
+    z = NormalDist().inv_cdf((1 + confidence_level) / 2)
+    metrics = merge_metrics(compiled.registry,
+                            list(metrics_by_stratum.values()))
+    report = []
+    for check in compiled.checks:
+        configuration = check.configuration
+        entry = {
+            "expectation_type": configuration.expectation_type,
+            "kwargs": configuration.kwargs,
+        }
+        if isinstance(check, MapCheck):
+            entry.update(_map_estimate(check, metrics_by_stratum, strata, z))
+        elif isinstance(check, SchemaCheck):
+            # the sample has the schema of the batch
+            entry["status"] = "pass" if check.evaluate(metrics).success \
+                else "fail"
+        elif isinstance(check, AggregateCheck):
+            entry["status"] = _aggregate_status(configuration,
+                                                check.evaluate(metrics))
+        report.append(entry)
+    for result in residual_results:
+        entry = {
+            "expectation_type": result.expectation_config.expectation_type,
+            "kwargs": result.expectation_config.kwargs,
+        }
+        entry.update(_result_estimate(result, z))
+        report.append(entry)
+    return report
+
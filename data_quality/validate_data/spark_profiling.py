@@ -0,0 +1,331 @@
+import datetime
+import json
+import os
+import threading
+import urllib.error
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.request import urlopen
+
+from pyspark.java_gateway import ensure_callback_server_started
+
+from suite_compiler import get_expectation_id
+
+STAGE_METRICS = (
+    "stage_time_ms",
+    "executor_run_time_ms",
+    "executor_cpu_time_ms",
+    "input_bytes",
+    "shuffle_read_bytes",
+    "shuffle_write_bytes",
+    "memory_bytes_spilled",
+    "disk_bytes_spilled",
+)
+
+
+# Local property holding the innermost `job_group()` id, which the
+# StageMetricsListener groups the stages by
+JOB_GROUP_PROPERTY = "dq.jobGroup.id"
+
+JOB_GROUP_PROPERTIES = (
+    "spark.jobGroup.id",
+    "spark.job.description",
+    "spark.job.interruptOnCancel",
+    JOB_GROUP_PROPERTY,
+)
+
+# Local property holding the token of the run a SparkProfiler profiles: its
+# StageMetricsListener keeps only the jobs tagged with it, not those of the
+# runs validated concurrently in the same session, e.g. the same suite on
+# another batch. The token is also a segment of the Spark job group of the
+# run, `[<outer>/]<token>[/<group>]`, which the REST API exposes.
+RUN_TOKEN_PROPERTY = "dq.run.token"
+
+# Format of the times of the Spark UI REST API, e.g.
+# 2022-10-01T10:00:00.123GMT
+REST_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%Z"
+
+
+@contextmanager
+def job_group(spark, group_id, description=None):
+    """
+    Tag the Spark jobs submitted inside the block with a job group.
+
+    A job group set by the caller (e.g. a benchmark harness) is kept as a
+    prefix, `<outer>/<group_id>`, so that the caller still finds its jobs,
+    and is restored on exit.
+    """
+    sc = spark.sparkContext
+    previous = {key: sc.getLocalProperty(key)
+                for key in JOB_GROUP_PROPERTIES}
+    outer = previous["spark.jobGroup.id"]
+    sc.setJobGroup(group_id if outer is None
+                   else "{}/{}".format(outer, group_id),
+                   description or group_id)
+    sc.setLocalProperty(JOB_GROUP_PROPERTY, group_id)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            sc.setLocalProperty(key, value)
+
+
+def validate_by_expectation(spark, validator, configurations):
+    """
+    Validate the expectations one at a time, each inside the job group named
+    after its `get_expectation_id()`, so that their Spark jobs can be told
+    apart.
+
+    Returns:
+        The list of ExpectationValidationResult
+    """
+    results = []
+    for configuration in configurations:
+        with job_group(spark, get_expectation_id(configuration)):
+            results.extend(validator.graph_validate(
+                configurations=[configuration]))
+    return results
+
+
+class StageMetricsListener(object):
+    """
+    A SparkListener, called back by the JVM through py4j, collecting the
+    metrics of the completed stages of the jobs tagged with a run token, by
+    job group.
+    """
+
+    def __init__(self, token):
+        self.token = token
+        self._lock = threading.Lock()
+        self._stage_groups = {}
+        self.groups = OrderedDict()
+
+    def __getattr__(self, name):
+        # every other SparkListenerInterface callback is a no-op
+        if name.startswith("on"):
+            return lambda *args: None
+        raise AttributeError(name)
+
+    def onJobStart(self, job_start):
+        properties = job_start.properties()
+        if properties is None or \
+                properties.getProperty(RUN_TOKEN_PROPERTY) != self.token:
+            return
+        group_id = properties.getProperty(JOB_GROUP_PROPERTY)
+        stage_ids = job_start.stageIds()
+        with self._lock:
+            for position in range(stage_ids.size()):
+                self._stage_groups[stage_ids.apply(position)] = group_id
+
+    def onStageCompleted(self, stage_completed):
+        info = stage_completed.stageInfo()
+        with self._lock:
+            if info.stageId() not in self._stage_groups:
+                # a stage of another run
+                return
+        task_metrics = info.taskMetrics()
+        metrics = dict.fromkeys(STAGE_METRICS, 0)
+        if info.submissionTime().isDefined() and \
+                info.completionTime().isDefined():
+            metrics["stage_time_ms"] = info.completionTime().get() - \
+                info.submissionTime().get()
+        if task_metrics is not None:
+            metrics.update({
+                "executor_run_time_ms": task_metrics.executorRunTime(),
+                "executor_cpu_time_ms":
+                    task_metrics.executorCpuTime() // 1000000,
+                "input_bytes": task_metrics.inputMetrics().bytesRead(),
+                "shuffle_read_bytes":
+                    task_metrics.shuffleReadMetrics().totalBytesRead(),
+                "shuffle_write_bytes":
+                    task_metrics.shuffleWriteMetrics().bytesWritten(),
+                "memory_bytes_spilled": task_metrics.memoryBytesSpilled(),
+                "disk_bytes_spilled": task_metrics.diskBytesSpilled(),
+            })
+        with self._lock:
+            group_id = self._stage_groups.pop(info.stageId())
+            group = self.groups.setdefault(
+                group_id, dict(dict.fromkeys(STAGE_METRICS, 0), stages=0))
+            group["stages"] += 1
+            for name in STAGE_METRICS:
+                group[name] += metrics[name]
+
+    class Java:
+        implements = ["org.apache.spark.scheduler.SparkListenerInterface"]
+
+
+def _parse_rest_time(value):
+    return datetime.datetime.strptime(value, REST_TIME_FORMAT)
+
+
+def read_rest_stage_metrics(spark, token, timeout=10):
+    """
+    Read the metrics of the completed stages of the jobs of a run from the
+    Spark UI REST API, by job group, instead of listening to the stages as
+    they complete.
+
+    The jobs of the run are those whose Spark job group has the run token
+    as a segment (see `SparkProfiler`), the job group being the rest of it.
+
+    Returns:
+        A dict of job group -> summed stage metrics, as
+        `StageMetricsListener.groups`, empty when the Spark UI is disabled
+        or unreachable
+    """
+    sc = spark.sparkContext
+    if sc.uiWebUrl is None:
+        return {}
+    base_url = "{}/api/v1/applications/{}".format(sc.uiWebUrl,
+                                                  sc.applicationId)
+    try:
+        with urlopen(base_url + "/jobs", timeout=timeout) as response:
+            jobs = json.loads(response.read().decode())
+        with urlopen(base_url + "/stages?status=complete",
+                     timeout=timeout) as response:
+            stages = json.loads(response.read().decode())
+    except (urllib.error.URLError, OSError, ValueError):
+        return {}
+
+    stage_groups = {}
+    for job in sorted(jobs, key=lambda job: job["jobId"]):
+        prefix, found, group_id = (job.get("jobGroup") or "") \
+            .partition(token)
+        if not found or (prefix and not prefix.endswith("/")) or \
+                (group_id and not group_id.startswith("/")):
+            continue
+        for stage_id in job["stageIds"]:
+            stage_groups.setdefault(stage_id, group_id[1:] or None)
+
+    groups = OrderedDict()
+    for stage in stages:
+        if stage["stageId"] not in stage_groups:
+            continue
+        metrics = dict.fromkeys(STAGE_METRICS, 0)
+        if stage.get("submissionTime") and stage.get("completionTime"):
+            metrics["stage_time_ms"] = int((
+                _parse_rest_time(stage["completionTime"]) -
+                _parse_rest_time(stage["submissionTime"])
+            ).total_seconds() * 1000)
+        metrics.update({
+            "executor_run_time_ms": stage.get("executorRunTime", 0),
+            "executor_cpu_time_ms":
+                stage.get("executorCpuTime", 0) // 1000000,
+            "input_bytes": stage.get("inputBytes", 0),
+            "shuffle_read_bytes": stage.get("shuffleReadBytes", 0),
+            "shuffle_write_bytes": stage.get("shuffleWriteBytes", 0),
+            "memory_bytes_spilled": stage.get("memoryBytesSpilled", 0),
+            "disk_bytes_spilled": stage.get("diskBytesSpilled", 0),
+        })
+        group = groups.setdefault(
+            stage_groups[stage["stageId"]],
+            dict(dict.fromkeys(STAGE_METRICS, 0), stages=0))
+        group["stages"] += 1
+        for name in STAGE_METRICS:
+            group[name] += metrics[name]
+    return groups
+
+
+class SparkProfiler(object):
+    """
+    Collect the stage metrics of a validation run by job group.
+
+    The jobs the calling thread submits between `start()` and `stop()` are
+    tagged with a token unique to the run, so that the runs validated
+    concurrently in the session are left out. With `listener=True` a
+    StageMetricsListener is registered for the duration of the run;
+    otherwise no listener slows the listener bus down and the metrics are
+    read from the Spark UI REST API on `stop()` (see
+    `read_rest_stage_metrics()`), enough for the runs that only export the
+    stage times.
+
+    Usage:
+        profiler = SparkProfiler(spark).start()
+        ... validation tagged with `job_group()` ...
+        report = profiler.stop()
+    """
+
+    def __init__(self, spark, listener=True):
+        self.spark = spark
+        self.token = uuid.uuid4().hex
+        self.listener = StageMetricsListener(self.token) if listener \
+            else None
+        self.started = False
+        self.groups = {}
+        self._previous = {}
+
+    def start(self):
+        sc = self.spark.sparkContext
+        if self.listener is not None:
+            ensure_callback_server_started(sc._gateway)
+            sc._jsc.sc().addSparkListener(self.listener)
+        self._previous = {key: sc.getLocalProperty(key)
+                          for key in JOB_GROUP_PROPERTIES +
+                          (RUN_TOKEN_PROPERTY,)}
+        outer = self._previous["spark.jobGroup.id"]
+        sc.setJobGroup(self.token if outer is None
+                       else "{}/{}".format(outer, self.token),
+                       self._previous["spark.job.description"] or
+                       "Validation run {}".format(self.token))
+        sc.setLocalProperty(JOB_GROUP_PROPERTY, None)
+        sc.setLocalProperty(RUN_TOKEN_PROPERTY, self.token)
+        self.started = True
+        return self
+
+    def stop(self):
+        """
+        Restore the job group of the caller and, once the events already
+        posted are delivered, unregister the listener or read the REST API.
+
+        Returns:
+            A dict of job group -> summed stage metrics, the jobs without a
+            group being reported under `null`
+        """
+        if self.started:
+            sc = self.spark.sparkContext
+            for key, value in self._previous.items():
+                sc.setLocalProperty(key, value)
+            jsc = sc._jsc.sc()
+            jsc.listenerBus().waitUntilEmpty()
+            if self.listener is not None:
+                jsc.removeSparkListener(self.listener)
+                self.groups = dict(self.listener.groups)
+            else:
+                self.groups = read_rest_stage_metrics(self.spark, self.token)
+            self.started = False
+        return self.groups
+
+
+def write_profiling_report(profiling_dir, validation_result_identifier,
+                           validation_result, groups):
+    """
+    Write the profiling report of a validation run at the path of its result
+    in the validations store, rooted at `profiling_dir`.
+
+    Returns:
+        The report path
+    """
+    expectations = []
+    for result in validation_result.results:
+        group_id = get_expectation_id(result.expectation_config)
+        # compiled expectations share the job group of the fused scan
+        expectations.append(dict(
+            groups.get(group_id, {}),
+            expectation=group_id,
+            job_group=group_id if group_id in groups else None,
+            success=result.success,
+        ))
+    report = {
+        "expectation_suite_name":
+            validation_result.meta["expectation_suite_name"],
+        "execution_mode": validation_result.meta.get("execution_mode"),
+        "expectations": expectations,
+        "job_groups": [dict(metrics, job_group=group_id)
+                       for group_id, metrics in groups.items()],
+    }
+    report_path = os.path.join(
+        profiling_dir, *validation_result_identifier.to_tuple()) + ".json"
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    return report_path
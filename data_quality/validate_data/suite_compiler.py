@@ -0,0 +1,590 @@
+import hashlib
+import inspect
+import json
+from collections import OrderedDict
+from functools import reduce
+
+import pyspark.sql.functions as f
+from pyspark.sql import types as sparktypes
+
+from great_expectations.core.expectation_configuration import \
+    parse_result_format
+from great_expectations.core.expectation_validation_result import \
+    ExpectationValidationResult
+from great_expectations.expectations.expectation import _format_map_output
+
+from custom_expectations import EXPECTATIONS as CUSTOM_EXPECTATIONS, \
+    get_metric_provider
+from custom_expectations.regex_predicates import match_regex
+
+
+def _between_condition(column, kwargs):
+    min_value = kwargs.get("min_value")
+    max_value = kwargs.get("max_value")
+    conditions = []
+    if min_value is not None:
+        conditions.append(column > min_value if kwargs.get("strict_min")
+                          else column >= min_value)
+    if max_value is not None:
+        conditions.append(column < max_value if kwargs.get("strict_max")
+                          else column <= max_value)
+    assert conditions, "min_value and max_value cannot both be None"
+    return reduce(lambda a, b: a & b, conditions)
+
+
+# Native column map expectations: expectation type -> (expected condition,
+# filter_column_isnull) mirroring the `_spark` partials shipped with GE, the
+# simple regexes being lowered to native predicates.
+COLUMN_MAP_CONDITIONS = {
+    "expect_column_values_to_not_be_null": (
+        lambda column, kwargs: column.isNotNull(), False),
+    "expect_column_values_to_be_null": (
+        lambda column, kwargs: column.isNull(), False),
+    "expect_column_values_to_be_between": (_between_condition, True),
+    "expect_column_values_to_match_regex": (
+        lambda column, kwargs: match_regex(column, kwargs["regex"]), True),
+    "expect_column_values_to_not_match_regex": (
+        lambda column, kwargs: ~match_regex(column, kwargs["regex"]), True),
+    "expect_column_values_to_be_in_set": (
+        lambda column, kwargs: column.isin(list(kwargs["value_set"])), True),
+    "expect_column_values_to_not_be_in_set": (
+        lambda column, kwargs: ~column.isin(list(kwargs["value_set"])), True),
+    "expect_column_value_lengths_to_equal": (
+        lambda column, kwargs: f.length(column) == kwargs["value"], True),
+}
+
+# Custom map expectations, whose metric provider `_spark` condition partial
+# is inlined in the fused plan; the providers are imported on first use.
+CUSTOM_MAP_EXPECTATIONS = tuple(CUSTOM_EXPECTATIONS)
+
+# Aggregate expectations, whose observed value is checked against the
+# min_value/max_value bounds.
+COLUMN_AGGREGATES = (
+    "expect_column_min_to_be_between",
+    "expect_column_max_to_be_between",
+    "expect_column_sum_to_be_between",
+    "expect_column_mean_to_be_between",
+)
+
+TABLE_ROW_COUNT_EXPECTATIONS = (
+    "expect_table_row_count_to_be_between",
+    "expect_table_row_count_to_equal",
+)
+
+SCHEMA_EXPECTATIONS = (
+    "expect_column_to_exist",
+    "expect_column_values_to_be_of_type",
+    "expect_column_values_to_be_in_type_list",
+    "expect_table_columns_to_match_ordered_list",
+    "expect_table_columns_to_match_set",
+    "expect_table_column_count_to_equal",
+    "expect_table_column_count_to_be_between",
+)
+
+
+# Kwargs that are not part of the identity of an expectation: the output
+# options, and the `batch_id` Great Expectations adds to the configuration
+# of every result, a different hash for every batch.
+NON_IDENTIFYING_KWARGS = ("result_format", "include_config",
+                          "catch_exceptions", "batch_id")
+
+
+def get_suite_kwargs(configuration):
+    """
+    Return the kwargs of an expectation as written in its suite, i.e.
+    without the `batch_id` of a result configuration.
+    """
+    return {key: value for key, value in configuration.kwargs.items()
+            if key != "batch_id"}
+
+
+def get_expectation_id(configuration):
+    """
+    Identify an expectation of a suite by its type and kwargs, e.g.
+    `expect_column_values_to_not_be_null(column=video_id)`; the id of a
+    result configuration is the id of the suite configuration.
+    """
+    kwargs = ", ".join(
+        "{}={}".format(key, value if isinstance(value, str)
+                       else json.dumps(value, default=str))
+        for key, value in sorted(configuration.kwargs.items())
+        if key not in NON_IDENTIFYING_KWARGS)
+    return "{}({})".format(configuration.expectation_type, kwargs)
+
+
+def sort_results(results, expectations):
+    """
+    Put validation results back in the order of the suite expectations,
+    matched by `get_expectation_id()`.
+
+    Raises:
+        ValueError: if a result matches no expectation of the suite
+    """
+    positions = {get_expectation_id(configuration): position
+                 for position, configuration in enumerate(expectations)}
+
+    def position(result):
+        expectation_id = get_expectation_id(result.expectation_config)
+        if expectation_id not in positions:
+            raise ValueError("The result of {} matches no expectation of the "
+                             "suite".format(expectation_id))
+        return positions[expectation_id]
+    return sorted(results, key=position)
+
+
+def get_condition_partial(provider):
+    """
+    Return the undecorated `_spark` condition partial of a custom metric
+    provider, i.e. the function returning the expected condition Column.
+    """
+    return inspect.unwrap(provider._spark)
+
+
+def _value_between(value, kwargs):
+    if value is None:
+        return False
+    min_value = kwargs.get("min_value")
+    max_value = kwargs.get("max_value")
+    if min_value is not None:
+        if (value <= min_value) if kwargs.get("strict_min") \
+                else (value < min_value):
+            return False
+    if max_value is not None:
+        if (value >= max_value) if kwargs.get("strict_max") \
+                else (value > max_value):
+            return False
+    return True
+
+
+def _exception_info():
+    return {
+        "raised_exception": False,
+        "exception_message": None,
+        "exception_traceback": None,
+    }
+
+
+class MetricRegistry(object):
+    """
+    Collects the aggregate columns requested by one or more compiled suites.
+
+    Identical aggregates are registered once, so that a single `df.agg(...)`
+    computes every metric needed by all the registered suites. Each metric
+    carries the rule used to merge partial values (`sum`, `min` or `max`).
+
+    Metrics that file statistics may answer without a scan are also tagged in
+    `statistics` with a tuple whose first item is the kind of statistic:
+    `("row_count",)`, `("null_count", column)`, `("non_null_count", column)`,
+    `("min", column)`, `("max", column)` or `("count_outside", column,
+    kwargs)`, the rows outside the `_between_condition()` bounds.
+    """
+
+    def __init__(self):
+        self.aggregates = OrderedDict()
+        self.statistics = OrderedDict()
+
+    def add(self, column, merge="sum", statistic=None):
+        name = "m_" + hashlib.sha1(str(column).encode()).hexdigest()[:12]
+        if name not in self.aggregates:
+            self.aggregates[name] = (column, merge)
+            if statistic is not None:
+                self.statistics[name] = statistic
+        return name
+
+    def row_count(self):
+        return self.add(f.count(f.lit(1)), statistic=("row_count",))
+
+    def count_if(self, condition, statistic=None):
+        return self.add(f.sum(f.when(condition, 1).otherwise(0)),
+                        statistic=statistic)
+
+    def minimum(self, column, statistic=None):
+        return self.add(f.min(column), merge="min", statistic=statistic)
+
+    def maximum(self, column, statistic=None):
+        return self.add(f.max(column), merge="max", statistic=statistic)
+
+    def total(self, column):
+        return self.add(f.sum(column))
+
+    def subset(self, names):
+        """A registry holding only the `names` metrics of this one."""
+        registry = MetricRegistry()
+        for name in names:
+            registry.aggregates[name] = self.aggregates[name]
+            if name in self.statistics:
+                registry.statistics[name] = self.statistics[name]
+        return registry
+
+    def aggregate_columns(self):
+        return [column.alias(name)
+                for name, (column, _) in self.aggregates.items()]
+
+
+def compute_metrics(df, registry, group_by=None):
+    """
+    Compute every registered metric with a single aggregation over `df`.
+
+    Args:
+        df (DataFrame): The batch of data to scan
+        registry (MetricRegistry): The metrics to compute
+        group_by (list or None): Optional grouping columns; when set a list of
+            (group values, metrics) pairs is returned, one per group.
+
+    Returns:
+        A dict of metric name -> value, or a list of them when grouping.
+    """
+    if not registry.aggregates:
+        return {} if group_by is None else []
+    if group_by is None:
+        row = df.agg(*registry.aggregate_columns()).collect()[0]
+        return _normalize_metrics(row.asDict(), registry)
+    rows = df.groupBy(*group_by).agg(*registry.aggregate_columns()).collect()
+    return [
+        (tuple(row[column] for column in group_by),
+         _normalize_metrics(row.asDict(), registry))
+        for row in rows
+    ]
+
+
+def _normalize_metrics(values, registry):
+    metrics = {}
+    for name, (_, merge) in registry.aggregates.items():
+        value = values.get(name)
+        if value is None and merge == "sum":
+            value = 0
+        metrics[name] = value
+    return metrics
+
+
+def merge_metrics(registry, metrics_list):
+    """Merge partial metric values computed over disjoint batches of data."""
+    merged = {}
+    for name, (_, merge) in registry.aggregates.items():
+        values = [metrics.get(name) for metrics in metrics_list
+                  if metrics.get(name) is not None]
+        if merge == "sum":
+            merged[name] = sum(values)
+        elif not values:
+            merged[name] = None
+        elif merge == "min":
+            merged[name] = min(values)
+        else:
+            merged[name] = max(values)
+    return merged
+
+
+class MapCheck(object):
+    """A compiled map expectation: a domain and an unexpected condition."""
+
+    def __init__(self, configuration, domain, unexpected, registry,
+                 filtered_domain=True, domain_statistic=None,
+                 unexpected_statistic=None):
+        self.configuration = configuration
+        self.domain = domain
+        self.unexpected = unexpected
+        self.filtered_domain = filtered_domain
+        # the condition of the rows failing the expectation
+        self.failing = unexpected if domain is None else domain & unexpected
+        self.row_count_metric = registry.row_count()
+        self.domain_count_metric = registry.count_if(
+            domain, statistic=domain_statistic) \
+            if domain is not None else None
+        self.unexpected_count_metric = registry.count_if(
+            self.failing, statistic=unexpected_statistic)
+
+    @property
+    def mostly(self):
+        mostly = self.configuration.get_success_kwargs().get("mostly")
+        return 1 if mostly is None else mostly
+
+    def counts(self, metrics):
+        """
+        Return the (element, nonnull, considered, unexpected) counts, where
+        the considered rows are those `mostly` is computed over.
+        """
+        element_count = metrics[self.row_count_metric]
+        unexpected_count = metrics[self.unexpected_count_metric]
+        nonnull_count = metrics[self.domain_count_metric] \
+            if self.domain_count_metric else element_count
+        considered_count = nonnull_count if self.filtered_domain \
+            else element_count
+        return element_count, nonnull_count, considered_count, \
+            unexpected_count
+
+    def evaluate(self, metrics):
+        mostly = self.mostly
+        element_count, nonnull_count, considered_count, unexpected_count = \
+            self.counts(metrics)
+
+        if element_count == 0 or considered_count == 0:
+            success = True
+        else:
+            success = (considered_count - unexpected_count) / \
+                float(considered_count) >= mostly
+
+        result_format = parse_result_format(
+            self.configuration.kwargs.get("result_format", "BASIC"))
+        output = _format_map_output(
+            result_format=result_format,
+            success=success,
+            element_count=element_count,
+            nonnull_count=nonnull_count if self.filtered_domain else None,
+            unexpected_count=unexpected_count,
+            unexpected_list=[],
+            unexpected_index_list=None,
+        )
+        return ExpectationValidationResult(
+            success=output["success"],
+            expectation_config=self.configuration,
+            result=output.get("result", {}),
+            exception_info=_exception_info(),
+        )
+
+
+class AggregateCheck(object):
+    """A compiled aggregate expectation compared against min/max bounds."""
+
+    def __init__(self, configuration, metric, value_fn=None):
+        self.configuration = configuration
+        self.metric = metric
+        self.value_fn = value_fn
+
+    def evaluate(self, metrics):
+        value = metrics[self.metric]
+        if self.value_fn is not None:
+            value = self.value_fn(metrics)
+        kwargs = self.configuration.get_success_kwargs()
+        if self.configuration.expectation_type == \
+                "expect_table_row_count_to_equal":
+            success = value == kwargs.get("value")
+        else:
+            success = _value_between(value, kwargs)
+        return ExpectationValidationResult(
+            success=success,
+            expectation_config=self.configuration,
+            result={"observed_value": value},
+            exception_info=_exception_info(),
+        )
+
+
+class SchemaCheck(object):
+    """An expectation answered from the DataFrame schema, with no scan."""
+
+    def __init__(self, configuration, schema):
+        self.configuration = configuration
+        self.success, self.observed_value = self._check(configuration, schema)
+
+    @staticmethod
+    def _check_table(configuration, schema):
+        kwargs = configuration.kwargs
+        columns = [field.name for field in schema.fields]
+        expectation_type = configuration.expectation_type
+        if expectation_type == "expect_table_columns_to_match_ordered_list":
+            return columns == list(kwargs["column_list"]), columns
+        if expectation_type == "expect_table_columns_to_match_set":
+            expected = set(kwargs["column_set"])
+            if kwargs.get("exact_match", True):
+                return set(columns) == expected, columns
+            return expected.issubset(columns), columns
+        if expectation_type == "expect_table_column_count_to_equal":
+            return len(columns) == kwargs["value"], len(columns)
+        return _value_between(len(columns), kwargs), len(columns)
+
+    @staticmethod
+    def _check(configuration, schema):
+        kwargs = configuration.kwargs
+        if configuration.expectation_type.startswith("expect_table_"):
+            return SchemaCheck._check_table(configuration, schema)
+        fields = {field.name: field.dataType for field in schema.fields}
+        column_type = fields.get(kwargs["column"])
+        if configuration.expectation_type == "expect_column_to_exist":
+            return column_type is not None, None
+        if column_type is None:
+            return False, None
+        if configuration.expectation_type == \
+                "expect_column_values_to_be_of_type":
+            expected = [kwargs["type_"]]
+        else:
+            expected = kwargs.get("type_list")
+        observed = type(column_type).__name__
+        if expected is None:
+            return True, observed
+        types = tuple(getattr(sparktypes, type_) for type_ in expected
+                      if hasattr(sparktypes, type_))
+        assert types, "No recognized spark types in expected_types_list"
+        return isinstance(column_type, types), observed
+
+    def evaluate(self, metrics=None):
+        result = {}
+        if self.configuration.expectation_type != "expect_column_to_exist":
+            result["observed_value"] = self.observed_value
+        return ExpectationValidationResult(
+            success=self.success,
+            expectation_config=self.configuration,
+            result=result,
+            exception_info=_exception_info(),
+        )
+
+
+class CompiledSuite(object):
+    """
+    The fused form of an Expectation Suite.
+
+    `checks` hold the compiled expectations, evaluated from the metrics of a
+    single aggregation; `residual` holds the configurations the compiler does
+    not support, which must be validated by Great Expectations.
+    """
+
+    def __init__(self, expectation_suite_name, registry):
+        self.expectation_suite_name = expectation_suite_name
+        self.registry = registry
+        self.checks = []
+        self.residual = []
+
+    def evaluate(self, metrics):
+        return [check.evaluate(metrics) for check in self.checks]
+
+    def map_checks(self):
+        return [check for check in self.checks if isinstance(check, MapCheck)]
+
+
+def _row_condition_supported(configuration):
+    return configuration.kwargs.get("row_condition") is None
+
+
+def _unexpected_statistic(expectation_type, column_name, kwargs):
+    """The file statistic the unexpected count of a native map check may be
+    answered from, if any."""
+    if expectation_type == "expect_column_values_to_not_be_null":
+        return "null_count", column_name
+    if expectation_type == "expect_column_values_to_be_null":
+        return "non_null_count", column_name
+    if expectation_type == "expect_column_values_to_be_between":
+        return "count_outside", column_name, {
+            key: kwargs.get(key) for key in ("min_value", "max_value",
+                                             "strict_min", "strict_max")}
+    return None
+
+
+def _compile_map(configuration, registry):
+    expectation_type = configuration.expectation_type
+    kwargs = configuration.get_success_kwargs()
+
+    if expectation_type in COLUMN_MAP_CONDITIONS:
+        condition_fn, filter_column_isnull = \
+            COLUMN_MAP_CONDITIONS[expectation_type]
+        column = f.col(kwargs["column"])
+        unexpected_statistic = _unexpected_statistic(
+            expectation_type, kwargs["column"], kwargs)
+        if filter_column_isnull:
+            return MapCheck(configuration, column.isNotNull(),
+                            ~condition_fn(column, kwargs), registry,
+                            domain_statistic=("non_null_count",
+                                              kwargs["column"]),
+                            unexpected_statistic=unexpected_statistic)
+        return MapCheck(configuration, None, ~condition_fn(column, kwargs),
+                        registry, filtered_domain=False,
+                        unexpected_statistic=unexpected_statistic)
+
+    provider = get_metric_provider(expectation_type)
+    condition_fn = get_condition_partial(provider)
+    value_kwargs = {key: kwargs.get(key)
+                    for key in provider.condition_value_keys}
+    ignore_row_if = kwargs.get("ignore_row_if")
+
+    if "column_list" in configuration.kwargs:
+        columns = [f.col(name) for name in kwargs["column_list"]]
+        expected = condition_fn(provider, columns, **value_kwargs)
+        nulls = [column.isNull() for column in columns]
+        if ignore_row_if == "all_values_are_missing":
+            domain = ~reduce(lambda a, b: a & b, nulls)
+        elif ignore_row_if == "any_value_is_missing":
+            domain = ~reduce(lambda a, b: a | b, nulls)
+        else:
+            domain = f.lit(True)
+        return MapCheck(configuration, domain, ~expected, registry)
+
+    if "column_A" in configuration.kwargs:
+        column_a = f.col(kwargs["column_A"])
+        column_b = f.col(kwargs["column_B"])
+        expected = condition_fn(provider, column_a, column_b, **value_kwargs)
+        if ignore_row_if == "both_values_are_missing":
+            domain = ~(column_a.isNull() & column_b.isNull())
+        elif ignore_row_if == "either_value_is_missing":
+            domain = ~(column_a.isNull() | column_b.isNull())
+        else:
+            domain = f.lit(True)
+        return MapCheck(configuration, domain, ~expected, registry)
+
+    column = f.col(kwargs["column"])
+    expected = condition_fn(provider, column, **value_kwargs)
+    return MapCheck(configuration, column.isNotNull(), ~expected, registry)
+
+
+def _compile_aggregate(configuration, registry):
+    expectation_type = configuration.expectation_type
+    if expectation_type in TABLE_ROW_COUNT_EXPECTATIONS:
+        return AggregateCheck(configuration, registry.row_count())
+
+    column_name = configuration.kwargs["column"]
+    column = f.col(column_name)
+    if expectation_type == "expect_column_min_to_be_between":
+        return AggregateCheck(configuration, registry.minimum(
+            column, statistic=("min", column_name)))
+    if expectation_type == "expect_column_max_to_be_between":
+        return AggregateCheck(configuration, registry.maximum(
+            column, statistic=("max", column_name)))
+
+    sum_metric = registry.total(column)
+    if expectation_type == "expect_column_sum_to_be_between":
+        return AggregateCheck(configuration, sum_metric)
+    # the mean is kept as sum / count so that partial values stay mergeable
+    count_metric = registry.count_if(
+        column.isNotNull(), statistic=("non_null_count", column_name))
+    return AggregateCheck(
+        configuration, sum_metric,
+        value_fn=lambda metrics: (
+            metrics[sum_metric] / float(metrics[count_metric])
+            if metrics[count_metric] else None))
+
+
+def is_compilable(configuration):
+    expectation_type = configuration.expectation_type
+    if not _row_condition_supported(configuration):
+        return False
+    return expectation_type in COLUMN_MAP_CONDITIONS \
+        or expectation_type in CUSTOM_MAP_EXPECTATIONS \
+        or expectation_type in COLUMN_AGGREGATES \
+        or expectation_type in TABLE_ROW_COUNT_EXPECTATIONS \
+        or expectation_type in SCHEMA_EXPECTATIONS
+
+
+def compile_suite(expectation_suite, schema, registry=None):
+    """
+    Compile an Expectation Suite into a single-scan aggregation plan.
+
+    Args:
+        expectation_suite (ExpectationSuite): The suite to compile
+        schema (StructType): The schema of the batch to validate
+        registry (MetricRegistry or None): The registry to add the metrics
+            to. Passing the same registry to several suites shares the scan.
+
+    Returns:
+        A CompiledSuite
+    """
+    registry = registry if registry is not None else MetricRegistry()
+    compiled = CompiledSuite(expectation_suite.expectation_suite_name,
+                             registry)
+    for configuration in expectation_suite.expectations:
+        expectation_type = configuration.expectation_type
+        if not is_compilable(configuration):
+            compiled.residual.append(configuration)
+        elif expectation_type in SCHEMA_EXPECTATIONS:
+            compiled.checks.append(SchemaCheck(configuration, schema))
+        elif expectation_type in COLUMN_AGGREGATES or \
+                expectation_type in TABLE_ROW_COUNT_EXPECTATIONS:
+            compiled.checks.append(_compile_aggregate(configuration, registry))
+        else:
+            compiled.checks.append(_compile_map(configuration, registry))
+    return compiled
@@ -0,0 +1,166 @@
+from functools import reduce
+
+import pyspark.sql.functions as f
+
+from suite_compiler import get_expectation_id
+
+
+def _update_counters(counters, item, capacity):
+    if item in counters:
+        counters[item] += 1
+    elif len(counters) < capacity:
+        counters[item] = 1
+    else:
+        for key in list(counters):
+            counters[key] -= 1
+            if not counters[key]:
+                del counters[key]
+
+
+def misra_gries(items, capacity):
+    """
+    Misra-Gries heavy hitters summary of a stream of items.
+
+    Every count is a lower bound of the real frequency of the item, which is
+    underestimated by at most (items - sum of counts) / (capacity + 1).
+
+    Returns:
+        An (items seen, dict of item -> count) tuple with at most `capacity`
+        counters
+    """
+    seen = 0
+    counters = {}
+    for item in items:
+        seen += 1
+        _update_counters(counters, item, capacity)
+    return seen, counters
+
+
+def merge_misra_gries(summary_a, summary_b, capacity):
+    """
+    Merge two Misra-Gries summaries keeping the same error guarantee: the
+    counters are added and the (capacity + 1)-th largest count is subtracted
+    from all of them.
+    """
+    seen_a, counters_a = summary_a
+    seen_b, counters_b = summary_b
+    counters = dict(counters_a)
+    for item, count in counters_b.items():
+        counters[item] = counters.get(item, 0) + count
+    if len(counters) > capacity:
+        threshold = sorted(counters.values(), reverse=True)[capacity]
+        counters = {item: count - threshold
+                    for item, count in counters.items() if count > threshold}
+    return seen_a + seen_b, counters
+
+
+def _get_columns(configuration):
+    kwargs = configuration.kwargs
+    if "column_list" in kwargs:
+        return list(kwargs["column_list"])
+    if "column_A" in kwargs:
+        return [kwargs["column_A"], kwargs["column_B"]]
+    return [kwargs["column"]]
+
+
+def _format_value(configuration, value):
+    # the same shapes as the partial_unexpected_list of Great Expectations
+    if "column_list" in configuration.kwargs:
+        return dict(zip(configuration.kwargs["column_list"], value))
+    if "column_A" in configuration.kwargs:
+        return list(value)
+    return value[0]
+
+
+def compute_unexpected_top_k(df, map_checks, k=20, capacity=None):
+    """
+    Compute the most frequent unexpected values of many map expectations in
+    one distributed pass.
+
+    Every partition builds a Misra-Gries summary per expectation of the
+    values (a tuple for column pairs and column lists) of its failing rows;
+    the summaries are merged with a tree reduce, so the driver only receives
+    bounded summaries, never the unexpected values themselves.
+
+    Args:
+        df (DataFrame): The batch
+        map_checks (list): The compiled MapCheck
+        k (int): The number of values returned per expectation
+        capacity (int or None): The counters of each summary, default 10 * k
+
+    Returns:
+        A list, per check, of up to `k` dicts with the `value`, its `count`
+        (a lower bound) and `count_upper_bound`
+    """
+    capacity = capacity or 10 * k
+    if not map_checks:
+        return []
+    # only the rows failing a check go through the Python workers
+    failing_rows = df.where(reduce(
+        lambda a, b: a | b, [check.failing for check in map_checks]))
+    unexpected_values = failing_rows.select(*[
+        f.when(check.failing, f.struct(*[
+            f.col(column) for column in _get_columns(check.configuration)]))
+        .alias("check_{}".format(position))
+        for position, check in enumerate(map_checks)
+    ])
+
+    def summarize_partition(rows):
+        seen = [0] * len(map_checks)
+        counters = [{} for _ in map_checks]
+        for row in rows:
+            for position, value in enumerate(row):
+                if value is not None:
+                    seen[position] += 1
+                    _update_counters(counters[position], tuple(value),
+                                     capacity)
+        yield list(zip(seen, counters))
+
+    def merge(summaries_a, summaries_b):
+        return [merge_misra_gries(a, b, capacity)
+                for a, b in zip(summaries_a, summaries_b)]
+
+    rdd = unexpected_values.rdd
+    summaries = rdd.mapPartitions(summarize_partition).treeReduce(merge) \
+        if rdd.getNumPartitions() else [(0, {}) for _ in map_checks]
+
+    top_k = []
+    for check, (seen, counters) in zip(map_checks, summaries):
+        max_error = -(-(seen - sum(counters.values())) // (capacity + 1))
+        top_k.append([
+            {
+                "value": _format_value(check.configuration, value),
+                "count": count,
+                "count_upper_bound": count + max_error,
+            }
+            for value, count in sorted(counters.items(),
+                                       key=lambda item: -item[1])[:k]
+        ])
+    return top_k
+
+
+def add_unexpected_top_k(df, compiled, validation_result, k=20):
+    """
+    Fill the `partial_unexpected_counts` of the failing compiled map
+    expectations of a validation result with their top-k unexpected values,
+    flagged by `partial_unexpected_counts_approximate`.
+
+    Returns:
+        The number of expectation results updated
+    """
+    # result configurations and suite configurations share the same id,
+    # the batch_id of the results being left out
+    results = {get_expectation_id(result.expectation_config): result
+               for result in validation_result.results}
+    checks = []
+    for check in compiled.map_checks():
+        result = results.get(get_expectation_id(check.configuration))
+        if result is not None and result.result.get("unexpected_count"):
+            checks.append(check)
+    for check, top_k in zip(checks, compute_unexpected_top_k(df, checks, k)):
+        result = results[get_expectation_id(check.configuration)].result
+        result["partial_unexpected_counts"] = top_k
+        result["partial_unexpected_counts_approximate"] = True
+        result["partial_unexpected_list"] = [entry["value"]
+                                             for entry in top_k]
+    return len(checks)
@@ -0,0 +1,390 @@
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import zlib
+from contextlib import closing
+
+from great_expectations.data_context.store.store_backend import StoreBackend
+from great_expectations.exceptions import InvalidKeyError
+from great_expectations.util import filter_properties_dict
+
+RUN_TIME_FORMAT = "%Y%m%dT%H%M%S.%fZ"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS validation_results (
+    key TEXT PRIMARY KEY,
+    suite_name TEXT,
+    run_name TEXT,
+    run_time TEXT,
+    batch_identifier TEXT,
+    success INTEGER,
+    evaluated_expectations INTEGER,
+    successful_expectations INTEGER,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS validation_results_suite_run_time
+    ON validation_results (suite_name, run_time);
+CREATE TABLE IF NOT EXISTS expectation_results (
+    key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    suite_name TEXT,
+    run_time TEXT,
+    expectation_type TEXT,
+    column_name TEXT,
+    kwargs TEXT,
+    success INTEGER,
+    element_count INTEGER,
+    unexpected_count INTEGER,
+    unexpected_percent REAL,
+    missing_percent REAL,
+    observed_value TEXT,
+    PRIMARY KEY (key, position)
+);
+CREATE INDEX IF NOT EXISTS expectation_results_column_run_time
+    ON expectation_results (column_name, expectation_type, run_time);
+CREATE INDEX IF NOT EXISTS expectation_results_suite_run_time
+    ON expectation_results (suite_name, run_time);
+"""
+
+
+def _get_column_name(kwargs):
+    # column pairs and column lists are indexed as "a,b"
+    if "column" in kwargs:
+        return kwargs["column"]
+    if "column_A" in kwargs:
+        return "{},{}".format(kwargs["column_A"], kwargs["column_B"])
+    if "column_list" in kwargs:
+        return ",".join(kwargs["column_list"])
+    return None
+
+
+def _get_expectation_rows(key, suite_name, run_time, validation_result):
+    rows = []
+    for position, result in enumerate(validation_result.get("results", [])):
+        configuration = result.get("expectation_config") or {}
+        kwargs = configuration.get("kwargs", {})
+        result_dict = result.get("result") or {}
+        observed_value = result_dict.get("observed_value")
+        rows.append((
+            key, position, suite_name, run_time,
+            configuration.get("expectation_type"),
+            _get_column_name(kwargs),
+            json.dumps(kwargs, sort_keys=True),
+            int(bool(result.get("success"))),
+            result_dict.get("element_count"),
+            result_dict.get("unexpected_count"),
+            result_dict.get("unexpected_percent"),
+            result_dict.get("missing_percent"),
+            json.dumps(observed_value) if observed_value is not None
+            else None,
+        ))
+    return rows
+
+
+class SQLiteValidationsStoreBackend(StoreBackend):
+    """
+    A store backend keeping the validation results in a single SQLite
+    database instead of one JSON file per run.
+
+    Every result is stored compressed, and its run and expectation results
+    are flattened into tables indexed by suite, expectation type, column and
+    run time, so that `ValidationHistory` can query the history without
+    loading the results themselves.
+
+    The keys are the tuples of the ValidationResultIdentifier:
+    (*suite name parts, run name, run time, batch identifier).
+    """
+
+    def __init__(
+        self,
+        db_path,
+        runtime_environment=None,
+        fixed_length_key=False,
+        suppress_store_backend_id=False,
+        manually_initialize_store_backend_id="",
+        store_name=None,
+    ):
+        super().__init__(
+            fixed_length_key=fixed_length_key,
+            suppress_store_backend_id=suppress_store_backend_id,
+            manually_initialize_store_backend_id=(
+                manually_initialize_store_backend_id),
+            store_name=store_name,
+        )
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as connection:
+            # readers (e.g. the data docs) do not block the running writer
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        if not self._suppress_store_backend_id:
+            _ = self.store_backend_id
+
+        self._config = {
+            "db_path": db_path,
+            "runtime_environment": runtime_environment,
+            "fixed_length_key": fixed_length_key,
+            "suppress_store_backend_id": suppress_store_backend_id,
+            "manually_initialize_store_backend_id":
+                manually_initialize_store_backend_id,
+            "store_name": store_name,
+            "module_name": self.__class__.__module__,
+            "class_name": self.__class__.__name__,
+        }
+        filter_properties_dict(properties=self._config, clean_falsy=True,
+                               inplace=True)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    @staticmethod
+    def _encode_key(key):
+        return json.dumps(list(key))
+
+    def _get(self, key):
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT value FROM validation_results WHERE key = ?",
+                (self._encode_key(key),)).fetchone()
+        if row is None:
+            raise InvalidKeyError(
+                "Key {} not found in {}".format(key, self.db_path))
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def _set(self, key, value, **kwargs):
+        encoded_key = self._encode_key(key)
+        suite_name = run_name = run_time = batch_identifier = None
+        success = evaluated = successful = None
+        expectation_rows = []
+        if len(key) >= 4 and not self.is_ignored_key(key):
+            suite_name = ".".join(key[:-3])
+            run_name, run_time, batch_identifier = key[-3:]
+            validation_result = json.loads(value)
+            statistics = validation_result.get("statistics", {})
+            success = int(bool(validation_result.get("success")))
+            evaluated = statistics.get("evaluated_expectations")
+            successful = statistics.get("successful_expectations")
+            expectation_rows = _get_expectation_rows(
+                encoded_key, suite_name, run_time, validation_result)
+
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO validation_results VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (encoded_key, suite_name, run_name, run_time,
+                 batch_identifier, success, evaluated, successful,
+                 zlib.compress(value.encode("utf-8"))))
+            connection.execute(
+                "DELETE FROM expectation_results WHERE key = ?",
+                (encoded_key,))
+            connection.executemany(
+                "INSERT INTO expectation_results VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                expectation_rows)
+        return key
+
+    def _move(self, source_key, dest_key, **kwargs):
+        value = self._get(source_key)
+        self._set(dest_key, value)
+        self.remove_key(source_key)
+
+    def list_keys(self, prefix=()):
+        with closing(self._connect()) as connection:
+            keys = [tuple(json.loads(row[0])) for row in connection.execute(
+                "SELECT key FROM validation_results")]
+        return [key for key in keys if key[:len(prefix)] == tuple(prefix)]
+
+    def _has_key(self, key):
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT 1 FROM validation_results WHERE key = ?",
+                (self._encode_key(key),)).fetchone() is not None
+
+    def remove_key(self, key):
+        encoded_key = self._encode_key(key)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "DELETE FROM expectation_results WHERE key = ?",
+                (encoded_key,))
+            deleted = connection.execute(
+                "DELETE FROM validation_results WHERE key = ?",
+                (encoded_key,)).rowcount
+        return deleted > 0
+
+    @property
+    def config(self):
+        return self._config
+
+
+def _format_run_time(value):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc)
+        return value.strftime(RUN_TIME_FORMAT)
+    return value
+
+
+class ValidationHistory(object):
+    """
+    Query the history of the validation results stored by a
+    SQLiteValidationsStoreBackend.
+
+    The run times are compared as strings in the `%Y%m%dT%H%M%S.%fZ` format
+    of the validations store keys; datetimes are converted to it.
+
+    Usage:
+        history = ValidationHistory("/home/jovyan/work/validations.db")
+        history.unexpected_percent_trend("customer_id", days=90)
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _query(self, sql, parameters=()):
+        with closing(sqlite3.connect(self.db_path)) as connection:
+            connection.row_factory = sqlite3.Row
+            return [dict(row) for row in connection.execute(sql, parameters)]
+
+    @staticmethod
+    def _where(filters, conditions=None):
+        conditions = list(conditions or [])
+        parameters = []
+        for condition, value in filters:
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, parameters
+
+    def runs(self, suite_name=None, since=None, until=None):
+        """
+        Return the validation runs, oldest first, with their suite, batch and
+        statistics.
+        """
+        # the store backend id is stored without suite
+        where, parameters = self._where([
+            ("suite_name = ?", suite_name),
+            ("run_time >= ?", _format_run_time(since)),
+            ("run_time < ?", _format_run_time(until)),
+        ], conditions=["suite_name IS NOT NULL"])
+        return self._query(
+            "SELECT suite_name, run_name, run_time, batch_identifier, "
+            "success, evaluated_expectations, successful_expectations "
+            "FROM validation_results" + where +
+            " ORDER BY run_time", parameters)
+
+    def expectation_results(self, column=None, expectation_type=None,
+                            suite_name=None, since=None, until=None):
+        """
+        Return the flattened expectation results, oldest first.
+
+        Args:
+            column (str or None): The column, "a,b" for column pairs and
+                column lists
+            expectation_type (str or None): The expectation type
+            suite_name (str or None): The expectation suite name
+            since (datetime or str or None): The first run time included
+            until (datetime or str or None): The first run time excluded
+
+        Returns:
+            A list of dicts with the run, the expectation and the
+            `success`, `element_count`, `unexpected_count`,
+            `unexpected_percent`, `missing_percent` and (JSON)
+            `observed_value` of its result
+        """
+        where, parameters = self._where([
+            ("column_name = ?", column),
+            ("expectation_type = ?", expectation_type),
+            ("suite_name = ?", suite_name),
+            ("run_time >= ?", _format_run_time(since)),
+            ("run_time < ?", _format_run_time(until)),
+        ])
+        return self._query(
+            "SELECT suite_name, run_time, expectation_type, column_name, "
+            "kwargs, success, element_count, unexpected_count, "
+            "unexpected_percent, missing_percent, observed_value "
+            "FROM expectation_results" + where +
+            " ORDER BY run_time, position", parameters)
+
+    def unexpected_percent_trend(self, column, days=90,
+                                 expectation_type=None, suite_name=None):
+        """
+        Return the unexpected_percent of the expectations of a column over
+        the last `days` days, as a list of dicts with `run_time`,
+        `suite_name`, `expectation_type` and `unexpected_percent`.
+        """
+        since = datetime.datetime.now(datetime.timezone.utc) - \
+            datetime.timedelta(days=days)
+        return [
+            {name: row[name] for name in ("run_time", "suite_name",
+                                          "expectation_type",
+                                          "unexpected_percent")}
+            for row in self.expectation_results(
+                column=column, expectation_type=expectation_type,
+                suite_name=suite_name, since=since)
+            if row["unexpected_percent"] is not None
+        ]
+
+
+def import_validation_results(validations_dir, store_backend):
+    """
+    Copy the JSON validation results of a TupleFilesystemStoreBackend
+    directory into a SQLiteValidationsStoreBackend.
+
+    Returns:
+        The number of results imported
+    """
+    imported = 0
+    for root, dirs, files in os.walk(validations_dir):
+        for file_name in files:
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(root, file_name)
+            key = tuple(os.path.relpath(path, validations_dir)[:-5]
+                        .split(os.sep))
+            with open(path) as f:
+                store_backend.set(key, f.read())
+            imported += 1
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--validations_db',
+                        help='The SQLite validations store',
+                        default="/home/jovyan/work/validations.db")
+    parser.add_argument('--import_dir',
+                        help='Import the JSON validation results of this '
+                             'filesystem validations store first')
+    parser.add_argument('--column',
+                        help='Print the unexpected_percent trend of this '
+                             'column ("a,b" for column pairs and lists)')
+    parser.add_argument('--expectation_type',
+                        help='Restrict the trend to this expectation type')
+    parser.add_argument('--suite_name',
+                        help='Restrict the trend to this expectation suite')
+    parser.add_argument('--days',
+                        help='The length of the trend in days',
+                        type=int,
+                        default=90)
+    args = parser.parse_args()
+
+    if args.import_dir:
+        imported = import_validation_results(
+            args.import_dir, SQLiteValidationsStoreBackend(args.validations_db))
+        print('{} validation results imported from {}'.format(
+            imported, args.import_dir))
+    if args.column:
+        trend = ValidationHistory(args.validations_db) \
+            .unexpected_percent_trend(args.column, days=args.days,
+                                      expectation_type=args.expectation_type,
+                                      suite_name=args.suite_name)
+        print(json.dumps(trend, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import datetime
+
+from great_expectations import __version__ as ge_version
+from great_expectations.core.expectation_validation_result import \
+    ExpectationSuiteValidationResult
+from great_expectations.core.run_identifier import RunIdentifier
+from great_expectations.data_context.types.resource_identifiers import (
+    ExpectationSuiteIdentifier,
+    ValidationResultIdentifier,
+)
+from great_expectations.validator.validator import _calc_validation_statistics
+
+
+def build_suite_validation_result(expectation_suite_name, results, run_id,
+                                  validator=None, meta=None):
+    """
+    Wrap a list of ExpectationValidationResult into the same
+    ExpectationSuiteValidationResult produced by `Validator.validate()`.
+
+    Args:
+        expectation_suite_name (str): The expectation suite name
+        results (list): The ExpectationValidationResult of each expectation
+        run_id (dict or RunIdentifier): The run identifier
+        validator (Validator or None): When given, the active batch
+            information is copied into the result meta
+        meta (dict or None): Additional meta information
+
+    Returns:
+        An ExpectationSuiteValidationResult
+    """
+    if isinstance(run_id, dict):
+        run_id = RunIdentifier(**run_id)
+    statistics = _calc_validation_statistics(results)
+    result_meta = {
+        "great_expectations_version": ge_version,
+        "expectation_suite_name": expectation_suite_name,
+        "run_id": run_id,
+        "validation_time": datetime.datetime.now(
+            datetime.timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ"),
+    }
+    if validator is not None:
+        result_meta.update({
+            "batch_spec": validator.active_batch_spec,
+            "batch_markers": validator.active_batch_markers,
+            "active_batch_definition": validator.active_batch_definition,
+        })
+    result_meta.update(meta or {})
+    return ExpectationSuiteValidationResult(
+        results=results,
+        success=statistics.success,
+        statistics={
+            "evaluated_expectations": statistics.evaluated_expectations,
+            "successful_expectations": statistics.successful_expectations,
+            "unsuccessful_expectations": statistics.unsuccessful_expectations,
+            "success_percent": statistics.success_percent,
+        },
+        evaluation_parameters={},
+        meta=result_meta,
+    )
+
+
+def get_validation_result_identifier(validation_result,
+                                     batch_identifier=None):
+    """
+    Return the key of a validation result in the validations store.
+
+    Args:
+        validation_result (ExpectationSuiteValidationResult): The result
+        batch_identifier (str or None): The batch identifier, default to the
+            id of the active batch definition in the result meta
+
+    Returns:
+        A ValidationResultIdentifier
+    """
+    if batch_identifier is None:
+        batch_identifier = validation_result.meta[
+            "active_batch_definition"].id
+    return ValidationResultIdentifier(
+        expectation_suite_identifier=ExpectationSuiteIdentifier(
+            expectation_suite_name=validation_result.meta[
+                "expectation_suite_name"]),
+        run_id=validation_result.meta["run_id"],
+        batch_identifier=batch_identifier,
+    )
+
+
+def store_validation_result(context, validation_result, batch_identifier):
+    """
+    Store a validation result in the Data Context validations store, as the
+    `StoreValidationResultAction` of a Checkpoint does.
+
+    Returns:
+        The ValidationResultIdentifier of the stored result
+    """
+    validation_result_identifier = get_validation_result_identifier(
+        validation_result, batch_identifier)
+    context.validations_store.set(validation_result_identifier,
+                                  validation_result)
+    return validation_result_identifier
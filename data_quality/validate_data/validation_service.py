@@ -0,0 +1,332 @@
+import argparse
+import datetime
+import json
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from pyspark.sql import SparkSession
+
+from great_expectations.core.batch import BatchDefinition
+from great_expectations.core.id_dict import IDDict
+
+from data_validation_manifest import run_target
+from data_validation_with_checkpoints import add_validation_arguments, \
+    get_data_context, get_logger
+
+# The validation options a request may set; the others, e.g. the output
+# directories, the stores and the Pushgateway, stay those of the service
+REQUEST_OPTIONS = (
+    "dataset_path",
+    "input_format",
+    "execution_mode",
+    "fail_fast",
+    "footer_statistics",
+    "row_filter",
+    "adaptive_partitioning",
+    "target_partition_mb",
+    "skew_threshold",
+    "cache_mode",
+    "sample",
+    "sample_fraction",
+    "sample_size",
+    "stratify_column",
+    "sample_seed",
+    "confidence_level",
+    "profile",
+    "unexpected_top_k",
+)
+
+
+class RequestArgumentParser(argparse.ArgumentParser):
+    """An ArgumentParser raising a ValueError instead of exiting."""
+
+    def error(self, message):
+        raise ValueError("Invalid validation options: {}".format(message))
+
+
+def parse_request(target, options):
+    """
+    Check a validation request and parse its options with the parser of
+    `add_validation_arguments()`, so that their types and choices apply.
+
+    Args:
+        target (dict): The request, a manifest target
+        options (Namespace): The service options, the defaults of the
+            options the request does not set
+
+    Returns:
+        The target with the parsed values of its options
+
+    Raises:
+        ValueError: if the request is not a valid manifest target or sets an
+            option not in REQUEST_OPTIONS
+    """
+    if not isinstance(target, dict) or \
+            not isinstance(target.get("dataset_name"), str) or \
+            not isinstance(target.get("suite_name"), str):
+        raise ValueError("A validation request needs a dataset_name and "
+                         "a suite_name")
+    request_options = {key: value for key, value in target.items()
+                       if key not in ("dataset_name", "suite_name")}
+    unknown_options = set(request_options) - set(REQUEST_OPTIONS)
+    if unknown_options:
+        raise ValueError("Options not accepted in a request: {}".format(
+            ", ".join(sorted(unknown_options))))
+
+    parser = add_validation_arguments(RequestArgumentParser())
+    defaults = {key: getattr(options, key) for key in REQUEST_OPTIONS}
+    argv = []
+    for key, value in request_options.items():
+        flag = isinstance(defaults[key], bool)
+        if flag != isinstance(value, bool) or not flag and \
+                value is not None and not isinstance(value, (str, int, float)):
+            raise ValueError("Invalid value of {}: {}".format(key, value))
+        if flag:
+            # store_true flags: false is the absence of the flag
+            defaults[key] = False
+            if value:
+                argv.append("--" + key)
+        elif value is not None:
+            # joined, a value starting with a dash is not taken for a flag
+            argv.append("--{}={}".format(key, value))
+    parser.set_defaults(**defaults)
+    parsed = parser.parse_args(argv)
+    return dict(target, **{key: getattr(parsed, key)
+                           for key in request_options})
+
+
+class ValidationService(object):
+    """
+    Keep a Spark session and a Great Expectations Data Context warm and
+    validate the queued requests with them.
+
+    A request is a manifest target (see `load_manifest()`): a dict with the
+    `dataset_name` and `suite_name` keys and, optionally, the validation
+    options of REQUEST_OPTIONS (e.g. `dataset_path`, `input_format`,
+    `execution_mode`) overriding the service defaults. Up to
+    `max_concurrency` requests are validated at the same time, each in its
+    own fair-scheduler pool.
+    """
+
+    def __init__(self, spark, context, options, logger, max_concurrency=1,
+                 max_jobs=1000):
+        self.spark = spark
+        self.context = context
+        self.options = options
+        self.logger = logger
+        self.max_jobs = max_jobs
+        self.queue = queue.Queue()
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.workers = [
+            threading.Thread(target=self._work, name="validation-worker-{}"
+                             .format(position), daemon=True)
+            for position in range(max_concurrency)
+        ]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def submit(self, target):
+        """
+        Queue a validation request.
+
+        Returns:
+            The job, a dict with the request `id`, `status` and, once
+            validated, the `result` summary of `run_target()`, and an Event
+            set once the job is done
+
+        Raises:
+            ValueError: if the request is not a valid manifest target or
+                sets an option it may not (see `parse_request()`)
+        """
+        target = parse_request(target, self.options)
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "target": target,
+            "submitted_at": datetime.datetime.now(
+                datetime.timezone.utc).isoformat(),
+            "result": None,
+        }
+        with self._lock:
+            self.jobs[job["id"]] = job
+            # forget the oldest finished jobs
+            finished = [job_id for job_id, old_job in self.jobs.items()
+                        if old_job["status"] in ("succeeded", "failed")]
+            for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+                del self.jobs[job_id]
+        done = threading.Event()
+        self.queue.put((job, done))
+        self.logger.info('Validation request {} queued: {}.{}'.format(
+            job["id"], target["dataset_name"], target["suite_name"]))
+        return job, done
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return [dict(job, result=None) for job in self.jobs.values()]
+
+    def queued(self):
+        return self.queue.qsize()
+
+    def _release_batch(self, job_id):
+        """
+        Drop the batch of a job from the execution engine, which otherwise
+        keeps every batch ever loaded; the batches of the other running jobs
+        are left alone.
+        """
+        batch_definition = BatchDefinition(
+            datasource_name="filesystem_datasource",
+            data_connector_name="runtime_data_connector",
+            data_asset_name="data_asset_name",
+            batch_identifiers=IDDict({"batch_id": job_id}),
+        )
+        self.context.datasources["filesystem_datasource"].execution_engine \
+            .loaded_batch_data_dict.pop(batch_definition.id, None)
+
+    def _work(self):
+        while True:
+            job, done = self.queue.get()
+            job["status"] = "running"
+            try:
+                job["result"] = run_target(
+                    self.spark, self.context, self.options, job["target"],
+                    self.logger, batch_id=job["id"])
+                job["status"] = "succeeded" if job["result"]["success"] \
+                    else "failed"
+            except Exception as e:
+                job["result"] = {"success": False, "error": str(e)}
+                job["status"] = "failed"
+            finally:
+                self._release_batch(job["id"])
+                done.set()
+                self.queue.task_done()
+
+
+class ValidationRequestHandler(BaseHTTPRequestHandler):
+    """
+    The HTTP API of a ValidationService:
+
+        POST /validations           queue a request (JSON body); add
+                                    `?wait=true` to answer once validated
+        GET  /validations           list the jobs
+        GET  /validations/<job id>  get a job and its result
+        GET  /health                the service status
+    """
+
+    service = None
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip("/")
+        if path == "/health":
+            self._send_json(200, {"status": "ok",
+                                  "queued": self.service.queued()})
+        elif path == "/validations":
+            self._send_json(200, self.service.list())
+        elif path.startswith("/validations/"):
+            job = self.service.get(path[len("/validations/"):])
+            if job is None:
+                self._send_json(404, {"error": "Unknown validation job"})
+            else:
+                self._send_json(200, job)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/validations":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            target = json.loads(self.rfile.read(length) or b"{}")
+            job, done = self.service.submit(target)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        if parse_qs(url.query).get("wait", ["false"])[0].lower() == "true":
+            done.wait()
+            self._send_json(200, job)
+        else:
+            self._send_json(202, job)
+
+    def log_message(self, format, *args):
+        self.service.logger.debug("%s - %s", self.address_string(),
+                                  format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host',
+                        help='The address the service listens on',
+                        default="127.0.0.1")
+    parser.add_argument('--port',
+                        help='The port the service listens on',
+                        type=int,
+                        default=8085)
+    parser.add_argument('--max_concurrency',
+                        help='Maximum number of requests validated at the '
+                             'same time',
+                        type=int,
+                        default=1)
+    parser.add_argument('--max_jobs',
+                        help='Number of jobs kept for the status requests',
+                        type=int,
+                        default=1000)
+    parser.add_argument('--log_level',
+                        help='The log level',
+                        required=True)
+    add_validation_arguments(parser)
+
+    args, unknown_args = parser.parse_known_args()
+
+    logger = get_logger(logger_name=__file__,
+                        logger_level=args.log_level)
+
+    spark = SparkSession.builder \
+        .config("spark.scheduler.mode", "FAIR") \
+        .enableHiveSupport() \
+        .getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+    logger.info('Spark session created')
+
+    logger.info('Instantiating Great Expectations Data Context...')
+    context = get_data_context(args.validations_db)
+    logger.info('Great Expectations Data Context instantiated ')
+
+    ValidationRequestHandler.service = ValidationService(
+        spark, context, args, logger, max_concurrency=args.max_concurrency,
+        max_jobs=args.max_jobs).start()
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 ValidationRequestHandler)
+    logger.info('Validation service listening on http://{}:{}'
+                .format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        spark.stop()
+
+
+if __name__ == '__main__':
+    main()